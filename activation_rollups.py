@@ -0,0 +1,265 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+from collections import Counter
+from datetime import datetime, timedelta
+import logging
+import threading
+import time
+
+from sqlalchemy import func
+
+from storage_profile import insert_or_increment
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {
+    'minute': lambda moment: moment.replace(second=0, microsecond=0),
+    'hour': lambda moment: moment.replace(minute=0, second=0, microsecond=0),
+    'day': lambda moment: moment.replace(hour=0, minute=0, second=0, microsecond=0)
+}
+
+DIMENSIONS = ('license_type', 'reason', 'client_ip')
+
+# Window returned by summarize() when no start time is given
+DEFAULT_WINDOWS = {
+    'minute': timedelta(hours=1),
+    'hour': timedelta(days=1),
+    'day': timedelta(days=30)
+}
+
+DEFAULT_OPTIONS = {
+    'enabled': True,
+    'by_client_ip': True,
+    'retention_days': {'minute': 2, 'hour': 90, 'day': None},
+    'compact_interval_seconds': 3600,
+    'rebuild_batch_size': 5000
+}
+
+class ActivationRollups:
+    """Success/failure counts of activation attempts per minute, hour and day
+    
+    Buckets are keyed by license type and reason, with a copy per client IP
+    when ``by_client_ip`` is set (client_ip '' holds all IPs). They are updated
+    by the activation log writer in the same transaction as the log rows,
+    so summaries never scan ``activation_logs``. ``compact()`` drops fine
+    buckets older than ``retention_days`` (the coarser ones still cover
+    them) and ``rebuild()`` recomputes buckets from the raw log, one day per
+    transaction, for logs written before the rollups existed.
+    """
+    
+    def __init__(self, engine, model, options=None):
+        self.model = model
+        
+        options = {**DEFAULT_OPTIONS, **(options or {})}
+        self.enabled = options['enabled']
+        self.by_client_ip = options['by_client_ip']
+        self.retention_days = {**DEFAULT_OPTIONS['retention_days'], **(options['retention_days'] or {})}
+        self.compact_interval = options['compact_interval_seconds']
+        self.rebuild_batch_size = options['rebuild_batch_size']
+        
+        self._upsert = insert_or_increment(
+            engine, model.__table__,
+            ('granularity', 'bucket_start') + DIMENSIONS, ('successes', 'failures')
+        )
+        self._lock = threading.Lock()
+        self._next_compaction = time.monotonic()
+        
+        self.stats = {
+            'rows_added': 0,
+            'buckets_updated': 0,
+            'compactions': 0,
+            'buckets_compacted': 0,
+            'days_rebuilt': 0
+        }
+    
+    def increments(self, rows):
+        """Rollup rows adding up the given activation log rows"""
+        return self._bucket_rows(self._count(rows))
+    
+    def _count(self, rows):
+        """Tally rows into a Counter keyed by bucket, dimensions and outcome"""
+        counts = Counter()
+        for row in rows:
+            license_type = row.get('license_type') or ''
+            reason = row.get('reason') or ''
+            # Every attempt is counted in an all-IPs bucket; per-IP buckets
+            # are kept next to it so summaries without client_ip stay small
+            variants = [(license_type, reason, '')]
+            if self.by_client_ip and row.get('client_ip'):
+                variants.append((license_type, reason, row['client_ip']))
+            
+            outcome = 'successes' if row.get('success') else 'failures'
+            for granularity, truncate in GRANULARITIES.items():
+                bucket = (granularity, truncate(row['activation_date']))
+                for dimensions in variants:
+                    counts[bucket + dimensions + (outcome,)] += 1
+        return counts
+    
+    def _bucket_rows(self, counts):
+        """Fold the outcome tallies of _count into one row per bucket"""
+        buckets = {}
+        for (*key, outcome), count in counts.items():
+            bucket = buckets.setdefault(tuple(key), {'successes': 0, 'failures': 0})
+            bucket[outcome] += count
+        return [
+            {'granularity': granularity, 'bucket_start': bucket_start,
+             **dict(zip(DIMENSIONS, dimensions)), **counts}
+            for (granularity, bucket_start, *dimensions), counts in buckets.items()
+        ]
+    
+    def add(self, session, rows):
+        """Add activation log rows to their buckets in session's transaction"""
+        if not self.enabled or not rows:
+            return
+        
+        increments = self.increments(rows)
+        session.execute(self._upsert, increments)
+        with self._lock:
+            self.stats['rows_added'] += len(rows)
+            self.stats['buckets_updated'] += len(increments)
+    
+    def maybe_compact(self, session_factory):
+        """Run compact() if compact_interval_seconds have passed since the last run"""
+        if not self.enabled or not self.compact_interval:
+            return
+        
+        with self._lock:
+            if time.monotonic() < self._next_compaction:
+                return
+            self._next_compaction = time.monotonic() + self.compact_interval
+        self.compact(session_factory)
+    
+    def compact(self, session_factory, now=None):
+        """Delete buckets older than the retention of their granularity"""
+        now = now or datetime.utcnow()
+        session = session_factory()
+        try:
+            deleted = 0
+            for granularity, days in self.retention_days.items():
+                if days is None:
+                    continue
+                deleted += session.query(self.model).filter(
+                    self.model.granularity == granularity,
+                    self.model.bucket_start < GRANULARITIES['day'](now) - timedelta(days=days)
+                ).delete(synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error compacting activation rollups: {e}")
+            return 0
+        finally:
+            session.close()
+        
+        with self._lock:
+            self.stats['compactions'] += 1
+            self.stats['buckets_compacted'] += deleted
+        return deleted
+    
+    def rebuild(self, session_factory, log_model, since=None, until=None):
+        """Recompute the buckets of [since, until) from the activation log
+        
+        Works one day at a time so each transaction stays short while the
+        log writer keeps running. Returns the number of days rebuilt.
+        """
+        until = until or datetime.utcnow()
+        if since is None:
+            session = session_factory()
+            try:
+                since = session.query(func.min(log_model.activation_date)).scalar()
+            finally:
+                session.close()
+            if since is None:
+                return 0
+        
+        day = GRANULARITIES['day'](since)
+        days = 0
+        while day < until:
+            next_day = day + timedelta(days=1)
+            self._rebuild_day(session_factory, log_model, day, next_day)
+            days += 1
+            day = next_day
+        
+        with self._lock:
+            self.stats['days_rebuilt'] += days
+        return days
+    
+    def _rebuild_day(self, session_factory, log_model, day, next_day):
+        session = session_factory()
+        try:
+            session.query(self.model).filter(
+                self.model.bucket_start >= day,
+                self.model.bucket_start < next_day
+            ).delete(synchronize_session=False)
+            
+            logs = session.query(
+                log_model.activation_date, log_model.license_type, log_model.reason,
+                log_model.client_ip, log_model.success
+            ).filter(
+                log_model.activation_date >= day,
+                log_model.activation_date < next_day
+            ).yield_per(self.rebuild_batch_size)
+            
+            counts = self._count(row._asdict() for row in logs)
+            if counts:
+                session.execute(self._upsert, self._bucket_rows(counts))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    def summarize(self, session, granularity='hour', since=None, until=None,
+                  group_by=('reason', 'license_type'), filters=None, limit=1000):
+        """Success/failure counts per bucket, grouped by the given dimensions
+        
+        ``filters`` maps dimensions to required values. Returns a list of
+        ``{'bucket', <dimensions>..., 'successes', 'failures'}`` dicts in
+        bucket order, at most limit of them.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        unknown = set(group_by) - set(DIMENSIONS) | set(filters or {}) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown dimension: {', '.join(sorted(unknown))}")
+        
+        until = until or datetime.utcnow()
+        since = since or until - DEFAULT_WINDOWS[granularity]
+        
+        columns = [self.model.bucket_start] + [getattr(self.model, name) for name in group_by]
+        query = session.query(
+            *columns,
+            func.sum(self.model.successes),
+            func.sum(self.model.failures)
+        ).filter(
+            self.model.granularity == granularity,
+            self.model.bucket_start >= GRANULARITIES[granularity](since),
+            self.model.bucket_start < until
+        )
+        if 'client_ip' in group_by or 'client_ip' in (filters or {}):
+            query = query.filter(self.model.client_ip != '')
+        else:
+            query = query.filter(self.model.client_ip == '')
+        for name, value in (filters or {}).items():
+            query = query.filter(getattr(self.model, name) == value)
+        
+        rows = query.group_by(*columns).order_by(*columns).limit(limit)
+        return [
+            {
+                'bucket': row[0].isoformat(),
+                **dict(zip(group_by, row[1:-2])),
+                'successes': int(row[-2] or 0),
+                'failures': int(row[-1] or 0)
+            }
+            for row in rows
+        ]
+    
+    def get_stats(self):
+        """Return rollup counters"""
+        with self._lock:
+            return {**self.stats, 'enabled': self.enabled}
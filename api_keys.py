@@ -0,0 +1,374 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+from collections import Counter, namedtuple
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from limits import parse
+from sqlalchemy import func, select
+
+from storage_profile import insert_or_increment
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPTIONS = {
+    'file': None,
+    'reload_interval_seconds': 10,
+    'flush_interval_seconds': 5,
+    'flush_batch_size': 500
+}
+
+# First day of the quota period containing a day
+QUOTA_PERIODS = {
+    'day': lambda day: day,
+    'month': lambda day: day.replace(day=1)
+}
+
+APIKey = namedtuple('APIKey', [
+    'key_hash', 'name', 'rate_limit', 'quota', 'quota_period', 'license_types'
+])
+
+def hash_api_key(api_key):
+    """Index key of an API key: its SHA-256 hex digest"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+def allows_license_type(api_key, license_type):
+    """Whether api_key (an APIKey or None) may validate keys of license_type"""
+    return api_key is None or api_key.license_types is None or license_type in api_key.license_types
+
+def parse_api_key(entry):
+    """Build an APIKey from a ``security.api_keys`` entry
+    
+    An entry is either the key itself or a mapping with ``key`` (or its
+    SHA-256 hex digest as ``key_sha256``) and optional ``name``,
+    ``rate_limit`` (a ``limits`` string such as ``"100 per minute"``),
+    ``quota``, ``quota_period`` (``day`` or ``month``) and
+    ``license_types``. Raises ValueError for malformed entries.
+    """
+    if isinstance(entry, str):
+        entry = {'key': entry}
+    if not isinstance(entry, dict):
+        raise ValueError("entry must be a string or an object")
+    
+    if entry.get('key'):
+        key_hash = hash_api_key(str(entry['key']))
+    else:
+        key_hash = str(entry.get('key_sha256') or '').lower()
+        if len(key_hash) != 64 or not all(char in '0123456789abcdef' for char in key_hash):
+            raise ValueError("entry needs a key or a 64-digit key_sha256")
+    
+    quota = entry.get('quota')
+    if quota is not None and (not isinstance(quota, int) or quota < 0):
+        raise ValueError("quota must be a non-negative integer")
+    quota_period = entry.get('quota_period', 'day')
+    if quota_period not in QUOTA_PERIODS:
+        raise ValueError(f"quota_period must be one of: {', '.join(QUOTA_PERIODS)}")
+    license_types = entry.get('license_types')
+    
+    return APIKey(
+        key_hash=key_hash,
+        name=entry.get('name') or key_hash[:12],
+        rate_limit=parse(entry['rate_limit']) if entry.get('rate_limit') else None,
+        quota=quota,
+        quota_period=quota_period,
+        license_types=frozenset(license_types) if license_types is not None else None
+    )
+
+class APIKeyIndex:
+    """API keys of ``security.api_keys`` indexed by their SHA-256 digest
+    
+    A lookup hashes the presented key and makes one dict probe, so its cost
+    does not grow with the number of keys, and the key itself is never
+    compared character by character against configured keys. Entries from
+    the optional ``security.api_key_index.file`` (a JSON list of the same
+    entries, usually with ``key_sha256`` so the file holds no plaintext
+    keys) are added to the configured ones. As with the IP list files, the
+    file is re-read when its modification time changes, checked at most
+    every ``reload_interval_seconds`` from the request path, and the new
+    index is swapped in with a single assignment.
+    """
+    
+    def __init__(self, security_config):
+        options = {**DEFAULT_OPTIONS, **(security_config.get('api_key_index') or {})}
+        self.api_keys = security_config.get('api_keys') or []
+        self.file = options['file']
+        self.reload_interval = options['reload_interval_seconds']
+        
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._last_check = 0.0
+        self.reloads = 0
+        self.lookups = 0
+        self.rejected = 0
+        self._keys = {}
+        self.reload()
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def __iter__(self):
+        return iter(list(self._keys.values()))
+    
+    def _read_file(self):
+        if not self.file:
+            return []
+        try:
+            with open(self.file, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading API key file {self.file}: {e}")
+            return []
+        if not isinstance(entries, list):
+            logger.error(f"Error reading API key file {self.file}: expected a JSON list")
+            return []
+        return entries
+    
+    def _file_mtime(self):
+        try:
+            return os.stat(self.file).st_mtime_ns if self.file else None
+        except OSError:
+            return None
+    
+    def reload(self, api_keys=None):
+        """Rebuild the index, optionally replacing the configured entries"""
+        with self._lock:
+            if api_keys is not None:
+                self.api_keys = api_keys
+            
+            mtime = self._file_mtime()
+            keys = {}
+            invalid = []
+            for entry in list(self.api_keys) + self._read_file():
+                try:
+                    api_key = parse_api_key(entry)
+                except ValueError as e:
+                    invalid.append(str(e))
+                    continue
+                keys[api_key.key_hash] = api_key
+            if invalid:
+                logger.warning(f"Ignoring {len(invalid)} invalid API key entries, e.g. {invalid[:3]}")
+            
+            self._keys = keys
+            self._mtime = mtime
+            self._last_check = time.monotonic()
+            self.reloads += 1
+    
+    def maybe_reload(self):
+        """Reload the key file if it changed; cheap when called often"""
+        if not self.file:
+            return False
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return False
+        self._last_check = now
+        if self._file_mtime() == self._mtime:
+            return False
+        self.reload()
+        logger.info("Reloaded API keys")
+        return True
+    
+    def lookup(self, api_key):
+        """APIKey of a presented X-API-Key value, or None if it is unknown"""
+        self.maybe_reload()
+        self.lookups += 1
+        found = self._keys.get(hash_api_key(api_key)) if api_key else None
+        if found is None:
+            self.rejected += 1
+        return found
+    
+    def get_stats(self):
+        """Return index size and counters"""
+        keys = list(self._keys.values())
+        return {
+            'keys': len(keys),
+            'with_rate_limit': sum(api_key.rate_limit is not None for api_key in keys),
+            'with_quota': sum(api_key.quota is not None for api_key in keys),
+            'restricted_license_types': sum(api_key.license_types is not None for api_key in keys),
+            'reloads': self.reloads,
+            'lookups': self.lookups,
+            'rejected': self.rejected
+        }
+
+class APIKeyUsageTracker:
+    """Per-key request counters and quota checks, flushed to the database in batches
+    
+    record() counts a request in memory and, for keys with a quota, checks
+    it against the key's usage in the current quota period. A background
+    thread adds the counts to ``api_key_usage`` (one row per key and day)
+    every ``flush_interval_seconds`` with an insert-or-increment upsert of
+    at most ``flush_batch_size`` rows per statement, then re-reads the
+    period totals of the quota keys. Requests counted by other worker
+    processes therefore show up within one flush interval, which bounds
+    how far a quota can be overrun.
+    """
+    
+    def __init__(self, engine, session_factory, model, options=None):
+        self.Session = session_factory
+        self.model = model
+        
+        options = {**DEFAULT_OPTIONS, **(options or {})}
+        self.flush_interval = options['flush_interval_seconds']
+        self.batch_size = max(1, options['flush_batch_size'])
+        
+        self._upsert = insert_or_increment(engine, model.__table__, ('key_hash', 'day'), ('requests', 'rejected'))
+        self._lock = threading.Lock()
+        self._requests = Counter()
+        self._rejected = Counter()
+        # key_hash -> (period start, requests in the period) of quota keys
+        self._used = {}
+        self._quota_keys = {}
+        self._stop = threading.Event()
+        self._thread = None
+        
+        self.stats = {
+            'requests': 0,
+            'over_quota': 0,
+            'flushes': 0,
+            'rows_written': 0,
+            'errors': 0
+        }
+    
+    def start(self):
+        """Start the background flush thread"""
+        with self._lock:
+            if not self.flush_interval or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='api-key-usage-flusher', daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+    
+    def record(self, api_key, today=None):
+        """Count one request of api_key; return False if it is over its quota"""
+        today = today or datetime.utcnow().date()
+        bucket = (api_key.key_hash, today)
+        with self._lock:
+            if api_key.quota is not None:
+                period_start = QUOTA_PERIODS[api_key.quota_period](today)
+                used_start, used = self._used.get(api_key.key_hash, (period_start, 0))
+                if used_start != period_start:
+                    used = 0
+                self._quota_keys[api_key.key_hash] = api_key
+                if used >= api_key.quota:
+                    self._rejected[bucket] += 1
+                    self.stats['over_quota'] += 1
+                    return False
+                self._used[api_key.key_hash] = (period_start, used + 1)
+            
+            self._requests[bucket] += 1
+            self.stats['requests'] += 1
+        return True
+    
+    def refresh(self, api_keys):
+        """Load the period totals of the quota keys among api_keys from the database"""
+        api_keys = [api_key for api_key in api_keys if api_key.quota is not None]
+        with self._lock:
+            for api_key in api_keys:
+                self._quota_keys[api_key.key_hash] = api_key
+        self._apply_totals(self.usage(api_keys))
+    
+    def usage(self, api_keys):
+        """Map key_hash to (period start, stored requests in the current quota period)"""
+        session = self.Session()
+        try:
+            return self._period_totals(session, api_keys)
+        except Exception as e:
+            logger.error(f"Error loading API key usage: {e}")
+            return {}
+        finally:
+            session.close()
+    
+    def flush(self):
+        """Write the pending counters and refresh the quota totals; return the rows written"""
+        with self._lock:
+            requests, rejected = self._requests, self._rejected
+            self._requests, self._rejected = Counter(), Counter()
+            quota_keys = list(self._quota_keys.values())
+        
+        rows = [
+            {'key_hash': key_hash, 'day': day,
+             'requests': requests[key_hash, day], 'rejected': rejected[key_hash, day]}
+            for key_hash, day in requests.keys() | rejected.keys()
+        ]
+        if not rows and not quota_keys:
+            return 0
+        
+        session = self.Session()
+        try:
+            for start in range(0, len(rows), self.batch_size):
+                session.execute(self._upsert, rows[start:start + self.batch_size])
+            session.commit()
+            totals = self._period_totals(session, quota_keys)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error flushing API key usage: {e}")
+            with self._lock:
+                self._requests.update(requests)
+                self._rejected.update(rejected)
+                self.stats['errors'] += 1
+            return 0
+        finally:
+            session.close()
+        
+        self._apply_totals(totals)
+        with self._lock:
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += len(rows)
+        return len(rows)
+    
+    def _period_totals(self, session, api_keys):
+        """Map key_hash to (period start, stored requests in the current quota period)"""
+        today = datetime.utcnow().date()
+        by_period = {}
+        for api_key in api_keys:
+            by_period.setdefault(QUOTA_PERIODS[api_key.quota_period](today), []).append(api_key.key_hash)
+        
+        totals = {}
+        for period_start, key_hashes in by_period.items():
+            for start in range(0, len(key_hashes), self.batch_size):
+                chunk = key_hashes[start:start + self.batch_size]
+                rows = session.execute(
+                    select(self.model.key_hash, func.sum(self.model.requests))
+                    .where(self.model.key_hash.in_(chunk), self.model.day >= period_start)
+                    .group_by(self.model.key_hash)
+                )
+                stored = dict(rows.all())
+                for key_hash in chunk:
+                    totals[key_hash] = (period_start, int(stored.get(key_hash) or 0))
+        return totals
+    
+    def _apply_totals(self, totals):
+        with self._lock:
+            # Requests counted since the flush started are still pending
+            pending = Counter()
+            for (key_hash, day), count in self._requests.items():
+                if key_hash in totals and day >= totals[key_hash][0]:
+                    pending[key_hash] += count
+            for key_hash, (period_start, stored) in totals.items():
+                self._used[key_hash] = (period_start, stored + pending[key_hash])
+    
+    def close(self, timeout=10):
+        """Stop the flush thread and write what is left"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+    
+    def get_stats(self):
+        """Return usage counters"""
+        with self._lock:
+            return {**self.stats, 'pending_rows': len(self._requests.keys() | self._rejected.keys())}
@@ -5,28 +5,156 @@
 # Copyright (c) 2025 developercreation
 
 
-from flask import Flask, request, jsonify
-from flask_limiter import Limiter
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_limiter.util import get_remote_address
+import atexit
 import json
 import logging
 from logging.handlers import RotatingFileHandler
-from datetime import datetime
-import base64
-import hmac
-import hashlib
-from database import DatabaseManager
+from datetime import datetime, timezone
+import os
+from database import MAX_DEVICE_ID_LENGTH, DatabaseManager
 from security import SecurityManager
 from key_generator import KeyGenerator
+from prefork import PreforkServer
+from ip_filter import IPAccessFilter
+from api_keys import APIKeyIndex, allows_license_type
+from rate_limiter import RateLimiter
+from replay_guard import ReplayGuard
+from leases import LeaseSigner
+from activation_rollups import DIMENSIONS, GRANULARITIES
+from maintenance import MaintenanceScheduler, schedule_database_jobs
+
+SUMMARY_DEFAULT_LIMIT = 1000
+SUMMARY_MAX_LIMIT = 10000
+
+def valid_device_id(device_id):
+    """Whether an optional device_id from a request can be stored"""
+    return device_id is None or (isinstance(device_id, str) and 0 < len(device_id) <= MAX_DEVICE_ID_LENGTH)
+
+def parse_batch_licenses(license_registry, licenses, api_key=None):
+    """Check the shape of each batch item
+    
+    Returns ``(results, to_validate, positions)``: results holds the
+    rejections of malformed items and of license types api_key (the
+    request's APIKey) may not validate, to_validate the items for the
+    database and positions their indexes in the original list.
+    """
+    results = [None] * len(licenses)
+    to_validate = []
+    positions = []
+    key_length = license_registry.key_length
+    
+    for index, item in enumerate(licenses):
+        if (not isinstance(item, dict)
+                or not isinstance(item.get('license_key'), str)
+                or not isinstance(item.get('license_type'), str)):
+            results[index] = (False, 'Missing required field: license_key or license_type')
+        elif len(item['license_key']) != key_length(item['license_type']):
+            results[index] = (False, 'Invalid key format')
+        elif item['license_type'] not in license_registry:
+            results[index] = (False, 'Invalid license type')
+        elif not allows_license_type(api_key, item['license_type']):
+            results[index] = (False, 'License type not allowed for this API key')
+        elif not valid_device_id(item.get('device_id')):
+            results[index] = (False, 'Invalid device_id')
+        else:
+            to_validate.append({
+                'license_key': item['license_key'],
+                'license_type': item['license_type'],
+                'client_info': item.get('client_info', ''),
+                'device_id': item.get('device_id')
+            })
+            positions.append(index)
+    
+    return results, to_validate, positions
+
+def batch_response_results(licenses, results):
+    """Build the per-key response entries and count the valid keys"""
+    response_results = []
+    valid_count = 0
+    for item, (is_valid, message) in zip(licenses, results):
+        valid_count += is_valid
+        response_results.append({
+            'license_key': item.get('license_key') if isinstance(item, dict) else None,
+            'status': 'success' if is_valid else 'error',
+            'message': message
+        })
+    return response_results, valid_count
+
+def parse_revocations_since(args):
+    """Version the client of /api/revocations has synced to, from its since parameter
+    
+    Raises ValueError with a client-facing message for an invalid value.
+    """
+    try:
+        since = int(args.get('since', 0))
+    except ValueError:
+        raise ValueError("since must be a non-negative integer")
+    if since < 0:
+        raise ValueError("since must be a non-negative integer")
+    return since
+
+def parse_summary_query(args):
+    """Turn /api/admin/activations/summary query parameters into summarize() arguments
+    
+    Raises ValueError with a client-facing message for invalid parameters.
+    """
+    granularity = args.get('granularity', 'hour')
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    
+    times = {}
+    for name in ('since', 'until'):
+        value = args.get(name)
+        try:
+            moment = datetime.fromisoformat(value) if value else None
+        except ValueError:
+            raise ValueError(f"{name} must be an ISO 8601 timestamp")
+        # Buckets are stored in naive UTC
+        if moment is not None and moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        times[name] = moment
+    
+    group_by = tuple(name for name in args.get('group_by', 'reason,license_type').split(',') if name)
+    if set(group_by) - set(DIMENSIONS):
+        raise ValueError(f"group_by accepts: {', '.join(DIMENSIONS)}")
+    
+    try:
+        limit = min(max(int(args.get('limit', SUMMARY_DEFAULT_LIMIT)), 1), SUMMARY_MAX_LIMIT)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    
+    return {
+        'granularity': granularity,
+        'since': times['since'],
+        'until': times['until'],
+        'group_by': group_by,
+        'filters': {name: args[name] for name in DIMENSIONS if name in args},
+        'limit': limit
+    }
 
 class LicenseServer:
     def __init__(self, config_path='config.json'):
         self.load_config(config_path)
         self.setup_logging()
         self.security = SecurityManager(self.config)
+        self.ip_filter = IPAccessFilter(self.config['security'])
+        self.api_keys = APIKeyIndex(self.config['security'])
+        # Created before pre-fork workers so they share one set of counters
+        self.rate_limiter = RateLimiter(self.config['rate_limiting'], self.config['security'])
+        self.replay_guard = ReplayGuard(self.config['security'])
+        self.leases = LeaseSigner(self.config['licensing'], self.security.license_registry)
         self.db = DatabaseManager(self.config, self.security)
+        self.db.load_key_filter()
+        self.db.api_key_usage.refresh(self.api_keys)
+        self.worker_index = None
         self.key_generator = KeyGenerator(self.config, self.security, self.db)
+        # Started by run(); in pre-fork mode only by worker 0
+        self.maintenance = MaintenanceScheduler()
+        schedule_database_jobs(self.maintenance, self.db)
         self.app = self.create_flask_app()
+        atexit.register(self.shutdown)
     
     def load_config(self, config_path):
         """Load configuration"""
@@ -55,17 +183,6 @@ class LicenseServer:
         """Create Flask application"""
         app = Flask(__name__)
         
-        # Configure rate limiter with storage
-        limiter_config = self.config['rate_limiting']
-        self.limiter = Limiter(
-            app=app,
-            key_func=get_remote_address,
-            default_limits=[f"{self.config['security']['max_requests_per_minute']} per minute"],
-            storage_uri=limiter_config['storage_uri'],
-            strategy=limiter_config['strategy'],
-            storage_options=limiter_config['storage_options']
-        )
-        
         @app.before_request
         def before_request():
             """Security check before each request"""
@@ -73,20 +190,42 @@ class LicenseServer:
             if request.path == '/health':
                 return
             
-            if not self.authenticate_request():
+            g.api_key = self.api_keys.lookup(request.headers.get('X-API-Key'))
+            if not self.rate_limiter.check_request(get_remote_address(), g.api_key):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Rate limit exceeded'
+                }), 429
+            
+            if not self.authenticate_request(g.api_key):
                 return jsonify({
                     'status': 'error',
                     'message': 'Authentication failed'
                 }), 401
             
+            # A version 2 signature covers its X-Timestamp, so any signed
+            # request (GETs included) is checked for replay here
+            if g.get('signed_at') is not None:
+                rejection = self.replay_guard.check(g.signed_at, request.headers['X-Signature'])
+                if rejection:
+                    return jsonify({
+                        'status': 'error',
+                        'message': rejection[1]
+                    }), rejection[0]
+            
             if not self.check_ip_restrictions():
                 return jsonify({
                     'status': 'error', 
                     'message': 'IP address not allowed'
                 }), 403
+            
+            if g.api_key is not None and not self.db.api_key_usage.record(g.api_key):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'API key quota exceeded'
+                }), 429
         
         @app.route('/api/validate', methods=['POST'])
-        @self.limiter.limit(f"{self.config['security']['max_requests_per_minute']} per minute")
         def validate_license():
             """Endpoint for license validation"""
             try:
@@ -106,31 +245,54 @@ class LicenseServer:
                             'message': f'Missing required field: {field}'
                         }), 400
                 
+                if g.get('signed_at') is None:
+                    rejection = self.replay_guard.check(
+                        data['timestamp'], request.headers.get('X-Signature') or request.get_data()
+                    )
+                    if rejection:
+                        return jsonify({
+                            'status': 'error',
+                            'message': rejection[1]
+                        }), rejection[0]
+                
                 license_key = data['license_key']
                 license_type = data['license_type']
-                timestamp = data['timestamp']
                 client_info = data.get('client_info', '')
+                device_id = data.get('device_id')
                 
                 # Check key format
-                if len(license_key) != self.config['licensing']['key_length']:
+                if len(license_key) != self.security.license_registry.key_length(license_type):
                     return jsonify({
                         'status': 'error',
                         'message': 'Invalid key format'
                     }), 400
                 
                 # Check license type
-                if license_type not in self.config['licensing']['license_types']:
+                if license_type not in self.security.license_types:
                     return jsonify({
                         'status': 'error',
                         'message': 'Invalid license type'
                     }), 400
                 
+                if not allows_license_type(g.api_key, license_type):
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'License type not allowed for this API key'
+                    }), 403
+                
+                if not valid_device_id(device_id):
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'Invalid device_id'
+                    }), 400
+                
                 # Validate license
                 is_valid, message = self.db.validate_license(
                     license_key,
                     license_type,
                     client_info,
-                    get_remote_address()
+                    get_remote_address(),
+                    device_id
                 )
                 
                 response_data = {
@@ -138,6 +300,11 @@ class LicenseServer:
                     'message': message,
                     'timestamp': datetime.utcnow().isoformat()
                 }
+                if is_valid and device_id and self.leases.enabled:
+                    key_hash = self.security.hash_key(license_key)
+                    response_data.update(self.leases.response_fields(
+                        key_hash, license_type, device_id, self.db.license_expiration(key_hash)
+                    ))
                 
                 # Log request
                 if self.config['logging']['log_requests']:
@@ -156,8 +323,84 @@ class LicenseServer:
                     'message': 'Internal server error'
                 }), 500
         
+        @app.route('/api/validate/batch', methods=['POST'])
+        def validate_license_batch():
+            """Endpoint for validating many licenses in one request"""
+            try:
+                data = request.get_json()
+                
+                if not data:
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'No JSON data provided'
+                    }), 400
+                
+                required_fields = ['licenses', 'timestamp']
+                for field in required_fields:
+                    if field not in data:
+                        return jsonify({
+                            'status': 'error',
+                            'message': f'Missing required field: {field}'
+                        }), 400
+                
+                if g.get('signed_at') is None:
+                    rejection = self.replay_guard.check(
+                        data['timestamp'], request.headers.get('X-Signature') or request.get_data()
+                    )
+                    if rejection:
+                        return jsonify({
+                            'status': 'error',
+                            'message': rejection[1]
+                        }), rejection[0]
+                
+                licenses = data['licenses']
+                if not isinstance(licenses, list) or not licenses:
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'licenses must be a non-empty list'
+                    }), 400
+                
+                max_batch_size = self.config['licensing'].get('max_batch_size', 1000)
+                if len(licenses) > max_batch_size:
+                    return jsonify({
+                        'status': 'error',
+                        'message': f'Batch too large (max {max_batch_size} keys)'
+                    }), 413
+                
+                results, to_validate, positions = parse_batch_licenses(
+                    self.security.license_registry, licenses, g.api_key
+                )
+                
+                if to_validate:
+                    validated = self.db.validate_licenses_bulk(to_validate, get_remote_address())
+                    for index, result in zip(positions, validated):
+                        results[index] = result
+                
+                response_results, valid_count = batch_response_results(licenses, results)
+                
+                # Log request
+                if self.config['logging']['log_requests']:
+                    self.logger.info(
+                        f"Batch license validation - Keys: {len(licenses)}, "
+                        f"Valid: {valid_count}, IP: {get_remote_address()}"
+                    )
+                
+                return jsonify({
+                    'status': 'success',
+                    'valid_count': valid_count,
+                    'total': len(licenses),
+                    'results': response_results,
+                    'timestamp': datetime.utcnow().isoformat()
+                }), 200
+            
+            except Exception as e:
+                self.logger.error(f"Error in validate_license_batch: {str(e)}")
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Internal server error'
+                }), 500
+        
         @app.route('/api/admin/generate-keys', methods=['POST'])
-        @self.limiter.limit(f"{self.config['security']['max_requests_per_minute']} per minute")
         def generate_keys():
             """Endpoint for key generation (admin only)"""
             try:
@@ -168,7 +411,34 @@ class LicenseServer:
                         'message': 'Admin authentication required'
                     }), 401
                 
-                results = self.key_generator.generate_keys_for_all_types()
+                data = request.get_json(silent=True) or {}
+                license_types = self.security.license_registry.names
+                if data.get('license_type') is not None:
+                    if data['license_type'] not in license_types:
+                        return jsonify({
+                            'status': 'error',
+                            'message': 'Invalid license type'
+                        }), 400
+                    license_types = [data['license_type']]
+                
+                count = data.get('count', self.config['licensing']['keys_per_type'])
+                if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'count must be a positive integer'
+                    }), 400
+                
+                stream = data.get('stream') or 'application/x-ndjson' in request.headers.get('Accept', '')
+                if stream:
+                    return Response(
+                        stream_with_context(self._stream_generated_keys(license_types, count)),
+                        mimetype='application/x-ndjson'
+                    )
+                
+                results = {
+                    license_type: self.key_generator.generate_keys_for_type(license_type, count)
+                    for license_type in license_types
+                }
                 
                 return jsonify({
                     'status': 'success',
@@ -184,7 +454,6 @@ class LicenseServer:
                 }), 500
         
         @app.route('/api/admin/stats', methods=['GET'])
-        @self.limiter.limit(f"{self.config['security']['max_requests_per_minute']} per minute")
         def get_stats():
             """Endpoint for getting statistics (admin only)"""
             try:
@@ -196,6 +465,19 @@ class LicenseServer:
                     }), 401
                 
                 stats = self.db.get_license_stats()
+                stats['activation_log'] = self.db.activation_log.get_stats()
+                stats['activation_rollups'] = self.db.activation_rollups.get_stats()
+                stats['log_retention'] = self.db.log_retention.get_stats()
+                stats['maintenance'] = self.maintenance.get_stats()
+                stats['backup'] = self.db.backup.get_stats()
+                stats['cache'] = self.db.license_cache.get_stats()
+                stats['key_filter'] = self.db.key_filter.get_stats()
+                stats['ip_filter'] = self.ip_filter.get_stats()
+                stats['rate_limiter'] = self.rate_limiter.get_stats()
+                stats['replay_guard'] = self.replay_guard.get_stats()
+                stats['leases'] = self.leases.get_stats()
+                stats['revocations'] = self.db.revocations.get_stats()
+                stats['api_keys'] = {**self.api_keys.get_stats(), 'usage': self.db.api_key_usage.get_stats()}
                 
                 return jsonify({
                     'status': 'success',
@@ -209,67 +491,254 @@ class LicenseServer:
                     'message': 'Internal server error'
                 }), 500
         
+        @app.route('/api/admin/revoke', methods=['POST'])
+        def revoke_license():
+            """Endpoint for revoking, or with "revoked": false restoring, a license key (admin only)"""
+            try:
+                auth_header = request.headers.get('Authorization')
+                if not self.verify_admin_token(auth_header):
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'Admin authentication required'
+                    }), 401
+                
+                data = request.get_json(silent=True) or {}
+                key_hash = data.get('key_hash')
+                if not key_hash and isinstance(data.get('license_key'), str):
+                    key_hash = self.security.hash_key(data['license_key'])
+                if not isinstance(key_hash, str) or not key_hash:
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'license_key or key_hash is required'
+                    }), 400
+                
+                revoked = data.get('revoked', True)
+                if not isinstance(revoked, bool):
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'revoked must be true or false'
+                    }), 400
+                
+                if not self.db.set_license_active(key_hash, not revoked):
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'License key not found'
+                    }), 404
+                
+                return jsonify({
+                    'status': 'success',
+                    'key_hash': key_hash,
+                    'revoked': revoked
+                }), 200
+                
+            except Exception as e:
+                self.logger.error(f"Error in revoke_license: {str(e)}")
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Internal server error'
+                }), 500
+        
+        @app.route('/api/admin/api-keys', methods=['GET'])
+        def get_api_keys():
+            """Endpoint for API key limits and usage in the current quota period (admin only)"""
+            try:
+                auth_header = request.headers.get('Authorization')
+                if not self.verify_admin_token(auth_header):
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'Admin authentication required'
+                    }), 401
+                
+                api_keys = list(self.api_keys)
+                self.db.api_key_usage.flush()
+                usage = self.db.api_key_usage.usage(api_keys)
+                
+                entries = []
+                for api_key in api_keys:
+                    period_start, used = usage.get(api_key.key_hash, (None, None))
+                    entries.append({
+                        'name': api_key.name,
+                        'key_sha256': api_key.key_hash,
+                        'rate_limit': str(api_key.rate_limit) if api_key.rate_limit else None,
+                        'quota': api_key.quota,
+                        'quota_period': api_key.quota_period,
+                        'license_types': sorted(api_key.license_types) if api_key.license_types is not None else None,
+                        'period_start': period_start.isoformat() if period_start else None,
+                        'requests': used
+                    })
+                
+                return jsonify({
+                    'status': 'success',
+                    'api_keys': entries
+                }), 200
+                
+            except Exception as e:
+                self.logger.error(f"Error in get_api_keys: {str(e)}")
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Internal server error'
+                }), 500
+        
+        @app.route('/api/admin/activations/summary', methods=['GET'])
+        def get_activation_summary():
+            """Endpoint for time-bucketed activation counts (admin only)"""
+            try:
+                auth_header = request.headers.get('Authorization')
+                if not self.verify_admin_token(auth_header):
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'Admin authentication required'
+                    }), 401
+                
+                try:
+                    query = parse_summary_query(request.args)
+                    buckets = self.db.get_activation_summary(**query)
+                except ValueError as e:
+                    return jsonify({
+                        'status': 'error',
+                        'message': str(e)
+                    }), 400
+                
+                return jsonify({
+                    'status': 'success',
+                    'granularity': query['granularity'],
+                    'group_by': list(query['group_by']),
+                    'buckets': buckets,
+                    'totals': {
+                        'successes': sum(bucket['successes'] for bucket in buckets),
+                        'failures': sum(bucket['failures'] for bucket in buckets)
+                    },
+                    'truncated': len(buckets) >= query['limit']
+                }), 200
+                
+            except Exception as e:
+                self.logger.error(f"Error in get_activation_summary: {str(e)}")
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Internal server error'
+                }), 500
+        
+        @app.route('/api/license-types', methods=['GET'])
+        def get_license_types():
+            """Endpoint for the license type registry, revalidated by ETag"""
+            registry = self.security.license_registry
+            if registry.etag_matches(request.headers.get('If-None-Match')):
+                response = Response(status=304)
+            else:
+                response = jsonify({
+                    'status': 'success',
+                    'license_types': registry.document
+                })
+            response.headers['ETag'] = registry.etag
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        
+        @app.route('/api/revocations', methods=['GET'])
+        def get_revocations():
+            """Endpoint for the keys revoked since a feed version, revalidated by ETag"""
+            try:
+                since = parse_revocations_since(request.args)
+            except ValueError as e:
+                return jsonify({
+                    'status': 'error',
+                    'message': str(e)
+                }), 400
+            
+            feed = self.db.revocations
+            if not feed.enabled:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Revocation feed is not available on this database'
+                }), 501
+            
+            version = self.db.revocation_version()
+            if feed.not_modified_since(request.headers.get('If-None-Match'), version):
+                response = Response(status=304)
+                response.headers['ETag'] = feed.etag(version)
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
+            
+            body, headers = feed.encode(
+                self.db.get_revocations(since, version), request.headers.get('Accept-Encoding')
+            )
+            return Response(body, status=200, mimetype='application/json', headers=headers)
+        
         @app.route('/health', methods=['GET'])
         def health_check():
             """Endpoint for server health check"""
             return jsonify({
                 'status': 'success',
                 'message': 'Server is running',
-                'timestamp': datetime.utcnow().isoformat()
+                'timestamp': datetime.utcnow().isoformat(),
+                'backup': self.db.backup.health()
             }), 200
         
         return app
     
-    def _generate_hmac_signature(self, data: str) -> str:
-        """Generate HMAC signature on server"""
-        try:
-            secret_bytes = base64.b64decode(self.config['security']['hmac_secret'])
-            signature = hmac.new(
-                secret_bytes,
-                data.encode('utf-8'),
-                hashlib.sha256
-            ).digest()
-            return base64.b64encode(signature).decode('utf-8')
-        except Exception as e:
-            print(f"❌ Server HMAC generation error: {e}")
-            return ""
+    def _stream_generated_keys(self, license_types, count):
+        """Yield NDJSON lines for generated keys, then one summary line per type
+        
+        Keys are sent in blocks of KeyGenerator.GENERATION_CHUNK lines as
+        they are stored, so neither side holds the full key list.
+        """
+        for license_type in license_types:
+            summary = {}
+            lines = []
+            try:
+                for key in self.key_generator.iter_generated_keys(license_type, count, summary):
+                    lines.append(json.dumps({'license_type': license_type, 'key': key}))
+                    if len(lines) >= KeyGenerator.GENERATION_CHUNK:
+                        yield '\n'.join(lines) + '\n'
+                        lines = []
+            except Exception as e:
+                # Headers are already sent; report the failure in-band
+                self.logger.error(f"Error streaming generated {license_type} keys: {str(e)}")
+                lines.append(json.dumps({'status': 'error', 'message': 'Internal server error'}))
+                yield '\n'.join(lines) + '\n'
+                return
+            
+            lines.append(json.dumps({'license_type': license_type, 'summary': summary}))
+            yield '\n'.join(lines) + '\n'
     
-    def authenticate_request(self):
-        """Authenticate request"""
+    def authenticate_request(self, api_key=None):
+        """Authenticate request
+        
+        api_key is the APIKey of the request's X-API-Key header; it is
+        looked up here when not given.
+        """
         if not self.config['security']['api_key_required']:
             return True
         
-        api_key = request.headers.get('X-API-Key')
-        if api_key not in self.config['security']['api_keys']:
+        if api_key is None:
+            api_key = self.api_keys.lookup(request.headers.get('X-API-Key'))
+        if api_key is None:
             return False
         
         if self.config['security']['require_encrypted_communication']:
             signature = request.headers.get('X-Signature')
             if not signature:
-                print("❌ HMAC signature missing")
-                return False
-            
-            # Get request data
-            data = request.get_json()
-            if not data:
-                print("❌ No data for signature verification")
+                self.logger.debug("Request rejected: HMAC signature missing")
                 return False
             
-            # Format same as client
-            data_str = json.dumps(data, sort_keys=True, separators=(',', ':'))
-            print(f"🔐 Data for verification: {data_str}")
-            print(f"🔐 Received signature: {signature}")
-            
-            # Generate expected signature
-            expected_signature = self._generate_hmac_signature(data_str)
-            print(f"🔐 Expected signature: {expected_signature}")
+            # Version 2 signs the request line, X-Timestamp and raw body;
+            # version 1 (no header) signs the canonical JSON, which Flask
+            # has already parsed and cached
+            version = request.headers.get('X-Signature-Version')
+            data = None
+            if not version or version == '1':
+                data = request.get_json(silent=True)
+                if not data:
+                    self.logger.debug("Request rejected: no data for signature verification")
+                    return False
             
-            # Compare signatures
-            if not hmac.compare_digest(signature, expected_signature):
-                print("❌ HMAC signatures don't match")
+            timestamp = request.headers.get('X-Timestamp')
+            target = self.security.request_target(request.path, request.query_string)
+            if not self.security.verify_request_signature(signature, request.get_data(), version, data,
+                                                          request.method, target, timestamp):
+                self.logger.debug(f"Request rejected: invalid HMAC signature (version {version or '1'})")
                 return False
-            
-            print("✅ HMAC signature is valid")
+            if version == '2':
+                g.signed_at = timestamp
         
         return True
     
@@ -284,22 +753,39 @@ class LicenseServer:
     
     def check_ip_restrictions(self):
         """Check IP restrictions"""
-        client_ip = get_remote_address()
-        allowed_ips = self.config['security']['allowed_ips']
-        blocked_ips = self.config['security']['blocked_ips']
-        
-        if allowed_ips and client_ip not in allowed_ips:
-            return False
-        
-        if blocked_ips and client_ip in blocked_ips:
-            return False
-        
-        return True
+        return self.ip_filter.is_allowed(get_remote_address())
+    
+    def shutdown(self):
+        """Flush pending work and release resources"""
+        self.maintenance.stop()
+        self.db.close()
+        self.rate_limiter.close()
+        self.replay_guard.close()
+    
+    def prepare_fork(self):
+        """Stop background threads before worker processes are forked"""
+        self.maintenance.stop()
+        self.db.prepare_fork()
+    
+    def post_fork(self, worker_index):
+        """Reset per-process state in a freshly forked worker"""
+        self.worker_index = worker_index
+        self.db.post_fork()
+        if worker_index == 0:
+            self.maintenance.start()
     
     def run(self):
         """Start server"""
         server_config = self.config['server']
         
+        if server_config.get('mode', 'development') == 'prefork':
+            if hasattr(os, 'fork'):
+                PreforkServer(self, server_config).run()
+                return
+            self.logger.warning("Pre-fork mode needs os.fork(), falling back to the development server")
+        
+        self.maintenance.start()
+        
         if server_config['ssl_enabled']:
             ssl_context = (
                 server_config['ssl_cert_path'],
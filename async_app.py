@@ -0,0 +1,441 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+import asyncio
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+from datetime import datetime
+from urllib.parse import parse_qsl
+from app import parse_batch_licenses, batch_response_results, parse_revocations_since, valid_device_id
+from async_database import AsyncDatabaseManager
+from ip_filter import IPAccessFilter
+from api_keys import APIKeyIndex, allows_license_type
+from rate_limiter import RateLimiter
+from replay_guard import ReplayGuard
+from leases import LeaseSigner
+from maintenance import MaintenanceScheduler, schedule_database_jobs
+from security import SecurityManager
+
+class AsyncRequest:
+    """Minimal request object built from an ASGI scope and its body"""
+    
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query_string = scope.get('query_string', b'').decode('latin-1')
+        self.args = dict(parse_qsl(self.query_string))
+        self.headers = {
+            name.decode('latin-1').lower(): value.decode('latin-1')
+            for name, value in scope.get('headers', [])
+        }
+        client = scope.get('client')
+        self.remote_addr = client[0] if client else '127.0.0.1'
+        self.body = body
+        # APIKey of the X-API-Key header, set by dispatch()
+        self.api_key = None
+        # X-Timestamp of a verified version 2 signature
+        self.signed_at = None
+        self._json = None
+        self._json_loaded = False
+    
+    def get_json(self):
+        """Parsed JSON body or None"""
+        if not self._json_loaded:
+            self._json_loaded = True
+            try:
+                self._json = json.loads(self.body) if self.body else None
+            except ValueError:
+                self._json = None
+        return self._json
+
+class AsyncLicenseServer:
+    """ASGI application serving the validation API on asyncio
+    
+    Serves ``/api/validate``, ``/api/validate/batch``, ``/api/license-types``,
+    ``/api/revocations`` and ``/health`` with the same authentication, IP
+    restrictions, rate limits and responses as LicenseServer, backed by
+    AsyncDatabaseManager.
+    Admin endpoints stay on the Flask server. Run it with ``python run.py``
+    and ``server.mode`` set to ``"async"`` (needs ``uvicorn`` and
+    ``aiosqlite``), or mount the instance in any ASGI server.
+    """
+    
+    MAX_BODY_BYTES = 1024 * 1024
+    
+    def __init__(self, config_path='config.json'):
+        self.load_config(config_path)
+        self.setup_logging()
+        self.security = SecurityManager(self.config)
+        self.ip_filter = IPAccessFilter(self.config['security'])
+        self.api_keys = APIKeyIndex(self.config['security'])
+        self.db = AsyncDatabaseManager(self.config, self.security)
+        self.maintenance = MaintenanceScheduler()
+        schedule_database_jobs(self.maintenance, self.db)
+        self.rate_limiter = RateLimiter(self.config['rate_limiting'], self.config['security'])
+        self.replay_guard = ReplayGuard(self.config['security'])
+        self.leases = LeaseSigner(self.config['licensing'], self.security.license_registry)
+        
+        self.routes = {
+            ('POST', '/api/validate'): self.validate_license,
+            ('POST', '/api/validate/batch'): self.validate_license_batch,
+            ('GET', '/api/license-types'): self.get_license_types,
+            ('GET', '/api/revocations'): self.get_revocations,
+            ('GET', '/health'): self.health_check
+        }
+        self._started = False
+        self._start_lock = asyncio.Lock()
+    
+    def load_config(self, config_path):
+        """Load configuration"""
+        with open(config_path, 'r') as f:
+            self.config = json.load(f)
+    
+    def setup_logging(self):
+        """Setup logging"""
+        logging_config = self.config['logging']
+        
+        handler = RotatingFileHandler(
+            logging_config['file'],
+            maxBytes=logging_config['max_file_size_mb'] * 1024 * 1024,
+            backupCount=logging_config['backup_count']
+        )
+        
+        logging.basicConfig(
+            level=getattr(logging, logging_config['level']),
+            format='%(asctime)s %(levelname)s %(name)s %(message)s',
+            handlers=[handler]
+        )
+        
+        self.logger = logging.getLogger(__name__)
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        
+        await self._ensure_started()
+        
+        body = await self._read_body(receive)
+        if body is None:
+            await self._send_json(send, 413, {'status': 'error', 'message': 'Request body too large'})
+            return
+        
+        request = AsyncRequest(scope, body)
+        status, payload, *headers = await self.dispatch(request)
+        await self._send_json(send, status, payload, *headers)
+    
+    async def dispatch(self, request):
+        """Run the security checks and the matching route handler"""
+        try:
+            if request.path != '/health':
+                request.api_key = self.api_keys.lookup(request.headers.get('x-api-key'))
+                if not self.rate_limiter.check_request(request.remote_addr, request.api_key):
+                    return 429, {'status': 'error', 'message': 'Rate limit exceeded'}
+                
+                if not self.authenticate_request(request):
+                    return 401, {'status': 'error', 'message': 'Authentication failed'}
+                
+                if request.signed_at is not None:
+                    rejection = self.replay_guard.check(request.signed_at, request.headers['x-signature'])
+                    if rejection:
+                        return rejection[0], {'status': 'error', 'message': rejection[1]}
+                
+                if not self.check_ip_restrictions(request):
+                    return 403, {'status': 'error', 'message': 'IP address not allowed'}
+                
+                if request.api_key is not None and not self.db.api_key_usage.record(request.api_key):
+                    return 429, {'status': 'error', 'message': 'API key quota exceeded'}
+            
+            handler = self.routes.get((request.method, request.path))
+            if handler is None:
+                return 404, {'status': 'error', 'message': 'Not found'}
+            return await handler(request)
+        
+        except Exception as e:
+            self.logger.error(f"Error handling {request.path}: {str(e)}")
+            return 500, {'status': 'error', 'message': 'Internal server error'}
+    
+    async def validate_license(self, request):
+        """Endpoint for license validation"""
+        data = request.get_json()
+        
+        if not data:
+            return 400, {'status': 'error', 'message': 'No JSON data provided'}
+        
+        required_fields = ['license_key', 'license_type', 'timestamp']
+        for field in required_fields:
+            if field not in data:
+                return 400, {'status': 'error', 'message': f'Missing required field: {field}'}
+        
+        if request.signed_at is None:
+            rejection = self.replay_guard.check(data['timestamp'], request.headers.get('x-signature') or request.body)
+            if rejection:
+                return rejection[0], {'status': 'error', 'message': rejection[1]}
+        
+        license_key = data['license_key']
+        license_type = data['license_type']
+        client_info = data.get('client_info', '')
+        device_id = data.get('device_id')
+        
+        # Check key format
+        if len(license_key) != self.security.license_registry.key_length(license_type):
+            return 400, {'status': 'error', 'message': 'Invalid key format'}
+        
+        # Check license type
+        if license_type not in self.security.license_types:
+            return 400, {'status': 'error', 'message': 'Invalid license type'}
+        
+        if not allows_license_type(request.api_key, license_type):
+            return 403, {'status': 'error', 'message': 'License type not allowed for this API key'}
+        
+        if not valid_device_id(device_id):
+            return 400, {'status': 'error', 'message': 'Invalid device_id'}
+        
+        is_valid, message = await self.db.validate_license(
+            license_key,
+            license_type,
+            client_info,
+            request.remote_addr,
+            device_id
+        )
+        
+        if self.config['logging']['log_requests']:
+            self.logger.info(
+                f"License validation - Key: {license_key}, "
+                f"Type: {license_type}, Valid: {is_valid}, "
+                f"IP: {request.remote_addr}"
+            )
+        
+        response_data = {
+            'status': 'success' if is_valid else 'error',
+            'message': message,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        if is_valid and device_id and self.leases.enabled:
+            key_hash = self.security.hash_key(license_key)
+            response_data.update(self.leases.response_fields(
+                key_hash, license_type, device_id, await self.db.license_expiration(key_hash)
+            ))
+        return 200 if is_valid else 403, response_data
+    
+    async def validate_license_batch(self, request):
+        """Endpoint for validating many licenses in one request"""
+        data = request.get_json()
+        
+        if not data:
+            return 400, {'status': 'error', 'message': 'No JSON data provided'}
+        
+        for field in ['licenses', 'timestamp']:
+            if field not in data:
+                return 400, {'status': 'error', 'message': f'Missing required field: {field}'}
+        
+        if request.signed_at is None:
+            rejection = self.replay_guard.check(data['timestamp'], request.headers.get('x-signature') or request.body)
+            if rejection:
+                return rejection[0], {'status': 'error', 'message': rejection[1]}
+        
+        licenses = data['licenses']
+        if not isinstance(licenses, list) or not licenses:
+            return 400, {'status': 'error', 'message': 'licenses must be a non-empty list'}
+        
+        max_batch_size = self.config['licensing'].get('max_batch_size', 1000)
+        if len(licenses) > max_batch_size:
+            return 413, {'status': 'error', 'message': f'Batch too large (max {max_batch_size} keys)'}
+        
+        results, to_validate, positions = parse_batch_licenses(
+            self.security.license_registry, licenses, request.api_key
+        )
+        if to_validate:
+            validated = await self.db.validate_licenses_bulk(to_validate, request.remote_addr)
+            for index, result in zip(positions, validated):
+                results[index] = result
+        
+        response_results, valid_count = batch_response_results(licenses, results)
+        
+        if self.config['logging']['log_requests']:
+            self.logger.info(
+                f"Batch license validation - Keys: {len(licenses)}, "
+                f"Valid: {valid_count}, IP: {request.remote_addr}"
+            )
+        
+        return 200, {
+            'status': 'success',
+            'valid_count': valid_count,
+            'total': len(licenses),
+            'results': response_results,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    async def get_license_types(self, request):
+        """Endpoint for the license type registry, revalidated by ETag"""
+        registry = self.security.license_registry
+        headers = {'ETag': registry.etag, 'Cache-Control': 'no-cache'}
+        if registry.etag_matches(request.headers.get('if-none-match')):
+            return 304, None, headers
+        return 200, {'status': 'success', 'license_types': registry.document}, headers
+    
+    async def get_revocations(self, request):
+        """Endpoint for the keys revoked since a feed version, revalidated by ETag"""
+        try:
+            since = parse_revocations_since(request.args)
+        except ValueError as e:
+            return 400, {'status': 'error', 'message': str(e)}
+        
+        feed = self.db.revocations
+        if not feed.enabled:
+            return 501, {'status': 'error', 'message': 'Revocation feed is not available on this database'}
+        
+        version = await self.db.revocation_version()
+        if feed.not_modified_since(request.headers.get('if-none-match'), version):
+            return 304, None, {'ETag': feed.etag(version), 'Cache-Control': 'no-cache'}
+        
+        body, headers = feed.encode(
+            await self.db.get_revocations(since, version), request.headers.get('accept-encoding')
+        )
+        return 200, body, headers
+    
+    async def health_check(self, request):
+        """Endpoint for server health check"""
+        return 200, {
+            'status': 'success',
+            'message': 'Server is running',
+            'timestamp': datetime.utcnow().isoformat(),
+            'backup': await asyncio.to_thread(self.db.backup.health)
+        }
+    
+    def authenticate_request(self, request):
+        """Authenticate request (same rules as LicenseServer.authenticate_request)"""
+        if not self.config['security']['api_key_required']:
+            return True
+        
+        if request.api_key is None:
+            return False
+        
+        if self.config['security']['require_encrypted_communication']:
+            signature = request.headers.get('x-signature')
+            if not signature:
+                self.logger.debug("Request rejected: HMAC signature missing")
+                return False
+            
+            version = request.headers.get('x-signature-version')
+            data = None
+            if not version or version == '1':
+                data = request.get_json()
+                if not data:
+                    self.logger.debug("Request rejected: no data for signature verification")
+                    return False
+            
+            timestamp = request.headers.get('x-timestamp')
+            target = self.security.request_target(request.path, request.query_string)
+            if not self.security.verify_request_signature(signature, request.body, version, data,
+                                                          request.method, target, timestamp):
+                self.logger.debug(f"Request rejected: invalid HMAC signature (version {version or '1'})")
+                return False
+            if version == '2':
+                request.signed_at = timestamp
+        
+        return True
+    
+    def check_ip_restrictions(self, request):
+        """Check IP restrictions"""
+        return self.ip_filter.is_allowed(request.remote_addr)
+    
+    async def _ensure_started(self):
+        # Servers without lifespan support start the database lazily
+        if self._started:
+            return
+        async with self._start_lock:
+            if not self._started:
+                await self.db.start()
+                await asyncio.to_thread(self.db.api_key_usage.refresh, self.api_keys)
+                self.maintenance.start()
+                self._started = True
+    
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self._ensure_started()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    async def _read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.MAX_BODY_BYTES:
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+    
+    async def _send_json(self, send, status, payload, headers=None):
+        # 304 responses carry no body; bytes are an already encoded JSON body
+        if payload is None:
+            body = b''
+        elif isinstance(payload, bytes):
+            body = payload
+        else:
+            body = json.dumps(payload).encode('utf-8')
+        response_headers = [(b'content-length', str(len(body)).encode())]
+        if payload is not None:
+            response_headers.append((b'content-type', b'application/json'))
+        for name, value in (headers or {}).items():
+            response_headers.append((name.lower().encode('latin-1'), value.encode('latin-1')))
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': response_headers
+        })
+        await send({'type': 'http.response.body', 'body': body})
+    
+    async def shutdown(self):
+        """Flush pending work and release resources"""
+        if self._started:
+            await asyncio.to_thread(self.maintenance.stop)
+            await self.db.close()
+            self._started = False
+        self.rate_limiter.close()
+        self.replay_guard.close()
+    
+    def run(self):
+        """Start server with uvicorn"""
+        try:
+            import uvicorn
+        except ImportError:
+            raise SystemExit("Async mode needs an ASGI server: pip install uvicorn aiosqlite")
+        
+        server_config = self.config['server']
+        ssl_options = {}
+        if server_config['ssl_enabled']:
+            ssl_options = {
+                'ssl_certfile': server_config['ssl_cert_path'],
+                'ssl_keyfile': server_config['ssl_key_path']
+            }
+        
+        uvicorn.run(
+            self,
+            host=server_config['host'],
+            port=server_config['port'],
+            backlog=server_config.get('backlog', 2048),
+            lifespan='on',
+            log_level='warning',
+            **ssl_options
+        )
@@ -0,0 +1,287 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+import asyncio
+import logging
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from database import (
+    Base, LicenseKey, LicenseCounter, KeyActivation, ActivationLog, ActivationRollup, APIKeyUsage,
+    LicenseRevocation, LicenseValidationMixin, upgrade_schema
+)
+from activation_rollups import ActivationRollups
+from api_keys import APIKeyUsageTracker
+from backup import DatabaseBackup
+from audit_log import ActivationLogWriter, activation_log_row
+from license_cache import LicenseCache, snapshot_license
+from log_retention import LogRetention
+from revocations import RevocationFeed
+from key_filter import LicenseKeyFilter
+from storage_profile import (
+    async_database_url, create_database_engine, database_url, insert_ignoring_duplicates,
+    insert_or_increment, install_sqlite_pragmas, is_sqlite, pool_options
+)
+
+logger = logging.getLogger(__name__)
+
+class AsyncDatabaseManager(LicenseValidationMixin):
+    """asyncio counterpart of DatabaseManager built on SQLAlchemy's async engine
+    
+    Lookups and activation commits go through the asyncio driver of the
+    configured backend (``sqlite+aiosqlite``, ``postgresql+asyncpg``). The
+    activation log writer and the key filter keep using a small synchronous
+    engine from their own threads, so nothing on the event loop blocks on
+    the database. Read replicas are only used by DatabaseManager.
+    """
+    
+    def __init__(self, config, security_manager):
+        self.config = config
+        self.security = security_manager
+        
+        database_config = config['database']
+        sync_url = database_url(database_config)
+        self.engine = create_async_engine(
+            async_database_url(sync_url), **pool_options(database_config, async_engine=True)
+        )
+        if is_sqlite(sync_url):
+            install_sqlite_pragmas(self.engine.sync_engine, database_config)
+        self.Session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self._counter_upsert = insert_or_increment(
+            self.engine, LicenseCounter.__table__,
+            ('license_type', 'expiration_day'), ('total_keys', 'active_keys', 'used_keys')
+        )
+        self._device_insert = insert_ignoring_duplicates(self.engine, KeyActivation.__table__)
+        
+        self.sync_engine = create_database_engine(sync_url, database_config)
+        self.SyncSession = sessionmaker(bind=self.sync_engine)
+        
+        self.activation_rollups = ActivationRollups(
+            self.sync_engine,
+            ActivationRollup,
+            config['logging'].get('activation_rollups')
+        )
+        self.activation_log = ActivationLogWriter(
+            self.SyncSession,
+            ActivationLog,
+            config['logging'].get('activation_log'),
+            rollups=self.activation_rollups
+        )
+        self.api_key_usage = APIKeyUsageTracker(
+            self.sync_engine, self.SyncSession, APIKeyUsage, config['security'].get('api_key_index')
+        )
+        self.log_retention = LogRetention(self.SyncSession, ActivationLog, config['logging'].get('retention'))
+        self.backup = DatabaseBackup(sync_url, database_config)
+        self.license_cache = LicenseCache(config['database'].get('cache'))
+        self.key_filter = LicenseKeyFilter(config['database'].get('key_filter'))
+        self.revocations = RevocationFeed(
+            LicenseRevocation, config['licensing'].get('revocations'), self.sync_engine.dialect.name
+        )
+        self._refresh_task = None
+    
+    async def start(self):
+        """Create tables, load the key filter and start background work"""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await asyncio.to_thread(self._upgrade_existing_database)
+        
+        await asyncio.to_thread(self.key_filter.load, self.SyncSession, LicenseKey)
+        self.activation_log.start()
+        self.api_key_usage.start()
+        self._refresh_task = asyncio.create_task(self._refresh_key_filter())
+    
+    def _upgrade_existing_database(self):
+        """Add columns, indexes and license_counters missing from older databases"""
+        upgrade_schema(self.sync_engine)
+        
+        session = self.SyncSession()
+        try:
+            self._rebuild_license_counters(session, only_if_empty=True)
+        except Exception as e:
+            session.rollback()
+            logger.error("Error building license counters: %s", e)
+        finally:
+            session.close()
+    
+    async def _update_counters(self, session, license_keys, **deltas):
+        """Add deltas to the license_counters rows of license_keys in session's transaction"""
+        rows = self._counter_increments(license_keys, **deltas)
+        if rows:
+            await session.execute(self._counter_upsert, rows)
+    
+    async def _refresh_key_filter(self):
+        """Pick up keys added by other processes without blocking the loop"""
+        while True:
+            await asyncio.sleep(self.key_filter.refresh_interval)
+            await asyncio.to_thread(self.key_filter.refresh)
+    
+    async def validate_license(self, key, license_type, client_info=None, client_ip=None, device_id=None):
+        """Validate license"""
+        log_entries = []
+        key_hash, result, filtered = self._precheck_license(
+            key, license_type, client_info, client_ip, device_id, log_entries
+        )
+        if result:
+            await self._log(log_entries)
+            return result
+        
+        async with self.Session() as session:
+            try:
+                if not filtered:
+                    # One read before any write, for keys the filter does not know
+                    rejection = self._confirm_unfiltered(
+                        key_hash, license_type, device_id,
+                        (await session.execute(self._license_state_query(key_hash))).first()
+                    )
+                    if rejection:
+                        reason, message = rejection
+                        await self._log([activation_log_row(
+                            key_hash, client_ip, client_info, False, reason, license_type
+                        )])
+                        return False, message
+                
+                known = None
+                if device_id:
+                    known = (await session.execute(self._known_device_query(key_hash, device_id))).first()
+                if known is not None:
+                    state = None
+                    rejection = self._check_license_state(
+                        self._remember_license(key_hash, known, license_type), seats=False
+                    )
+                else:
+                    state, rejection = await self._claim_seat(
+                        session, key_hash, license_type, client_info, device_id, client_ip
+                    )
+                if rejection:
+                    reason, message = rejection
+                    await self._log([activation_log_row(
+                        key_hash, client_ip, client_info, False, reason, license_type
+                    )])
+                    return False, message
+                
+                if state is not None:
+                    if state.activation_count == 1:
+                        await self._update_counters(session, [state], used=1)
+                    await session.commit()
+                    self.license_cache.invalidate(key_hash)
+                
+                await self._log([activation_log_row(
+                    key_hash, client_ip, client_info, True, "Success", license_type
+                )])
+                return True, "License validated successfully"
+            
+            except Exception as e:
+                await session.rollback()
+                logger.error("Error validating license: %s", e)
+                return False, "Server error during validation"
+    
+    async def _log(self, rows):
+        """Queue activation log rows without blocking the event loop
+        
+        When the writer is not running (or ``async_enabled`` is off) or the
+        ``block`` backpressure would wait for room, the rows go to log_many
+        in a worker thread: the request waits, the loop does not.
+        """
+        if rows and not self.activation_log.offer_many(rows):
+            await asyncio.to_thread(self.activation_log.log_many, rows)
+    
+    async def license_expiration(self, key_hash):
+        """expiration_date of key_hash, as DatabaseManager.license_expiration"""
+        snapshot = self.license_cache.get(key_hash)
+        if snapshot is not None:
+            return snapshot.expiration_date
+        
+        async with self.Session() as session:
+            state = (await session.execute(self._license_state_query(key_hash))).first()
+        if state is None:
+            return None
+        self.license_cache.put(key_hash, snapshot_license(state))
+        return state.expiration_date
+    
+    async def _claim_seat(self, session, key_hash, license_type, client_info, device_id, client_ip):
+        """Activate key_hash for device_id, as DatabaseManager._claim_seat"""
+        if device_id:
+            inserted = await session.execute(
+                self._device_insert, self._device_row(key_hash, device_id, client_ip)
+            )
+            if not inserted.rowcount:
+                state = (await session.execute(self._license_state_query(key_hash))).first()
+                return None, self._claim_rejection(key_hash, license_type, state, seats=False)
+        
+        updated = await session.execute(self._activation_update(key_hash, license_type, client_info))
+        state = updated.first()
+        if state is not None:
+            return state, None
+        
+        if device_id:
+            await session.execute(self._device_release(key_hash, device_id))
+        state = (await session.execute(self._license_state_query(key_hash))).first()
+        return None, self._claim_rejection(key_hash, license_type, state, seats=True)
+    
+    async def revocation_version(self):
+        """Current version of the revocation feed, read off the event loop when not cached"""
+        version = self.revocations.cached_version()
+        if version is None:
+            version = await asyncio.to_thread(self.revocations.current_version, self.SyncSession)
+        return version
+    
+    async def get_revocations(self, since, version):
+        """Revocation feed changes after since, up to version (see RevocationFeed.changes)"""
+        return await asyncio.to_thread(self._get_revocations, since, version)
+    
+    def _get_revocations(self, since, version):
+        session = self.SyncSession()
+        try:
+            return self.revocations.changes(session, since, version)
+        finally:
+            session.close()
+    
+    async def validate_licenses_bulk(self, licenses, client_ip=None):
+        """Validate many licenses in a single transaction"""
+        results, log_entries, pending, unfiltered = self._prepare_bulk(licenses, client_ip)
+        
+        async with self.Session() as session:
+            try:
+                found = {}
+                for chunk in self._bulk_lookup_chunks(pending):
+                    for row in await session.execute(self._license_states_query(chunk)):
+                        found[row.key_hash] = row
+                known_devices = set()
+                for statement in self._known_device_queries(pending):
+                    known_devices.update((await session.execute(statement)).tuples())
+                
+                claimed = set()
+                newly_used = []
+                for entry in self._resolve_bulk(pending, found, known_devices, results, log_entries,
+                                                client_ip, unfiltered):
+                    _, key_hash, license_type, client_info, device_id = entry
+                    state, rejection = await self._claim_seat(
+                        session, key_hash, license_type, client_info, device_id, client_ip
+                    )
+                    claimed.add(key_hash)
+                    if state is not None and state.activation_count == 1:
+                        newly_used.append(state)
+                    self._record_result(entry, rejection, results, log_entries, client_ip)
+                await self._update_counters(session, newly_used, used=1)
+                await session.commit()
+                self._finish_bulk(found, claimed)
+                await self._log(log_entries)
+                return results
+            
+            except Exception as e:
+                await session.rollback()
+                logger.error("Error validating licenses in bulk: %s", e)
+                return [(False, "Server error during validation")] * len(licenses)
+    
+    async def close(self):
+        """Flush pending activation logs and usage counters and release database connections"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        await asyncio.to_thread(self.activation_log.close)
+        await asyncio.to_thread(self.api_key_usage.close)
+        await asyncio.to_thread(self.key_filter.save)
+        await self.engine.dispose()
+        self.sync_engine.dispose()
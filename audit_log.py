@@ -0,0 +1,263 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+from collections import deque
+from datetime import datetime
+import logging
+import random
+import threading
+import time
+
+from sqlalchemy import insert
+
+logger = logging.getLogger(__name__)
+
+BACKPRESSURE_MODES = ('block', 'drop_oldest', 'sample_failures')
+
+DEFAULT_OPTIONS = {
+    'async_enabled': True,
+    'queue_size': 10000,
+    'batch_size': 500,
+    'flush_interval_ms': 200,
+    'backpressure': 'block',
+    'failure_sample_rate': 0.1
+}
+
+def activation_log_row(key_hash, client_ip=None, client_info=None, success=False, reason=None,
+                       license_type=None):
+    """Build an ActivationLog row stamped with the time of the attempt"""
+    return {
+        'key_hash': key_hash,
+        'license_type': license_type,
+        'activation_date': datetime.utcnow(),
+        'client_ip': client_ip,
+        'client_info': client_info,
+        'success': success,
+        'reason': reason
+    }
+
+class ActivationLogWriter:
+    """Bounded queue of activation log rows drained by a background writer
+    
+    Rows are bulk-inserted every ``flush_interval_ms`` or as soon as
+    ``batch_size`` rows are waiting, whichever comes first. When the queue
+    is full the ``backpressure`` mode decides what happens:
+    
+    * ``block`` - the caller waits for the writer to make room
+    * ``drop_oldest`` - the oldest queued row is discarded
+    * ``sample_failures`` - once the queue is half full only
+      ``failure_sample_rate`` of failed attempts are kept; successful
+      activations are never sampled and block if the queue is full
+    
+    When ``rollups`` (an ActivationRollups) is given, every batch also
+    updates the rollup buckets in the same transaction.
+    """
+    
+    def __init__(self, session_factory, model, options=None, rollups=None):
+        self.Session = session_factory
+        self.model = model
+        self.rollups = rollups
+        
+        options = {**DEFAULT_OPTIONS, **(options or {})}
+        if options['backpressure'] not in BACKPRESSURE_MODES:
+            raise ValueError(
+                f"Unknown activation log backpressure mode: {options['backpressure']}"
+            )
+        
+        self.async_enabled = options['async_enabled']
+        self.queue_size = max(1, options['queue_size'])
+        self.batch_size = max(1, options['batch_size'])
+        self.flush_interval = options['flush_interval_ms'] / 1000.0
+        self.backpressure = options['backpressure']
+        self.failure_sample_rate = options['failure_sample_rate']
+        
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._space_available = threading.Condition(self._lock)
+        self._drained = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._closed = False
+        self._thread = None
+        
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'sampled_out': 0,
+            'flushes': 0,
+            'errors': 0
+        }
+    
+    def start(self):
+        """Start the background writer thread"""
+        if not self.async_enabled:
+            return
+        
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._closed = False
+            self._thread = threading.Thread(
+                target=self._run,
+                name='activation-log-writer',
+                daemon=True
+            )
+            self._thread.start()
+    
+    def log(self, key_hash, client_ip=None, client_info=None, success=False, reason=None,
+            license_type=None):
+        """Queue one activation log row"""
+        self.log_many([activation_log_row(
+            key_hash, client_ip, client_info, success, reason, license_type
+        )])
+    
+    def log_many(self, rows):
+        """Queue several activation log rows (dicts of ActivationLog columns)"""
+        if not rows:
+            return
+        
+        if not self._is_running():
+            self._write(rows)
+            return
+        
+        with self._lock:
+            for row in rows:
+                self._enqueue(row)
+            if len(self._queue) >= self.batch_size:
+                self._wakeup.notify()
+    
+    def offer_many(self, rows):
+        """Queue rows only if that cannot block; return whether they were taken
+        
+        Rows are refused when the writer is not running (log_many would
+        write them itself) or when the queue has no room for them under
+        ``block`` or ``sample_failures`` backpressure. Callers on an event
+        loop pass refused rows to log_many from a worker thread.
+        """
+        if not rows:
+            return True
+        if not self._is_running():
+            return False
+        
+        with self._lock:
+            if self.backpressure != 'drop_oldest' and len(self._queue) + len(rows) > self.queue_size:
+                return False
+            for row in rows:
+                self._enqueue(row)
+            if len(self._queue) >= self.batch_size:
+                self._wakeup.notify()
+        return True
+    
+    def _enqueue(self, row):
+        """Apply backpressure and append a row; caller holds the lock"""
+        if self.backpressure == 'sample_failures' and not row['success']:
+            if len(self._queue) >= self.queue_size // 2 and random.random() >= self.failure_sample_rate:
+                self.stats['sampled_out'] += 1
+                return
+        
+        if len(self._queue) >= self.queue_size:
+            if self.backpressure == 'drop_oldest':
+                self._queue.popleft()
+                self.stats['dropped'] += 1
+            else:
+                self._wakeup.notify()
+                while len(self._queue) >= self.queue_size and not self._closed:
+                    self._space_available.wait()
+        
+        self._queue.append(row)
+        self.stats['enqueued'] += 1
+    
+    def _is_running(self):
+        return self.async_enabled and self._thread is not None and self._thread.is_alive()
+    
+    def _run(self):
+        """Writer loop"""
+        while True:
+            with self._lock:
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._queue) < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                
+                if not self._queue:
+                    if self._closed:
+                        return
+                    continue
+                
+                count = min(len(self._queue), self.batch_size)
+                rows = [self._queue.popleft() for _ in range(count)]
+                self._in_flight += count
+                self._space_available.notify_all()
+            
+            try:
+                self._write(rows)
+            finally:
+                with self._lock:
+                    self._in_flight -= count
+                    if not self._queue and not self._in_flight:
+                        self._drained.notify_all()
+    
+    def _write(self, rows):
+        """Bulk-insert rows in one transaction"""
+        session = self.Session()
+        try:
+            session.execute(insert(self.model), rows)
+            if self.rollups is not None:
+                self.rollups.add(session, rows)
+            session.commit()
+            with self._lock:
+                self.stats['written'] += len(rows)
+                self.stats['flushes'] += 1
+        except Exception as e:
+            session.rollback()
+            with self._lock:
+                self.stats['errors'] += 1
+                self.stats['dropped'] += len(rows)
+            logger.error(f"Error writing {len(rows)} activation log rows: {e}")
+        finally:
+            session.close()
+        
+        if self.rollups is not None:
+            self.rollups.maybe_compact(self.Session)
+    
+    def flush(self, timeout=None):
+        """Wait until every queued row has been written"""
+        if not self._is_running():
+            return True
+        
+        with self._lock:
+            self._wakeup.notify()
+            return self._drained.wait_for(
+                lambda: not self._queue and not self._in_flight,
+                timeout
+            )
+    
+    def close(self, timeout=10):
+        """Flush pending rows and stop the writer thread"""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+            self._space_available.notify_all()
+        
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        
+        # Anything left (writer never started or did not finish in time)
+        with self._lock:
+            rows = list(self._queue)
+            self._queue.clear()
+        if rows:
+            self._write(rows)
+    
+    def get_stats(self):
+        """Return writer counters"""
+        with self._lock:
+            return {**self.stats, 'queued': len(self._queue), 'backpressure': self.backpressure}
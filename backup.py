@@ -0,0 +1,279 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+from datetime import datetime, timezone
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPTIONS = {
+    'dir': 'backups',
+    'generations': 7,
+    'compress': True,
+    'pages_per_step': 1024,
+    'step_sleep_ms': 10,
+    'max_restarts': 3
+}
+
+# How often the scheduler checks whether a backup is due
+CHECK_INTERVAL_SECONDS = 3600
+
+class BackupRestarted(Exception):
+    """Raised from the progress callback to stop a restarting stepped backup"""
+
+def sha256_file(path):
+    """Hex SHA-256 of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class DatabaseBackup:
+    """Online backups of the SQLite database with SQLite's backup API
+    
+    The database is copied ``pages_per_step`` pages at a time with
+    ``step_sleep_ms`` between steps, so other connections get the lock
+    between steps. SQLite restarts a stepped backup whenever another
+    connection writes; after ``max_restarts`` restarts the rest is copied
+    in one step, which in WAL mode only holds a read snapshot and so still
+    lets validations and activations proceed. Each copy is optionally
+    gzip-compressed and gets a ``.sha256`` file (``sha256sum -c`` format);
+    only the newest ``generations`` backups are kept.
+    """
+    
+    def __init__(self, database_url, database_config):
+        url = make_url(database_url)
+        options = {**DEFAULT_OPTIONS, **(database_config.get('backup') or {})}
+        
+        self.is_sqlite = url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+        self.enabled = bool(database_config.get('backup_enabled')) and self.is_sqlite
+        if database_config.get('backup_enabled') and not self.is_sqlite:
+            logger.warning("database.backup_enabled only covers SQLite files; use the database's own backup tools")
+        
+        self.database_path = url.database if self.is_sqlite else None
+        self.interval_seconds = database_config.get('backup_interval_hours', 24) * 3600
+        self.backup_dir = options['dir']
+        self.generations = max(1, options['generations'])
+        self.compress = options['compress']
+        self.pages_per_step = options['pages_per_step']
+        self.step_sleep = options['step_sleep_ms'] / 1000.0
+        self.max_restarts = options['max_restarts']
+        
+        self._lock = threading.Lock()
+        self.stats = {
+            'backups': 0,
+            'errors': 0,
+            'restarts': 0,
+            'single_step_fallbacks': 0,
+            'last_duration_seconds': None,
+            'last_size_bytes': None,
+            'last_error': None
+        }
+    
+    @property
+    def prefix(self):
+        return os.path.splitext(os.path.basename(self.database_path))[0] + '-'
+    
+    def list_backups(self):
+        """Backup files, newest first"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        names = [
+            name for name in os.listdir(self.backup_dir)
+            if name.startswith(self.prefix) and name.endswith(('.db', '.db.gz'))
+        ]
+        return [os.path.join(self.backup_dir, name) for name in sorted(names, reverse=True)]
+    
+    def last_backup_time(self):
+        """Completion time of the newest backup, or None"""
+        backups = self.list_backups()
+        if not backups:
+            return None
+        return datetime.fromtimestamp(os.path.getmtime(backups[0]), timezone.utc).replace(tzinfo=None)
+    
+    def run_if_due(self):
+        """Back up if the newest backup is older than backup_interval_hours"""
+        last = self.last_backup_time()
+        if last is None or (datetime.utcnow() - last).total_seconds() >= self.interval_seconds:
+            return self.run()
+        return None
+    
+    def run(self):
+        """Take one backup; return its path"""
+        if not self.is_sqlite:
+            raise ValueError("Online backups need a SQLite database file")
+        
+        os.makedirs(self.backup_dir, exist_ok=True)
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%fZ')
+        copy_path = os.path.join(self.backup_dir, f"{self.prefix}{stamp}.db")
+        path = copy_path + '.gz' if self.compress else copy_path
+        start = time.monotonic()
+        
+        try:
+            restarts, fallback = self._copy(copy_path + '.tmp')
+            if self.compress:
+                with open(copy_path + '.tmp', 'rb') as source, gzip.open(path + '.tmp', 'wb', compresslevel=6) as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+                os.remove(copy_path + '.tmp')
+            else:
+                os.replace(copy_path + '.tmp', path + '.tmp')
+            
+            with open(path + '.sha256', 'w') as f:
+                f.write(f"{sha256_file(path + '.tmp')}  {os.path.basename(path)}\n")
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            for leftover in (copy_path + '.tmp', path + '.tmp', path + '.sha256'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            with self._lock:
+                self.stats['errors'] += 1
+                self.stats['last_error'] = str(e)
+            logger.error(f"Database backup failed: {e}")
+            raise
+        
+        self._prune()
+        with self._lock:
+            self.stats['backups'] += 1
+            self.stats['restarts'] += restarts
+            self.stats['single_step_fallbacks'] += fallback
+            self.stats['last_duration_seconds'] = round(time.monotonic() - start, 3)
+            self.stats['last_size_bytes'] = os.path.getsize(path)
+            self.stats['last_error'] = None
+        logger.info(f"Database backed up to {path}")
+        return path
+    
+    def _copy(self, target_path):
+        """Copy the database with the backup API; return (restarts, used single step)"""
+        restarts = 0
+        previous_remaining = None
+        
+        def progress(status, remaining, total):
+            nonlocal restarts, previous_remaining
+            if previous_remaining is not None and remaining > previous_remaining:
+                restarts += 1
+                if restarts > self.max_restarts:
+                    raise BackupRestarted()
+            previous_remaining = remaining
+        
+        source = sqlite3.connect(self.database_path)
+        target = sqlite3.connect(target_path)
+        try:
+            try:
+                source.backup(target, pages=self.pages_per_step, progress=progress, sleep=self.step_sleep)
+                return restarts, False
+            except BackupRestarted:
+                source.backup(target, pages=-1)
+                return restarts, True
+        finally:
+            target.close()
+            source.close()
+    
+    def _prune(self):
+        for path in self.list_backups()[self.generations:]:
+            for name in (path, path + '.sha256'):
+                if os.path.exists(name):
+                    os.remove(name)
+    
+    def verify(self, path):
+        """Raise ValueError unless path matches its .sha256 file"""
+        checksum_path = path + '.sha256'
+        if not os.path.exists(checksum_path):
+            raise ValueError(f"No checksum file for {path}")
+        with open(checksum_path) as f:
+            expected = f.read().split()[0]
+        if sha256_file(path) != expected:
+            raise ValueError(f"Checksum mismatch for {path}")
+    
+    def restore(self, path=None, target_path=None, force=False):
+        """Replace the database file with a verified backup; return the backup used
+        
+        The server must be stopped; a database another connection still has
+        open is refused. The replaced file is checkpointed first and kept
+        next to it with a ``.before-restore`` suffix, together with any
+        leftover ``-wal``/``-shm`` files (``.before-restore-wal``,
+        ``.before-restore-shm``).
+        """
+        path = path or next(iter(self.list_backups()), None)
+        if path is None:
+            raise ValueError(f"No backups found in {self.backup_dir}")
+        target_path = target_path or self.database_path
+        if os.path.exists(target_path) and not force:
+            raise ValueError(f"{target_path} exists; pass force=True to replace it")
+        if os.path.exists(target_path):
+            self._checkpoint_unused(target_path)
+        
+        self.verify(path)
+        staging_path = target_path + '.restore.tmp'
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as source, open(staging_path, 'wb') as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        
+        connection = sqlite3.connect(staging_path)
+        try:
+            result = connection.execute('PRAGMA integrity_check').fetchone()[0]
+        finally:
+            connection.close()
+        if result != 'ok':
+            os.remove(staging_path)
+            raise ValueError(f"Integrity check of {path} failed: {result}")
+        
+        if os.path.exists(target_path):
+            os.replace(target_path, target_path + '.before-restore')
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(target_path + suffix):
+                os.replace(target_path + suffix, target_path + '.before-restore' + suffix)
+        os.replace(staging_path, target_path)
+        return path
+    
+    @staticmethod
+    def _checkpoint_unused(database_path):
+        """Fold the WAL into the database file, refusing if the file is in use
+        
+        In WAL mode an exclusive-locking connection cannot read while any
+        other connection, even an idle pooled one, has the database open.
+        Closing the last connection checkpoints the WAL and removes the
+        ``-wal`` and ``-shm`` files.
+        """
+        connection = sqlite3.connect(database_path, timeout=0, isolation_level=None)
+        try:
+            connection.execute('PRAGMA locking_mode=EXCLUSIVE')
+            connection.execute('BEGIN EXCLUSIVE')
+            connection.execute('SELECT count(*) FROM sqlite_master').fetchone()
+            connection.execute('COMMIT')
+            connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"{database_path} is in use ({e}); stop the server before restoring")
+        finally:
+            connection.close()
+    
+    def health(self):
+        """Backup status for /health"""
+        if not self.enabled:
+            return {'enabled': False}
+        last = self.last_backup_time()
+        age = (datetime.utcnow() - last).total_seconds() if last else None
+        return {
+            'enabled': True,
+            'last_backup': last.isoformat() if last else None,
+            'last_backup_age_seconds': round(age) if age is not None else None,
+            'overdue': age is None or age > 2 * self.interval_seconds
+        }
+    
+    def get_stats(self):
+        """Return backup counters"""
+        with self._lock:
+            return {**self.stats, 'enabled': self.enabled, 'generations': len(self.list_backups())}
@@ -0,0 +1,100 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""Shared helpers for the benchmark scripts"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def _deep_update(target, overrides):
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _deep_update(target[key], value)
+        else:
+            target[key] = value
+
+
+def make_config(workdir, overrides=None):
+    """Write a throwaway config with fresh secrets into workdir"""
+    with open(os.path.join(ROOT, 'config.json'), 'r') as f:
+        config = json.load(f)
+    
+    config['server']['ssl_enabled'] = False
+    config['database']['filename'] = os.path.join(workdir, 'bench_licenses.db')
+    config['database']['key_filter']['path'] = os.path.join(workdir, 'bench_licenses.keyfilter')
+    config['database']['encryption_key'] = base64.urlsafe_b64encode(secrets.token_bytes(32)).decode()
+    config['security']['jwt_secret'] = base64.urlsafe_b64encode(secrets.token_bytes(32)).decode()
+    config['security']['hmac_secret'] = base64.b64encode(secrets.token_bytes(32)).decode()
+    config['security']['api_keys'] = ['sk_bench_' + secrets.token_hex(12)]
+    # Keep the limiter out of the measurements
+    config['security']['max_requests_per_minute'] = 10 ** 9
+    # Benchmarks send the same signed request many times
+    config['security']['replay_protection']['enabled'] = False
+    config['database']['backup']['dir'] = os.path.join(workdir, 'backups')
+    config['logging']['file'] = os.path.join(workdir, 'bench_server.log')
+    config['logging']['log_requests'] = False
+    
+    if overrides:
+        _deep_update(config, overrides)
+    
+    config_path = os.path.join(workdir, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config, f, indent=2)
+    return config, config_path
+
+
+def seed_keys(config, security, db, license_type, count):
+    """Insert count fresh keys with DatabaseManager.add_license_keys_bulk and return them"""
+    prefix = security.prefixes[license_type]
+    main_length = config['licensing']['key_length'] - len(prefix)
+    keys = [prefix + key for key in security.generate_secure_keys(count, main_length)]
+    return db.add_license_keys_bulk(keys, license_type)
+
+
+def signed_request(config, payload, version=2, method='POST', target='/api/validate'):
+    """Return (body, headers) signed the same way client-example.py does
+    
+    version=1 produces the legacy signature over canonical JSON; version 2
+    signs method, target and a fresh X-Timestamp along with the body.
+    """
+    timestamp = datetime.utcnow().isoformat()
+    if version == 1:
+        body = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+        message = body.encode('utf-8')
+    else:
+        body = json.dumps(payload)
+        message = f'{method}\n{target}\n{timestamp}\n{body}'.encode('utf-8')
+    secret_bytes = base64.b64decode(config['security']['hmac_secret'])
+    signature = base64.b64encode(
+        hmac.new(secret_bytes, message, hashlib.sha256).digest()
+    ).decode('utf-8')
+    headers = {
+        'X-API-Key': config['security']['api_keys'][0],
+        'Content-Type': 'application/json',
+        'X-Signature': signature
+    }
+    if version != 1:
+        headers['X-Signature-Version'] = str(version)
+        headers['X-Timestamp'] = timestamp
+    return body, headers
+
+
+def report(label, count, seconds, unit='keys'):
+    """Print one result line"""
+    rate = count / seconds if seconds else float('inf')
+    print(f"  {label:<44} {count:>8} {unit} in {seconds:8.3f}s  ->  {rate:>12,.0f} {unit}/s")
+    return rate
@@ -0,0 +1,215 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""Stress concurrent activations of the same keys and check that no key is over-activated
+
+Usage: python benchmarks/bench_activation_race.py [--processes N] [--threads N] [--keys N]
+       [--seats N] [--attempts-per-key N] [--batch-size N] [--busy-timeout-ms N] [--legacy]
+
+Every key gets --seats seats. --processes worker processes with
+--threads threads each, all with their own DatabaseManager on the same
+SQLite file, start together behind a barrier and send --attempts-per-key
+activations per key from 2 * --seats different devices, in random order
+(--batch-size > 1 sends them through validate_licenses_bulk instead).
+
+Afterwards no key may have more seats taken than it has, every key must
+have one key_activations row per seat taken, and every successful
+activation must come from a device holding a seat. Unless some requests
+failed with a server error, every key must also have exactly
+min(seats, devices) seats taken. The script exits with status 1 on any
+violation. Server errors are counted separately; with the default
+--busy-timeout-ms they only appear when writers wait longer than that
+for SQLite's write lock.
+
+--legacy replaces the activation with the previous read-check-write
+flow (load the row, compare activation_count in Python, write back the
+incremented count) to show that the check catches the race it had.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from _common import make_config, report, seed_keys
+
+from database import DatabaseManager, KeyActivation, LicenseKey
+from security import SecurityManager
+
+LICENSE_TYPE = 'PRO'
+SERVER_ERROR = "Server error during validation"
+
+
+def legacy_activate(db, key, device_id):
+    """The activation path before conditional UPDATEs: check in Python, then write"""
+    session = db.Session()
+    try:
+        key_hash = db.security.hash_key(key)
+        license_key = session.query(LicenseKey).filter_by(key_hash=key_hash).with_for_update().first()
+        if session.get(KeyActivation, (key_hash, device_id)):
+            return True, "License validated successfully"
+        if license_key.activation_count >= license_key.max_activations:
+            return False, "Maximum activations reached"
+        license_key.activation_count += 1
+        license_key.is_used = True
+        session.add(KeyActivation(key_hash=key_hash, device_id=device_id))
+        session.commit()
+        return True, "License validated successfully"
+    except Exception as e:
+        session.rollback()
+        return False, f"Error: {e}"
+    finally:
+        session.close()
+
+
+def _worker(config, attempts, threads, batch_size, legacy, barrier, results):
+    sys.stdout = open(os.devnull, 'w')
+    db = DatabaseManager(config, SecurityManager(config))
+    outcomes = []
+    lock = threading.Lock()
+    
+    def run(thread_attempts):
+        local = []
+        if batch_size > 1:
+            for start in range(0, len(thread_attempts), batch_size):
+                batch = thread_attempts[start:start + batch_size]
+                validated = db.validate_licenses_bulk([
+                    {'license_key': key, 'license_type': LICENSE_TYPE, 'device_id': device_id}
+                    for key, device_id in batch
+                ], '127.0.0.1')
+                local.extend((key, device_id, valid, message)
+                             for (key, device_id), (valid, message) in zip(batch, validated))
+        else:
+            for key, device_id in thread_attempts:
+                if legacy:
+                    valid, message = legacy_activate(db, key, device_id)
+                else:
+                    valid, message = db.validate_license(key, LICENSE_TYPE, None, '127.0.0.1', device_id)
+                local.append((key, device_id, valid, message))
+        with lock:
+            outcomes.extend(local)
+    
+    pool = [threading.Thread(target=run, args=(attempts[i::threads],)) for i in range(threads)]
+    barrier.wait()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    db.close()
+    results.put(outcomes)
+
+
+def check(config, keys, seats, devices_per_key, outcomes, complete):
+    """Return a list of problems found in the database and the outcomes"""
+    security = SecurityManager(config)
+    db = DatabaseManager(config, security)
+    session = db.Session()
+    try:
+        rows = {row.key_hash: row for row in session.query(LicenseKey)}
+        seated = defaultdict(set)
+        for device in session.query(KeyActivation):
+            seated[device.key_hash].add(device.device_id)
+    finally:
+        session.close()
+        db.close()
+    
+    problems = []
+    expected = min(seats, devices_per_key)
+    for key in keys:
+        key_hash = security.hash_key(key)
+        row = rows[key_hash]
+        if row.activation_count > row.max_activations:
+            problems.append(f"{key}: {row.activation_count} activations for {row.max_activations} seats")
+        elif len(seated[key_hash]) > row.max_activations:
+            problems.append(f"{key}: {len(seated[key_hash])} devices hold the {row.max_activations} seats")
+        elif len(seated[key_hash]) != row.activation_count or (complete and row.activation_count != expected):
+            problems.append(f"{key}: activation_count {row.activation_count}, "
+                            f"{len(seated[key_hash])} devices, expected {expected}")
+    
+    for key, device_id, valid, message in outcomes:
+        if valid and device_id not in seated[security.hash_key(key)]:
+            problems.append(f"{key}: device {device_id} validated without a seat")
+        elif not valid and message not in ("Maximum activations reached", SERVER_ERROR):
+            problems.append(f"{key}: unexpected rejection {message!r}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--keys', type=int, default=100)
+    parser.add_argument('--seats', type=int, default=3)
+    parser.add_argument('--attempts-per-key', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--busy-timeout-ms', type=int, default=60000,
+                        help="how long writers wait for SQLite's write lock")
+    parser.add_argument('--legacy', action='store_true',
+                        help='use the previous read-check-write activation')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        config, _ = make_config(workdir, {
+            'licensing': {'license_types': {LICENSE_TYPE: {'max_activations': args.seats}}},
+            'database': {'cache': {'enabled': False}, 'sqlite': {'busy_timeout_ms': args.busy_timeout_ms}}
+        })
+        db = DatabaseManager(config, SecurityManager(config))
+        keys = seed_keys(config, db.security, db, LICENSE_TYPE, args.keys)
+        db.close()
+        
+        devices_per_key = 2 * args.seats
+        attempts = [
+            (key, f"device-{attempt % devices_per_key}")
+            for key in keys
+            for attempt in range(args.attempts_per_key)
+        ]
+        random.shuffle(attempts)
+        
+        context = multiprocessing.get_context('spawn')
+        barrier = context.Barrier(args.processes + 1)
+        results = context.Queue()
+        workers = [
+            context.Process(target=_worker, args=(
+                config, attempts[i::args.processes], args.threads, args.batch_size, args.legacy,
+                barrier, results
+            ))
+            for i in range(args.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        start = time.perf_counter()
+        outcomes = []
+        for _ in workers:
+            outcomes.extend(results.get())
+        elapsed = time.perf_counter() - start
+        for worker in workers:
+            worker.join()
+        
+        mode = 'legacy read-check-write' if args.legacy else 'conditional UPDATE'
+        print(f"{mode}: {args.processes} processes x {args.threads} threads, {args.keys} keys with "
+              f"{args.seats} seats, {len(attempts)} activations from {devices_per_key} devices per key")
+        report('activations', len(outcomes), elapsed, 'validations')
+        messages = Counter(message.splitlines()[0][:80] for _, _, _, message in outcomes)
+        print(f"  results: {dict(messages)}")
+        
+        errors = messages.get(SERVER_ERROR, 0)
+        problems = check(config, keys, args.seats, devices_per_key, outcomes, complete=not errors)
+        if problems:
+            print(f"  FAILED: {len(problems)} problems, e.g.")
+            for problem in problems[:5]:
+                print(f"    {problem}")
+            sys.exit(1)
+        print("  OK: no key over-activated, every success holds a seat")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""Latency of activation summaries: scanning activation_logs vs activation_rollups
+
+Usage: python benchmarks/bench_activation_summary.py [--rows N] [--days N]
+
+The log is filled through the activation log writer, so the rollups are
+maintained exactly as in the server; the raw queries group activation_logs
+by SQLite's strftime() hour or day.
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from _common import make_config
+
+from app import LicenseServer
+from audit_log import activation_log_row
+from database import ActivationLog
+
+REASONS = ['Success', 'Key not found', 'Key already used', 'Key expired']
+
+
+BUCKET_FORMATS = {'hour': '%Y-%m-%dT%H:00:00', 'day': '%Y-%m-%d'}
+
+
+def raw_summary(db, granularity, since):
+    """Counts per bucket, reason and license type straight from activation_logs"""
+    bucket = func.strftime(BUCKET_FORMATS[granularity], ActivationLog.activation_date)
+    session = db.Session()
+    try:
+        return session.query(
+            bucket, ActivationLog.reason, ActivationLog.license_type, func.count(ActivationLog.id)
+        ).filter(ActivationLog.activation_date >= since).group_by(
+            bucket, ActivationLog.reason, ActivationLog.license_type
+        ).all()
+    finally:
+        session.close()
+
+
+def _time(label, function, repeat):
+    function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    print(f"  {label:<36} {(time.perf_counter() - start) / repeat * 1000:>9.3f} ms/call")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        config, config_path = make_config(workdir)
+        server = LicenseServer(config_path)
+        db = server.db
+        license_types = server.security.license_registry.names
+        now = datetime.utcnow()
+        
+        start = time.perf_counter()
+        for offset in range(0, args.rows, 5000):
+            rows = []
+            for _ in range(min(5000, args.rows - offset)):
+                reason = random.choice(REASONS)
+                row = activation_log_row(
+                    'x' * 64, f"10.0.{random.randrange(4)}.{random.randrange(256)}", None,
+                    reason == 'Success', reason, random.choice(license_types)
+                )
+                row['activation_date'] = now - timedelta(seconds=random.uniform(0, args.days * 86400))
+                rows.append(row)
+            db.activation_log.log_many(rows)
+        db.activation_log.flush()
+        print(f"Wrote {args.rows} log rows over {args.days} days in {time.perf_counter() - start:.1f}s")
+        
+        windows = [('hour', 'last 24 hours', timedelta(days=1)),
+                   ('day', f"last {args.days} days", timedelta(days=args.days))]
+        for granularity, label, window in windows:
+            # Whole buckets, so both queries count the same rows
+            since = (now - window).replace(minute=0, second=0, microsecond=0)
+            if granularity == 'day':
+                since = since.replace(hour=0)
+            print(f"Per {granularity}, {label}, by reason and license type:")
+            raw = _time('GROUP BY over activation_logs',
+                        lambda: raw_summary(db, granularity, since), args.repeat)
+            rollup = _time('activation_rollups', lambda: db.get_activation_summary(
+                granularity, since, limit=10 ** 6
+            ), args.repeat)
+            assert sum(row[-1] for row in raw) == sum(b['successes'] + b['failures'] for b in rollup)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""Per-request cost of HMAC request authentication
+
+Usage: python benchmarks/bench_auth.py [--requests N]
+
+Compares the previous verification path (secret decoded and JSON
+re-serialized on every request, three prints to stdout) with the cached
+HMAC for version 1 (canonical JSON) and version 2 (request line,
+timestamp and raw body) signatures, both in isolation and through
+LicenseServer.authenticate_request.
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from _common import make_config, signed_request
+
+from app import LicenseServer
+
+
+def _legacy_verify(config, data, signature, out):
+    """The verification path before signature versions were introduced"""
+    data_str = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    print(f"🔐 Data for verification: {data_str}", file=out)
+    print(f"🔐 Received signature: {signature}", file=out)
+    secret_bytes = base64.b64decode(config['security']['hmac_secret'])
+    expected = base64.b64encode(
+        hmac.new(secret_bytes, data_str.encode('utf-8'), hashlib.sha256).digest()
+    ).decode('utf-8')
+    print(f"🔐 Expected signature: {expected}", file=out)
+    return hmac.compare_digest(signature, expected)
+
+
+def _timed(label, count, func):
+    start = time.perf_counter()
+    for _ in range(count):
+        if not func():
+            raise SystemExit(f"{label}: signature rejected")
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<44} {elapsed / count * 1e6:8.2f} us/request")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=50000)
+    args = parser.parse_args()
+    count = args.requests
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config, config_path = make_config(workdir)
+        server = LicenseServer(config_path)
+        security = server.security
+
+        payload = {
+            'license_key': 'BUS' + 'A' * 13,
+            'license_type': 'BUSINESS',
+            'timestamp': datetime.utcnow().isoformat(),
+            'client_info': 'bench'
+        }
+        v1_body, v1_headers = signed_request(config, payload, version=1)
+        v2_body, v2_headers = signed_request(config, payload, version=2)
+        v1_bytes, v2_bytes = v1_body.encode(), v2_body.encode()
+        v1_signature, v2_signature = v1_headers['X-Signature'], v2_headers['X-Signature']
+        v2_timestamp = v2_headers['X-Timestamp']
+
+        print(f"Signature verification only ({count} requests):")
+        with open(os.devnull, 'w') as devnull:
+            # Uses a real file so the cost of the stdout writes is included
+            legacy = _timed('legacy (decode + re-serialize + print)', count,
+                            lambda: _legacy_verify(config, json.loads(v1_bytes), v1_signature, devnull))
+        _timed('version 1 (cached HMAC, canonical JSON)', count,
+                    lambda: security.verify_request_signature(v1_signature, v1_bytes, '1', json.loads(v1_bytes)))
+        v2 = _timed('version 2 (cached HMAC, request + body)', count,
+                    lambda: security.verify_request_signature(v2_signature, v2_bytes, '2', None,
+                                                              'POST', '/api/validate', v2_timestamp))
+        print(f"  version 2 speedup over legacy: {legacy / v2:.1f}x")
+
+        print(f"\nLicenseServer.authenticate_request in a request context ({count // 5} requests):")
+        app = server.app
+
+        def authenticate(body, headers):
+            with app.test_request_context('/api/validate', method='POST', data=body, headers=headers):
+                return server.authenticate_request()
+
+        _timed('version 1 header-less request', count // 5, lambda: authenticate(v1_body, v1_headers))
+        _timed('version 2 request', count // 5, lambda: authenticate(v2_body, v2_headers))
+
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""Validation latency with and without an online backup running
+
+Usage: python benchmarks/bench_backup.py [--size-mb N] [--threads N] [--seconds N]
+
+The database is padded to --size-mb with a filler table of random blobs,
+so the backup has a realistically large file to copy. Validation threads
+activate fresh keys (one committed write each) for --seconds without a
+backup, then again while DatabaseBackup.run() copies and compresses the
+database; p50/p99/max per-validation latency are reported for both.
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from _common import make_config, seed_keys
+
+from app import LicenseServer
+
+BLOB_BYTES = 256 * 1024
+
+
+def pad_database(path, size_mb):
+    """Grow the database file to about size_mb with incompressible rows"""
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute('CREATE TABLE IF NOT EXISTS bench_filler (id INTEGER PRIMARY KEY, data BLOB)')
+        rows = size_mb * 1024 * 1024 // BLOB_BYTES
+        for offset in range(0, rows, 100):
+            connection.executemany('INSERT INTO bench_filler (data) VALUES (?)',
+                                   [(os.urandom(BLOB_BYTES),) for _ in range(min(100, rows - offset))])
+            connection.commit()
+        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        connection.close()
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(server, keys, license_type, threads, stop):
+    """Validate keys from threads until stop is set; return per-call latencies in ms"""
+    latencies = []
+    lock = threading.Lock()
+    slices = [iter(keys[i::threads]) for i in range(threads)]
+    
+    def worker(worker_keys):
+        local = []
+        for key in worker_keys:
+            if stop.is_set():
+                break
+            start = time.perf_counter()
+            server.db.validate_license(key, license_type, 'bench', '127.0.0.1')
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+    
+    pool = [threading.Thread(target=worker, args=(worker_keys,)) for worker_keys in slices]
+    for thread in pool:
+        thread.start()
+    return pool, latencies
+
+
+def _report(label, latencies, seconds):
+    print(f"  {label:<26} {len(latencies):>7} validations  {len(latencies) / seconds:>8,.0f}/s  "
+          f"p50 {_percentile(latencies, 0.50):7.2f} ms  p99 {_percentile(latencies, 0.99):7.2f} ms  "
+          f"max {max(latencies):8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=1024)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--keys', type=int, default=200000)
+    parser.add_argument('--license-type', default='BUSINESS')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        config, config_path = make_config(workdir)
+        server = LicenseServer(config_path)
+        start = time.perf_counter()
+        pad_database(server.db.backup.database_path, args.size_mb)
+        keys = seed_keys(config, server.security, server.db, args.license_type, args.keys)
+        size = os.path.getsize(server.db.backup.database_path) / 1024 ** 2
+        print(f"Database of {size:,.0f} MB with {args.keys} keys ready in {time.perf_counter() - start:.1f}s")
+        
+        half = len(keys) // 2
+        stop = threading.Event()
+        pool, latencies = measure(server, keys[:half], args.license_type, args.threads, stop)
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in pool:
+            thread.join()
+        _report('without backup', latencies, args.seconds)
+        
+        stop = threading.Event()
+        pool, latencies = measure(server, keys[half:], args.license_type, args.threads, stop)
+        start = time.perf_counter()
+        path = server.db.backup.run()
+        duration = time.perf_counter() - start
+        stop.set()
+        for thread in pool:
+            thread.join()
+        _report('during backup', latencies, duration)
+        
+        stats = server.db.backup.get_stats()
+        print(f"  backup: {duration:.1f}s, {os.path.getsize(path) / 1024 ** 2:,.0f} MB written, "
+              f"{stats['restarts']} restarts, single-step fallback: {bool(stats['single_step_fallbacks'])}")
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
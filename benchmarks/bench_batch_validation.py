@@ -0,0 +1,87 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""Compare keys/second of single-key and batch license validation
+
+Usage: python benchmarks/bench_batch_validation.py [--keys N] [--batch-size N]
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from datetime import datetime
+
+from _common import make_config, report, seed_keys, signed_request
+
+from app import LicenseServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keys', type=int, default=5000, help='keys per database-level run')
+    parser.add_argument('--http-keys', type=int, default=2000, help='keys per HTTP-level run')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--license-type', default='BUSINESS')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        config, config_path = make_config(workdir, {
+            'licensing': {'max_batch_size': max(args.batch_size, 1000)}
+        })
+        server = LicenseServer(config_path)
+        db, security = server.db, server.security
+        client = server.app.test_client()
+        license_type = args.license_type
+        
+        print(f"Database level ({args.keys} keys, batch size {args.batch_size}):")
+        keys = seed_keys(config, security, db, license_type, args.keys)
+        start = time.perf_counter()
+        for key in keys:
+            db.validate_license(key, license_type, 'bench', '127.0.0.1')
+        single_rate = report('DatabaseManager.validate_license', len(keys), time.perf_counter() - start)
+        
+        keys = seed_keys(config, security, db, license_type, args.keys)
+        start = time.perf_counter()
+        for offset in range(0, len(keys), args.batch_size):
+            db.validate_licenses_bulk([
+                {'license_key': key, 'license_type': license_type, 'client_info': 'bench'}
+                for key in keys[offset:offset + args.batch_size]
+            ], '127.0.0.1')
+        bulk_rate = report('DatabaseManager.validate_licenses_bulk', len(keys), time.perf_counter() - start)
+        print(f"  speedup: {bulk_rate / single_rate:.1f}x")
+        
+        print(f"\nHTTP level through the Flask app ({args.http_keys} keys):")
+        keys = seed_keys(config, security, db, license_type, args.http_keys)
+        start = time.perf_counter()
+        for key in keys:
+            body, headers = signed_request(config, {
+                'license_key': key,
+                'license_type': license_type,
+                'timestamp': datetime.utcnow().isoformat(),
+                'client_info': 'bench'
+            })
+            client.post('/api/validate', data=body, headers=headers)
+        single_rate = report('POST /api/validate', len(keys), time.perf_counter() - start)
+        
+        keys = seed_keys(config, security, db, license_type, args.http_keys)
+        start = time.perf_counter()
+        for offset in range(0, len(keys), args.batch_size):
+            body, headers = signed_request(config, {
+                'licenses': [
+                    {'license_key': key, 'license_type': license_type, 'client_info': 'bench'}
+                    for key in keys[offset:offset + args.batch_size]
+                ],
+                'timestamp': datetime.utcnow().isoformat()
+            }, target='/api/validate/batch')
+            response = client.post('/api/validate/batch', data=body, headers=headers)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        bulk_rate = report('POST /api/validate/batch', len(keys), time.perf_counter() - start)
+        print(f"  speedup: {bulk_rate / single_rate:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""Validations/second from concurrent threads, SQLite defaults vs the tuned profile
+
+Usage: python benchmarks/bench_concurrency.py [--threads 1,4,16] [--keys-per-thread N]
+
+Every validation activates a distinct key, so each one commits a write;
+the activation log writer runs alongside as it does in the server.
+"Before" disables the PRAGMAs and leaves SQLAlchemy's default pool,
+"after" uses the database.sqlite / database.pool defaults (WAL,
+synchronous=NORMAL, cache/mmap sizing, busy_timeout, sized QueuePool).
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+
+from _common import make_config, report, seed_keys
+
+from app import LicenseServer
+
+PROFILES = {
+    'before (SQLite defaults)': {
+        'database': {'sqlite': {'enabled': False}, 'pool': {'strategy': 'default'}}
+    },
+    'after (tuned profile)': {
+        'database': {'pool': {'size': 16, 'max_overflow': 16}}
+    }
+}
+
+
+def _run(server, config, license_type, threads, keys_per_thread):
+    keys = seed_keys(config, server.security, server.db, license_type, threads * keys_per_thread)
+    slices = [keys[i::threads] for i in range(threads)]
+    errors = []
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(worker_keys):
+        barrier.wait()
+        for key in worker_keys:
+            valid, message = server.db.validate_license(key, license_type, 'bench', '127.0.0.1')
+            if not valid:
+                errors.append(message)
+
+    pool = [threading.Thread(target=worker, args=(worker_keys,)) for worker_keys in slices]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - start, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', default='1,4,16')
+    parser.add_argument('--keys-per-thread', type=int, default=300)
+    parser.add_argument('--license-type', default='BUSINESS')
+    args = parser.parse_args()
+    thread_counts = [int(count) for count in args.threads.split(',')]
+
+    for label, overrides in PROFILES.items():
+        print(f"{label}:")
+        for threads in thread_counts:
+            with tempfile.TemporaryDirectory() as workdir:
+                config, config_path = make_config(workdir, overrides)
+                server = LicenseServer(config_path)
+                elapsed, errors = _run(server, config, args.license_type, threads, args.keys_per_thread)
+                report(f"{threads:>2} threads", threads * args.keys_per_thread, elapsed, 'validations')
+                if errors:
+                    print(f"     {len(errors)} failed, e.g. {errors[0]!r}")
+                server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
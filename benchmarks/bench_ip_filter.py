@@ -0,0 +1,108 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""Lookup cost of the compiled IP allow/deny lists with large blocklists
+
+Usage: python benchmarks/bench_ip_filter.py [--entries 100000] [--lookups 200000]
+
+Builds a blocklist of random IPv4/IPv6 addresses and CIDR networks, writes
+it to a list file and measures compile time, lookups per second for
+blocked and unblocked clients, the hot-reload cost, and, for comparison,
+the linear list scan the server used before.
+"""
+
+import argparse
+import ipaddress
+import os
+import random
+import tempfile
+import time
+
+from _common import report
+
+from ip_filter import IPAccessFilter
+
+
+def _random_entries(count, rng):
+    entries = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            address = ipaddress.IPv4Address(rng.getrandbits(32))
+            prefix = rng.choice((32, 32, 32, 24, 20, 16))
+        else:
+            address = ipaddress.IPv6Address(rng.getrandbits(128))
+            prefix = rng.choice((128, 64, 48, 32))
+        entries.append(str(ipaddress.ip_network(f"{address}/{prefix}", strict=False)))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    entries = _random_entries(args.entries, rng)
+    blocked_clients = [
+        str(ipaddress.ip_network(entry).network_address) for entry in rng.sample(entries, 1000)
+    ]
+    clients = [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(800)]
+    clients += [str(ipaddress.IPv6Address(rng.getrandbits(128))) for _ in range(200)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        blocked_file = os.path.join(workdir, 'blocked.txt')
+        with open(blocked_file, 'w') as f:
+            f.write('\n'.join(entries))
+
+        print(f"Blocklist of {args.entries} entries:")
+        start = time.perf_counter()
+        ip_filter = IPAccessFilter({
+            'allowed_ips': [],
+            'blocked_ips': [],
+            'ip_filter': {'blocked_file': blocked_file, 'reload_interval_seconds': 0}
+        })
+        report('compile from file', args.entries, time.perf_counter() - start, 'entries')
+        print(f"  merged intervals: {ip_filter.get_stats()['blocked_intervals']}")
+
+        for label, sample in (('lookups, blocked clients', blocked_clients),
+                              ('lookups, mixed random clients', clients)):
+            # Time lookups without the file mtime check, then with it
+            ip_filter.reload_interval = float('inf')
+            start = time.perf_counter()
+            for i in range(args.lookups):
+                ip_filter.is_allowed(sample[i % len(sample)])
+            rate = report(label, args.lookups, time.perf_counter() - start, 'lookups')
+            print(f"  {'':<44} {1e9 / rate:8.0f} ns/lookup")
+        assert not any(ip_filter.is_allowed(ip) for ip in blocked_clients)
+
+        ip_filter.reload_interval = 0
+        start = time.perf_counter()
+        for i in range(args.lookups // 10):
+            ip_filter.is_allowed(clients[i % len(clients)])
+        report('lookups with an mtime check on every call', args.lookups // 10,
+               time.perf_counter() - start, 'lookups')
+
+        with open(blocked_file, 'a') as f:
+            f.write('\n203.0.113.0/24\n')
+        os.utime(blocked_file, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+        start = time.perf_counter()
+        ip_filter.is_allowed('198.51.100.1')
+        report('hot reload after the file changed', args.entries + 1, time.perf_counter() - start, 'entries')
+        assert not ip_filter.is_allowed('203.0.113.7')
+
+        linear_lookups = max(1, args.lookups // 1000)
+        start = time.perf_counter()
+        for i in range(linear_lookups):
+            clients[i % len(clients)] in entries
+        rate = report('previous linear list scan (exact match only)', linear_lookups,
+                      time.perf_counter() - start, 'lookups')
+        print(f"  {'':<44} {1e9 / rate:8.0f} ns/lookup")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""ns/key of key format validation: per-character scan vs precompiled patterns
+
+Usage: python benchmarks/bench_key_format.py [--keys N] [--invalid-ratio F]
+
+"before" is the previous validate_key_format, which checked the length,
+the prefix and then every character with ``char in KEY_ALPHABET``.
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+from _common import make_config
+
+from security import KEY_ALPHABET, SecurityManager
+
+
+def legacy_validate_key_format(config, prefixes, key, license_type):
+    if len(key) != config['licensing']['key_length']:
+        return False
+    prefix = prefixes.get(license_type, "")
+    if prefix and not key.startswith(prefix):
+        return False
+    return all(char in KEY_ALPHABET for char in key[len(prefix):])
+
+
+def _time(label, function, count, repeat=3):
+    best = min(_once(function) for _ in range(repeat))
+    print(f"  {label:<44} {best / count * 1e9:>8.1f} ns/key")
+    return best
+
+
+def _once(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keys', type=int, default=200000)
+    parser.add_argument('--invalid-ratio', type=float, default=0.0,
+                        help='share of keys with a lowercase character')
+    parser.add_argument('--license-type', default='BUSINESS')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        config, _ = make_config(workdir)
+        security = SecurityManager(config)
+    license_type = args.license_type
+    prefix = security.prefixes[license_type]
+    keys = [prefix + key for key in security.generate_secure_keys(
+        args.keys, config['licensing']['key_length'] - len(prefix)
+    )]
+    for index in random.sample(range(len(keys)), int(len(keys) * args.invalid_ratio)):
+        keys[index] = keys[index][:-1] + 'a'
+    pairs = [(key, license_type) for key in keys]
+    count = len(keys)
+    
+    print(f"{count} {license_type} keys, {args.invalid_ratio:.0%} malformed:")
+    before = _time('before: length, prefix, char in alphabet', lambda: [
+        legacy_validate_key_format(config, security.prefixes, key, license_type) for key in keys
+    ], count)
+    single = _time('validate_key_format (compiled pattern)', lambda: [
+        security.validate_key_format(key, license_type) for key in keys
+    ], count)
+    pairs_time = _time('validate_key_formats(pairs)', lambda: security.validate_key_formats(pairs), count)
+    bulk = _time('validate_key_formats(keys, license_type)',
+                 lambda: security.validate_key_formats(keys, license_type), count)
+    print(f"  speedup over before: single {before / single:.1f}x, pairs {before / pairs_time:.1f}x, "
+          f"bulk {before / bulk:.1f}x")
+    
+    expected = [legacy_validate_key_format(config, security.prefixes, key, license_type) for key in keys]
+    assert security.validate_key_formats(keys, license_type) == expected
+    assert security.validate_key_formats(pairs) == expected
+
+
+if __name__ == '__main__':
+    main()
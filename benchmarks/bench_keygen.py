@@ -0,0 +1,63 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""Keys/second of license key generation, per key vs bulk
+
+Usage: python benchmarks/bench_keygen.py [--keys N] [--single-keys N]
+"""
+
+import argparse
+import secrets
+import tempfile
+import time
+
+from _common import make_config, report
+
+from app import LicenseServer
+from security import KEY_ALPHABET
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keys', type=int, default=200000, help='keys for the bulk runs')
+    parser.add_argument('--single-keys', type=int, default=2000, help='keys for the per-key runs')
+    parser.add_argument('--license-type', default='BUSINESS')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config, config_path = make_config(workdir)
+        server = LicenseServer(config_path)
+        security, db = server.security, server.db
+        license_type = args.license_type
+        prefix = server.key_generator.prefixes[license_type]
+        length = config['licensing']['key_length'] - len(prefix)
+
+        print("Random key strings (no database):")
+        start = time.perf_counter()
+        for _ in range(args.single_keys * 10):
+            ''.join(secrets.choice(KEY_ALPHABET) for _ in range(length))
+        report('secrets.choice per character', args.single_keys * 10, time.perf_counter() - start)
+        start = time.perf_counter()
+        security.generate_secure_keys(args.keys, length)
+        report('generate_secure_keys (token_bytes + translate)', args.keys, time.perf_counter() - start)
+
+        print("\nGenerate and store:")
+        start = time.perf_counter()
+        for _ in range(args.single_keys):
+            db.add_license_key(prefix + security.generate_secure_key(length), license_type)
+        single_rate = report('add_license_key per key', args.single_keys, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = server.key_generator.generate_keys_for_type(license_type, args.keys)
+        bulk_rate = report('KeyGenerator.generate_keys_for_type (bulk)',
+                           result['success_count'], time.perf_counter() - start)
+        print(f"  speedup: {bulk_rate / single_rate:.1f}x, duplicates retried: {result['duplicates_retried']}")
+
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
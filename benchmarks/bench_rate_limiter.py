@@ -0,0 +1,108 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""Per-request cost and cross-process accuracy of the rate limiter
+
+Usage: python benchmarks/bench_rate_limiter.py [--hits N] [--clients N] [--processes N] [--limit N]
+
+First times RateLimiter.check_request (one IP and one X-API-Key hit per
+request, spread over --clients clients) for the previous in-process
+``limits`` memory:// storage and for each shared_memory strategy.
+
+Then forks --processes workers from a process holding one limiter, as
+the pre-fork server does, and lets each send 2 * --limit requests from
+the same client. With memory:// every worker counts on its own copy and
+lets --processes * --limit through; with shared_memory the workers must
+let exactly --limit through together. The script exits with status 1
+if they do not.
+"""
+
+import argparse
+import multiprocessing
+import sys
+import time
+
+import _common  # noqa: F401  (puts the repository root on sys.path)
+
+from api_keys import parse_api_key
+from rate_limiter import RateLimiter
+
+SECURITY_CONFIG = {'rate_limiting_enabled': True, 'max_requests_per_minute': 600}
+
+BACKENDS = [
+    ('limits memory:// fixed-window (previous)', {'backend': 'limits', 'strategy': 'fixed-window'}),
+    ('limits memory:// sliding-window-counter', {'backend': 'limits', 'strategy': 'sliding-window-counter'}),
+    ('shared_memory fixed-window', {'backend': 'shared_memory', 'strategy': 'fixed-window'}),
+    ('shared_memory sliding-window', {'backend': 'shared_memory', 'strategy': 'sliding-window'}),
+    ('shared_memory token-bucket', {'backend': 'shared_memory', 'strategy': 'token-bucket'}),
+]
+
+
+def _overhead(label, options, hits, clients):
+    limiter = RateLimiter({**options, 'limits': {'ip': '1000000000 per minute', 'api_key': '1000000000 per minute'}},
+                          SECURITY_CONFIG)
+    requests = [(f"10.0.{i // 256 % 256}.{i % 256}", parse_api_key(f"sk_client_{i}")) for i in range(clients)]
+    check_request = limiter.check_request
+    start = time.perf_counter()
+    for i in range(hits):
+        client_ip, api_key = requests[i % clients]
+        if not check_request(client_ip, api_key):
+            raise SystemExit(f"{label}: request limited")
+    elapsed = time.perf_counter() - start
+    limiter.close()
+    print(f"  {label:<44} {elapsed / hits * 1e6:8.2f} us/request")
+
+
+def _worker(limiter, requests, results):
+    results.put(sum(limiter.check_request('203.0.113.7') for _ in range(requests)))
+
+
+def _allowed_across_processes(options, processes, limit):
+    limiter = RateLimiter({**options, 'limits': {'ip': f"{limit} per hour", 'api_key': False}}, SECURITY_CONFIG)
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=_worker, args=(limiter, 2 * limit, results)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    allowed = sum(results.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    limiter.close()
+    return allowed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hits', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=500)
+    args = parser.parse_args()
+    
+    print(f"RateLimiter.check_request, IP + API key limit ({args.hits} requests, {args.clients} clients):")
+    for label, options in BACKENDS:
+        _overhead(label, options, args.hits, args.clients)
+    
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        print("\nfork() is not available here; skipping the cross-process check")
+        return
+    
+    print(f"\n{args.processes} forked workers x {2 * args.limit} requests from one IP, limit {args.limit} per hour:")
+    failed = False
+    for label, options in BACKENDS:
+        allowed = _allowed_across_processes(options, args.processes, args.limit)
+        shared = options['backend'] == 'shared_memory'
+        verdict = ''
+        if shared:
+            failed = failed or allowed != args.limit
+            verdict = 'OK' if allowed == args.limit else f"FAILED, expected {args.limit}"
+        print(f"  {label:<44} {allowed:>8} allowed  {verdict}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
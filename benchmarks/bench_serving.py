@@ -0,0 +1,129 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""Requests/second of the pre-fork server as the worker count grows
+
+Usage: python benchmarks/bench_serving.py [--workers 1,2,4] [--clients 16] [--duration 5]
+
+Each run starts PreforkServer on a local port against a fresh SQLite
+database and drives signed POST /api/validate requests (well-formed keys
+that are not in the database) from separate client processes over
+keep-alive connections.
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from _common import make_config, seed_keys, signed_request
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _serve(config_path):
+    sys.stdout = open(os.devnull, 'w')
+    from app import LicenseServer
+    from prefork import PreforkServer
+    server = LicenseServer(config_path)
+    PreforkServer(server, server.config['server']).run()
+
+
+def _client(args):
+    config, port, duration = args
+    deadline = time.monotonic() + duration
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    prefix = 'BUS'
+    done = errors = 0
+    while time.monotonic() < deadline:
+        key = prefix + os.urandom(7).hex().upper()[:13]
+        body, headers = signed_request(config, {
+            'license_key': key,
+            'license_type': 'BUSINESS',
+            'timestamp': datetime.utcnow().isoformat()
+        })
+        try:
+            connection.request('POST', '/api/validate', body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status not in (200, 403):
+                errors += 1
+            done += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.close()
+    return done, errors
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4', help='comma separated worker counts')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--seed-keys', type=int, default=10000)
+    args = parser.parse_args()
+    
+    print(f"{'workers':>8} {'threads':>8} {'requests':>10} {'errors':>8} {'req/s':>10}")
+    for workers in [int(w) for w in args.workers.split(',')]:
+        with tempfile.TemporaryDirectory() as workdir:
+            port = _free_port()
+            config, config_path = make_config(workdir, {'server': {
+                'host': '127.0.0.1',
+                'port': port,
+                'mode': 'prefork',
+                'workers': workers,
+                'threads': args.threads,
+                'max_requests': 0
+            }})
+            
+            from app import LicenseServer
+            seeder = LicenseServer(config_path)
+            seed_keys(config, seeder.security, seeder.db, 'BUSINESS', args.seed_keys)
+            seeder.shutdown()
+            
+            server = multiprocessing.Process(target=_serve, args=(config_path,))
+            server.start()
+            try:
+                _wait_for_port(port)
+                with multiprocessing.Pool(args.clients) as pool:
+                    start = time.perf_counter()
+                    results = pool.map(_client, [(config, port, args.duration)] * args.clients)
+                    elapsed = time.perf_counter() - start
+            finally:
+                os.kill(server.pid, signal.SIGTERM)
+                server.join(60)
+            
+            done = sum(r[0] for r in results)
+            errors = sum(r[1] for r in results)
+            print(f"{workers:>8} {args.threads:>8} {done:>10} {errors:>8} {done / elapsed:>10,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+"""Latency of /api/admin/stats queries: four COUNT(*)s vs one SUM(CASE) pass vs license_counters
+
+Usage: python benchmarks/bench_stats.py [--keys N] [--repeat N]
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime
+
+from _common import make_config
+
+from app import LicenseServer
+from database import LicenseKey
+
+
+def four_counts(db):
+    """The original get_license_stats: one full COUNT(*) per figure"""
+    session = db.Session()
+    try:
+        return {
+            'total_keys': session.query(LicenseKey).count(),
+            'active_keys': session.query(LicenseKey).filter_by(is_active=True).count(),
+            'used_keys': session.query(LicenseKey).filter_by(is_used=True).count(),
+            'expired_keys': session.query(LicenseKey).filter(
+                LicenseKey.expiration_date < datetime.utcnow()
+            ).count()
+        }
+    finally:
+        session.close()
+
+
+def _time(label, function, repeat):
+    function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    elapsed_ms = (time.perf_counter() - start) / repeat * 1000
+    print(f"  {label:<40} {elapsed_ms:>9.3f} ms/call")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keys', type=int, default=300000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config, config_path = make_config(workdir)
+        server = LicenseServer(config_path)
+        db = server.db
+        for license_type in config['licensing']['license_types']:
+            server.key_generator.generate_keys_for_type(license_type, args.keys // len(config['licensing']['license_types']))
+
+        print(f"{args.keys} keys:")
+        before = _time('four COUNT(*) queries', lambda: four_counts(db), args.repeat)
+        db.stats_from_counters = False
+        scan = _time('one SUM(CASE) pass by license_type', db.get_license_stats, args.repeat)
+        db.stats_from_counters = True
+        counters = _time('license_counters', db.get_license_stats, args.repeat)
+        assert {name: scan[name] for name in before} == before
+        assert counters == scan
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
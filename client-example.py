@@ -30,7 +30,10 @@ import platform
 import hmac
 import hashlib
 import base64
+import bisect
 import json
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
 
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -38,6 +41,27 @@ warnings.filterwarnings("ignore", category=InsecureRequestWarning)
 
 # ==================== LICENSE SYSTEM ====================
 
+# License types used until the server's registry (/api/license-types) has been fetched
+DEFAULT_LICENSE_TYPES = {
+    'BUSINESS': {
+        'prefix': 'BUS', 'key_length': 16,
+        'features': ['high_precision', 'physics_engine', 'math_engine', 'statistics_engine',
+                     'symbolic_math', 'advanced_functions', 'export_features', 'custom_precision']
+    },
+    'PRO': {
+        'prefix': 'PRO', 'key_length': 16,
+        'features': ['high_precision', 'physics_engine', 'math_engine', 'statistics_engine',
+                     'symbolic_math', 'advanced_functions', 'custom_precision']
+    },
+    'STUDENT': {
+        'prefix': 'STU', 'key_length': 16,
+        'features': ['high_precision', 'physics_engine', 'math_engine', 'statistics_engine',
+                     'custom_precision']
+    }
+}
+# Type assumed for keys whose prefix matches no license type
+FALLBACK_LICENSE_TYPE = 'STUDENT'
+
 class LicenseManager:
     """License manager for calculator with device binding"""
     
@@ -54,31 +78,175 @@ class LicenseManager:
         self.verified_keys = self._load_verified_keys()
         self.cert_path = "cert.pem"
         self.hmac_secret = "your-secret"
-    
-    def _generate_hmac_signature(self, data: dict) -> str:
-        """Generate HMAC signature for data"""
+        # Public key of the server's lease signing key (licensing.leases.public_key)
+        self.lease_public_key = "your-lease-public-key"
+        self._verified_leases = {}
+        self.revocations_file = "revocations.json"
+        self.revocation_poll_seconds = 3600
+        self._revocations = self._load_revocations()
+        self.license_types_file = "license_types.json"
+        self._license_types_cache = self._load_license_types()
+        self._index_license_types()
+        self._license_types_fetched = False
+    
+    def _load_license_types(self) -> Dict[str, Any]:
+        """Load the cached license type registry and its ETag"""
         try:
-            # Format JSON EXACTLY as on server
-            # Server uses: json.dumps(data, sort_keys=True, separators=(',', ':'))
-            payload_str = json.dumps(data, sort_keys=True, separators=(',', ':'))
+            if os.path.exists(self.license_types_file):
+                with open(self.license_types_file, 'r', encoding='utf-8') as f:
+                    cache = json.load(f)
+                if cache.get('license_types'):
+                    return cache
+        except Exception:
+            pass
+        return {'etag': None, 'license_types': DEFAULT_LICENSE_TYPES}
+    
+    def _index_license_types(self):
+        """Build the prefix lookup: one dict per prefix length, longest first"""
+        self.license_types = self._license_types_cache['license_types']
+        by_prefix = {}
+        for name, definition in self.license_types.items():
+            prefix = definition.get('prefix', '')
+            if prefix:
+                by_prefix.setdefault(len(prefix), {})[prefix] = name
+        self._license_prefixes = sorted(by_prefix.items(), reverse=True)
+    
+    def refresh_license_types(self) -> bool:
+        """Fetch the license type registry once per run, revalidating the cached copy by ETag
+        
+        Without a connection the cached (or built-in) registry stays in use.
+        """
+        if self._license_types_fetched:
+            return True
+        self._license_types_fetched = True
+        try:
+            headers = self._signed_headers('GET', '/api/license-types')
+            if self._license_types_cache.get('etag'):
+                headers['If-None-Match'] = self._license_types_cache['etag']
             
-            print(f"🔐 Data for signature: {payload_str}")
+            response = requests.get(
+                f"{self.license_server_url}/api/license-types",
+                headers=headers,
+                timeout=10,
+                verify=False
+            )
             
+            if response.status_code == 200:
+                self._license_types_cache = {
+                    'etag': response.headers.get('ETag'),
+                    'license_types': response.json()['license_types']
+                }
+                self._index_license_types()
+                with open(self.license_types_file, 'w', encoding='utf-8') as f:
+                    json.dump(self._license_types_cache, f, indent=2)
+            elif response.status_code != 304:
+                return False
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to refresh license types: {e}")
+            return False
+    
+    def _load_revocations(self) -> Dict[str, Any]:
+        """Load the local revocation list: sorted key hashes and the feed version they reflect"""
+        try:
+            if os.path.exists(self.revocations_file):
+                with open(self.revocations_file, 'r', encoding='utf-8') as f:
+                    revocations = json.load(f)
+                revocations['revoked'] = sorted(revocations.get('revoked', []))
+                return revocations
+        except Exception:
+            pass
+        return {'version': 0, 'etag': None, 'polled_at': 0, 'revoked': []}
+    
+    def _is_revoked(self, license_key: str) -> bool:
+        """Binary search of the key's hash in the local revocation list"""
+        key_hash = hashlib.sha256(license_key.encode()).hexdigest()
+        revoked = self._revocations['revoked']
+        index = bisect.bisect_left(revoked, key_hash)
+        return index < len(revoked) and revoked[index] == key_hash
+    
+    def refresh_revocations(self, force: bool = False) -> bool:
+        """Apply the revocations published since the last sync
+        
+        Polls at most every revocation_poll_seconds unless forced. The
+        server answers 304 while nothing changed; otherwise it sends only
+        the key hashes revoked or restored since the local version.
+        """
+        if not force and time.time() - self._revocations.get('polled_at', 0) < self.revocation_poll_seconds:
+            return True
+        try:
+            revocations = self._revocations
+            more = True
+            while more:
+                # The query string is part of the signature, so it is built here
+                target = f"/api/revocations?since={int(revocations['version'])}"
+                headers = self._signed_headers('GET', target)
+                if revocations.get('etag'):
+                    headers['If-None-Match'] = revocations['etag']
+                
+                response = requests.get(
+                    f"{self.license_server_url}{target}",
+                    headers=headers,
+                    timeout=10,
+                    verify=False
+                )
+                if response.status_code == 304:
+                    break
+                if response.status_code != 200:
+                    return False
+                
+                data = response.json()
+                revoked = set() if data['reset'] else set(revocations['revoked'])
+                revoked.update(data['revoked'])
+                revoked.difference_update(data['restored'])
+                revocations = {
+                    'version': data['version'],
+                    'etag': response.headers.get('ETag'),
+                    'revoked': sorted(revoked)
+                }
+                more = data['more']
+            
+            revocations['polled_at'] = time.time()
+            self._revocations = revocations
+            with open(self.revocations_file, 'w', encoding='utf-8') as f:
+                json.dump(revocations, f)
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to refresh revocations: {e}")
+            return False
+    
+    def _signed_headers(self, method: str, target: str, body: bytes = b'') -> Dict[str, str]:
+        """API key and version 2 signature headers for one request
+        
+        The signature covers the method, the path with its query string,
+        a fresh X-Timestamp and the exact body bytes, so the server accepts
+        it for this request only, and only once.
+        """
+        timestamp = datetime.utcnow().isoformat()
+        message = f"{method}\n{target}\n{timestamp}\n".encode('utf-8') + body
+        return {
+            'X-API-Key': self.api_key,
+            'X-Signature': self._generate_hmac_signature(message),
+            'X-Signature-Version': '2',
+            'X-Timestamp': timestamp
+        }
+    
+    def _generate_hmac_signature(self, message: bytes) -> str:
+        """Generate HMAC signature of the exact message bytes"""
+        try:
             # Decode base64 secret
             secret_bytes = base64.b64decode(self.hmac_secret)
             
-            # Create HMAC signature
+            # Create HMAC signature over the bytes that are sent
+            # (server signature version 2, see _signed_headers)
             signature = hmac.new(
                 secret_bytes,
-                payload_str.encode('utf-8'),
+                message,
                 hashlib.sha256
             ).digest()
             
             # Encode to base64
-            signature_b64 = base64.b64encode(signature).decode('utf-8')
-            print(f"🔐 Generated signature: {signature_b64}")
-            
-            return signature_b64
+            return base64.b64encode(signature).decode('utf-8')
             
         except Exception as e:
             print(f"⚠️ HMAC generation error: {e}")
@@ -146,37 +314,8 @@ class LicenseManager:
     def _get_license_features(self, license_type: str) -> Dict[str, bool]:
         """Return functions depending on license type"""
         features = self._get_default_features()
-        
-        if license_type == "STUDENT":
-            features.update({
-                'high_precision': True,
-                'physics_engine': True,
-                'math_engine': True,
-                'statistics_engine': True,
-                'custom_precision': True,
-            })
-        elif license_type == "PRO":
-            features.update({
-                'high_precision': True,
-                'physics_engine': True,
-                'math_engine': True,
-                'statistics_engine': True,
-                'symbolic_math': True,
-                'advanced_functions': True,
-                'custom_precision': True,
-            })
-        elif license_type == "BUSINESS":
-            features.update({
-                'high_precision': True,
-                'physics_engine': True,
-                'math_engine': True,
-                'statistics_engine': True,
-                'symbolic_math': True,
-                'advanced_functions': True,
-                'export_features': True,
-                'custom_precision': True,
-            })
-            
+        definition = self.license_types.get(license_type, {})
+        features.update({feature: True for feature in definition.get('features', [])})
         return features
     
     def validate_license(self, license_key: str) -> Tuple[bool, str]:
@@ -194,14 +333,11 @@ class LicenseManager:
                 'device_id': self.device_id
             }
             
-            # Generate HMAC signature BEFORE sending
-            signature = self._generate_hmac_signature(payload)
-            
-            headers = {
-                'X-API-Key': self.api_key,
-                'Content-Type': 'application/json',
-                'X-Signature': signature
-            }
+            # Serialize once and sign exactly the bytes that are sent
+            body = json.dumps(payload).encode('utf-8')
+            headers = self._signed_headers('POST', '/api/validate', body)
+            headers['Content-Type'] = 'application/json'
+            signature = headers['X-Signature']
             
             print(f"📦 Data being sent: {json.dumps(payload, indent=2)}")
             print(f"🔐 HMAC signature: {signature}")
@@ -209,7 +345,7 @@ class LicenseManager:
             
             response = requests.post(
                 f"{self.license_server_url}/api/validate",
-                json=payload,  # Send original payload
+                data=body,  # Send the signed bytes unchanged
                 headers=headers,
                 timeout=10,
                 verify=False
@@ -222,7 +358,7 @@ class LicenseManager:
             if response.status_code == 200:
                 data = response.json()
                 if data['status'] == 'success':
-                    self._add_verified_key(license_key, license_type)
+                    self._add_verified_key(license_key, license_type, data)
                     self.license_key = license_key
                     self.license_type = license_type
                     self.license_valid = True
@@ -272,7 +408,7 @@ class LicenseManager:
             if response.status_code == 200:
                 data = response.json()
                 if data['status'] == 'success':
-                    self._add_verified_key(license_key, license_type)
+                    self._add_verified_key(license_key, license_type, data)
                     
                     self.license_key = license_key
                     self.license_type = license_type
@@ -321,7 +457,7 @@ class LicenseManager:
             if response.status_code == 200:
                 data = response.json()
                 if data['status'] == 'success':
-                    self._add_verified_key(license_key, license_type)
+                    self._add_verified_key(license_key, license_type, data)
                     
                     self.license_key = license_key
                     self.license_type = license_type
@@ -341,55 +477,96 @@ class LicenseManager:
         except Exception as e:
             return False, f"❌ Connection error: {str(e)}"
 
-    def _add_verified_key(self, license_key: str, license_type: str):
-        """Add key to verified list"""
+    def _add_verified_key(self, license_key: str, license_type: str, response: Optional[Dict] = None):
+        """Add key to verified list, with the signed lease of the server's response"""
         self.verified_keys[license_key] = {
             'type': license_type,
             'verified_at': datetime.now().isoformat(),
             'device_id': self.device_id
         }
+        if response and response.get('lease'):
+            self.verified_keys[license_key]['lease'] = response['lease']
+            self.verified_keys[license_key]['lease_renew_before'] = response.get('lease_renew_before', 86400)
         self._save_verified_keys()
     
     def _is_key_verified(self, license_key: str) -> bool:
-        """Check if key was verified by server"""
-        return license_key in self.verified_keys
+        """Check if key holds an unexpired lease signed by the server"""
+        return self._lease_claims(license_key) is not None
+    
+    def _lease_claims(self, license_key: str) -> Optional[Dict[str, Any]]:
+        """Claims of the server-signed lease stored for license_key, or None
+        
+        The lease must carry the server's signature, this device and the
+        key's hash, so editing verified_keys.json grants nothing. The
+        signature is checked once per lease; later calls are a dict lookup.
+        Revoked keys have no valid lease.
+        """
+        token = self.verified_keys.get(license_key, {}).get('lease')
+        if not token or self._is_revoked(license_key):
+            return None
+        
+        claims = self._verified_leases.get(token)
+        if claims is None:
+            claims = self._verify_lease(token)
+            if claims is None or claims.get('kh') != hashlib.sha256(license_key.encode()).hexdigest():
+                return None
+            self._verified_leases[token] = claims
+        
+        if claims['exp'] <= time.time():
+            return None
+        return claims
+    
+    def _verify_lease(self, token: str) -> Optional[Dict[str, Any]]:
+        """Decode a lease token if its Ed25519 signature is valid and it is bound to this device"""
+        def b64decode(text):
+            return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+        
+        try:
+            payload, signature = token.split('.')
+            public_key = Ed25519PublicKey.from_public_bytes(base64.b64decode(self.lease_public_key))
+            public_key.verify(b64decode(signature), payload.encode('ascii'))
+            claims = json.loads(b64decode(payload))
+        except (ValueError, TypeError, InvalidSignature):
+            return None
+        
+        if not isinstance(claims, dict) or claims.get('v') != 1 or claims.get('d') != self.device_id:
+            return None
+        return claims
+    
+    def _lease_features(self, claims: Dict[str, Any]) -> Dict[str, bool]:
+        """Features granted by a lease"""
+        features = self._get_default_features()
+        features.update({feature: True for feature in claims.get('f', [])})
+        return features
     
     def _detect_license_type(self, license_key: str) -> str:
-        """Detect license type by key"""
+        """Detect license type by key prefix (longest matching prefix wins)"""
+        self.refresh_license_types()
         license_key_upper = license_key.upper()
         
-        if license_key_upper.startswith("BUS"):
-            return "BUSINESS"
-        elif license_key_upper.startswith("PRO"):
-            return "PRO" 
-        elif license_key_upper.startswith("STU"):
-            return "STUDENT"
-        else:
-            return "STUDENT"
+        for length, prefixes in self._license_prefixes:
+            license_type = prefixes.get(license_key_upper[:length])
+            if license_type:
+                return license_type
+        return FALLBACK_LICENSE_TYPE
     
     def _validate_license_offline(self, license_key: str) -> Tuple[bool, str]:
         """Offline license validation - ONLY for verified keys"""
         # Check basic format
-        if len(license_key) != 16:
+        key_length = self.license_types.get(self._detect_license_type(license_key), {}).get('key_length', 16)
+        if len(license_key) != key_length:
             return False, "❌ Invalid license key format"
         
-        # Check if key was verified by server
-        if not self._is_key_verified(license_key):
-            return False, "❌ Key not verified by server. Online activation required."
-        
-        # Get verified key information
-        key_info = self.verified_keys.get(license_key, {})
-        license_type = key_info.get('type', self._detect_license_type(license_key))
-        
-        # Check device binding
-        saved_device_id = key_info.get('device_id')
-        if saved_device_id and saved_device_id != self.device_id:
-            return False, "❌ License bound to another device"
+        # Check the server-signed lease (which also binds the key to this device)
+        claims = self._lease_claims(license_key)
+        if claims is None:
+            return False, "❌ No valid server lease for this key. Online activation required."
+        license_type = claims['t']
         
         self.license_key = license_key
         self.license_type = license_type
         self.license_valid = True
-        self.license_features = self._get_license_features(license_type)
+        self.license_features = self._lease_features(claims)
         
         # Auto-save on offline activation
         self._auto_save()
@@ -432,11 +609,30 @@ class LicenseManager:
                 self.license_valid = state.get('license_valid', False)
                 self.license_features = state.get('license_features', self._get_default_features())
                 
-                # Check if key is still verified
-                if self.license_valid and self.license_key and not self._is_key_verified(self.license_key):
-                    print("⚠️ License no longer verified")
-                    self.license_valid = False
-                    return False
+                # Trust only the signed lease, and phone home only when it
+                # is missing or close to expiry; offline, the lease is used
+                # until it expires
+                if self.license_valid and self.license_key:
+                    self.refresh_revocations()
+                    if self._is_revoked(self.license_key):
+                        print("⛔ License has been revoked")
+                        self.license_valid = False
+                        self.license_features = self._get_default_features()
+                        return False
+                    
+                    claims = self._lease_claims(self.license_key)
+                    renew_before = self.verified_keys.get(self.license_key, {}).get('lease_renew_before', 86400)
+                    if claims is None or claims['exp'] - time.time() < renew_before:
+                        print("🔄 Renewing license lease")
+                        self.validate_license(self.license_key)
+                        claims = self._lease_claims(self.license_key)
+                    if claims is None:
+                        print("⚠️ License no longer verified")
+                        self.license_valid = False
+                        self.license_features = self._get_default_features()
+                        return False
+                    self.license_type = claims['t']
+                    self.license_features = self._lease_features(claims)
                 
                 if self.license_valid:
                     print(f"🔑 {self.license_type} license automatically restored")
@@ -1733,10 +1929,8 @@ class VimStyleCalculator:
             
             license_info = state.get('license_info', {})
             if license_info.get('valid') and license_info.get('key'):
-                self.license_manager.license_key = license_info['key']
-                self.license_manager.license_type = license_info['type']
-                self.license_manager.license_valid = True
-                self.license_manager.license_features = license_info.get('features', {})
+                # Only a key holding a valid server lease is restored
+                self.license_manager._validate_license_offline(license_info['key'])
             
             print(f"✅ State loaded from {filename}")
             print(f"📖 Loaded {len(self.calc.history)} history records")
@@ -5,11 +5,31 @@
 # Copyright (c) 2025 developercreation
 
 
-from sqlalchemy import create_engine, Column, String, DateTime, Boolean, Integer, Text
+from sqlalchemy import (
+    Column, String, Date, DateTime, Boolean, Integer, Text, case, delete, func, inspect, select, text,
+    tuple_, update
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import datetime, time, timedelta
+import itertools
 import json
+import logging
+from activation_rollups import ActivationRollups
+from api_keys import APIKeyUsageTracker
+from backup import DatabaseBackup
+from audit_log import ActivationLogWriter, activation_log_row
+from license_cache import LicenseCache, LicenseSnapshot, snapshot_license
+from log_retention import LogRetention
+from revocations import RevocationFeed
+from key_filter import LicenseKeyFilter
+from storage_profile import (
+    create_database_engine, database_url, insert_ignoring_duplicates, insert_or_increment,
+    replica_urls
+)
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
@@ -20,7 +40,7 @@ class LicenseKey(Base):
     key_hash = Column(String(64), unique=True, nullable=False, index=True)
     license_type = Column(String(20), nullable=False, index=True)
     created_date = Column(DateTime, default=datetime.utcnow)
-    expiration_date = Column(DateTime, nullable=False)
+    expiration_date = Column(DateTime, nullable=False, index=True)
     is_active = Column(Boolean, default=True)
     is_used = Column(Boolean, default=False)
     used_date = Column(DateTime, nullable=True)
@@ -28,39 +48,584 @@ class LicenseKey(Base):
     activation_count = Column(Integer, default=0)
     max_activations = Column(Integer, default=1)
 
+# Columns the validation rules look at, in LicenseSnapshot order
+LICENSE_STATE_COLUMNS = tuple(LicenseKey.__table__.c[name] for name in LicenseSnapshot._fields)
+
+# Longest device_id accepted from clients
+MAX_DEVICE_ID_LENGTH = 128
+
+class KeyActivation(Base):
+    """Devices holding a seat of a license key
+    
+    A device that already holds a seat is validated again with one primary
+    key lookup and does not take another seat.
+    """
+    __tablename__ = 'key_activations'
+    
+    key_hash = Column(String(64), primary_key=True)
+    device_id = Column(String(MAX_DEVICE_ID_LENGTH), primary_key=True)
+    activated_date = Column(DateTime, default=datetime.utcnow)
+    client_ip = Column(String(45))
+
 class ActivationLog(Base):
     __tablename__ = 'activation_logs'
     
     id = Column(Integer, primary_key=True)
     key_hash = Column(String(64), nullable=False, index=True)
-    activation_date = Column(DateTime, default=datetime.utcnow)
+    license_type = Column(String(20), nullable=True)
+    activation_date = Column(DateTime, default=datetime.utcnow, index=True)
     client_ip = Column(String(45))
     client_info = Column(Text)
     success = Column(Boolean)
     reason = Column(Text)
 
-class DatabaseManager:
+class ActivationRollup(Base):
+    """Activation attempts per time bucket, license type, reason and client IP"""
+    __tablename__ = 'activation_rollups'
+    
+    # Key order serves range scans for all IPs ('') as well as for one IP
+    granularity = Column(String(6), primary_key=True)
+    client_ip = Column(String(45), primary_key=True, default='')
+    bucket_start = Column(DateTime, primary_key=True)
+    license_type = Column(String(20), primary_key=True, default='')
+    reason = Column(String(100), primary_key=True, default='')
+    successes = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)
+
+class LicenseCounter(Base):
+    """Key counts per license type and expiration day
+    
+    Updated in the same transaction as every change to ``license_keys`` so
+    statistics never have to scan the keys themselves.
+    """
+    __tablename__ = 'license_counters'
+    
+    license_type = Column(String(20), primary_key=True)
+    expiration_day = Column(Date, primary_key=True)
+    total_keys = Column(Integer, nullable=False, default=0)
+    active_keys = Column(Integer, nullable=False, default=0)
+    used_keys = Column(Integer, nullable=False, default=0)
+
+LICENSE_STATS = ('total_keys', 'active_keys', 'used_keys', 'expired_keys')
+
+class APIKeyUsage(Base):
+    """Requests per API key and day, added in batches by APIKeyUsageTracker"""
+    __tablename__ = 'api_key_usage'
+    
+    key_hash = Column(String(64), primary_key=True)
+    day = Column(Date, primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    rejected = Column(Integer, nullable=False, default=0)
+
+class LicenseRevocation(Base):
+    """Change log of deactivated (revoked) and reactivated license keys
+    
+    Appended in the same transaction as the change; the id is the version
+    clients of ``/api/revocations`` sync from.
+    """
+    __tablename__ = 'license_revocations'
+    
+    id = Column(Integer, primary_key=True)
+    key_hash = Column(String(64), nullable=False)
+    revoked = Column(Boolean, nullable=False)
+    changed_date = Column(DateTime, default=datetime.utcnow)
+
+def upgrade_schema(engine):
+    """Bring tables created by older versions up to the current models
+    
+    create_all() only creates missing tables. Columns added to a model
+    since (such as activation_logs.license_type) are added with ALTER
+    TABLE, which only works for nullable columns, and missing indexes are
+    created. Returns the names of the added columns.
+    """
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    added = []
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                connection.execute(text(
+                    f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} "
+                    f"{column.type.compile(dialect=engine.dialect)}"
+                ))
+                added.append(f"{table.name}.{column.name}")
+    
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    return added
+
+class LicenseValidationMixin:
+    """Validation rules shared by DatabaseManager and AsyncDatabaseManager
+    
+    Subclasses provide ``config``, ``security``, ``license_cache``,
+    ``key_filter`` and ``activation_log``; they only differ in how rows are
+    read and committed.
+    """
+    
+    # Keeps IN (...) lookups below SQLite's bound-parameter limit
+    BULK_LOOKUP_CHUNK = 900
+    
+    def _precheck_license(self, key, license_type, client_info, client_ip, device_id, log_entries):
+        """Run every check that does not need the database
+        
+        Returns ``(key_hash, None, filtered)`` when the key has to be looked
+        up, filtered being False when the key filter missed but is behind
+        (see _key_filter_verdict), or ``(key_hash, (False, message), True)``
+        when it was rejected, in which case its log row was appended to
+        log_entries for the caller to queue.
+        """
+        # Check key format with prefix
+        if not self.security.validate_key_format(key, license_type):
+            log_entries.append(activation_log_row(
+                "", client_ip, client_info, False, "Invalid key format or prefix mismatch", license_type
+            ))
+            return "", (False, "Invalid key format or prefix mismatch"), True
+        
+        key_hash = self.security.hash_key(key)
+        
+        # Keys that are missing or can never be activated again are
+        # answered from the cache without touching the database
+        rejection = self._cached_rejection(key_hash, license_type, device_id)
+        known = True
+        if rejection is None:
+            known = self._key_filter_verdict(key_hash, license_type)
+            if known is False:
+                rejection = ("Key not found", "Invalid license key")
+        if rejection:
+            reason, message = rejection
+            log_entries.append(activation_log_row(
+                key_hash, client_ip, client_info, False, reason, license_type
+            ))
+            return key_hash, (False, message), True
+        
+        return key_hash, None, known is not None
+    
+    def _prepare_bulk(self, licenses, client_ip):
+        """Precheck a batch
+        
+        Returns (results, log rows, keys left to look up, the hashes of those
+        the key filter does not know).
+        """
+        results = [None] * len(licenses)
+        log_entries = []
+        pending = []
+        unfiltered = set()
+        well_formed = self.security.validate_key_formats(
+            [(item['license_key'], item['license_type']) for item in licenses]
+        )
+        
+        for index, item in enumerate(licenses):
+            key = item['license_key']
+            license_type = item['license_type']
+            client_info = item.get('client_info')
+            device_id = item.get('device_id')
+            
+            if not well_formed[index]:
+                log_entries.append(activation_log_row(
+                    "", client_ip, client_info, False, "Invalid key format or prefix mismatch",
+                    license_type
+                ))
+                results[index] = (False, "Invalid key format or prefix mismatch")
+                continue
+            
+            key_hash = self.security.hash_key(key)
+            rejection = self._cached_rejection(key_hash, license_type, device_id)
+            known = True
+            if rejection is None:
+                known = self._key_filter_verdict(key_hash, license_type)
+                if known is False:
+                    rejection = ("Key not found", "Invalid license key")
+            if rejection:
+                reason, message = rejection
+                log_entries.append(activation_log_row(
+                    key_hash, client_ip, client_info, False, reason, license_type
+                ))
+                results[index] = (False, message)
+                continue
+            
+            if known is None:
+                unfiltered.add(key_hash)
+            pending.append((index, key_hash, license_type, client_info, device_id))
+        
+        return results, log_entries, pending, unfiltered
+    
+    def _bulk_lookup_chunks(self, pending):
+        """Split the distinct key hashes of a batch into IN (...) sized chunks"""
+        key_hashes = list({key_hash for _, key_hash, _, _, _ in pending})
+        return [
+            key_hashes[start:start + self.BULK_LOOKUP_CHUNK]
+            for start in range(0, len(key_hashes), self.BULK_LOOKUP_CHUNK)
+        ]
+    
+    def _license_states_query(self, key_hashes):
+        """SELECT of the key_hash and LICENSE_STATE_COLUMNS of key_hashes, without ORM objects"""
+        table = LicenseKey.__table__
+        return select(table.c.key_hash, *LICENSE_STATE_COLUMNS).where(table.c.key_hash.in_(key_hashes))
+    
+    def _known_device_queries(self, pending):
+        """SELECTs finding which (key_hash, device_id) pairs of a batch already hold a seat"""
+        pairs = list({(key_hash, device_id) for _, key_hash, _, _, device_id in pending if device_id})
+        # Two bound parameters per pair
+        chunk_size = self.BULK_LOOKUP_CHUNK // 2
+        return [
+            select(KeyActivation.key_hash, KeyActivation.device_id).where(
+                tuple_(KeyActivation.key_hash, KeyActivation.device_id).in_(pairs[start:start + chunk_size])
+            )
+            for start in range(0, len(pairs), chunk_size)
+        ]
+    
+    def _resolve_bulk(self, pending, found, known_devices, results, log_entries, client_ip, unfiltered=()):
+        """Answer the entries of a batch that need no seat
+        
+        Entries the looked-up rows reject and devices already holding a
+        seat are answered here. Returns the entries left to take a seat
+        with _claim_seat, in batch order; duplicates inside one batch then
+        take seats one by one, exactly as sequential single requests would.
+        Found keys a lagging key filter missed (``unfiltered``) are added to it.
+        """
+        for _, key_hash, _, _, _ in pending:
+            if key_hash not in found:
+                self.license_cache.put_missing(key_hash)
+            elif key_hash in unfiltered:
+                self.key_filter.add(key_hash, found[key_hash].license_type)
+        
+        claims = []
+        for entry in pending:
+            _, key_hash, license_type, _, device_id = entry
+            license_key = found.get(key_hash)
+            if license_key is not None and license_key.license_type != license_type:
+                license_key = None
+            
+            known_device = (key_hash, device_id) in known_devices
+            rejection = self._check_license_state(license_key, seats=not known_device)
+            if rejection or known_device:
+                self._record_result(entry, rejection, results, log_entries, client_ip)
+            else:
+                claims.append(entry)
+        
+        return claims
+    
+    def _record_result(self, entry, rejection, results, log_entries, client_ip):
+        """Store the result and log row of one batch entry"""
+        index, key_hash, license_type, client_info, _ = entry
+        if rejection:
+            reason, message = rejection
+            log_entries.append(activation_log_row(
+                key_hash, client_ip, client_info, False, reason, license_type
+            ))
+            results[index] = (False, message)
+        else:
+            log_entries.append(activation_log_row(
+                key_hash, client_ip, client_info, True, "Success", license_type
+            ))
+            results[index] = (True, "License validated successfully")
+    
+    def _finish_bulk(self, found, claimed):
+        """Refresh the cache after a batch was committed"""
+        for key_hash, license_key in found.items():
+            if key_hash in claimed:
+                self.license_cache.invalidate(key_hash)
+            else:
+                self.license_cache.put(key_hash, snapshot_license(license_key))
+    
+    def _key_filter_verdict(self, key_hash, license_type):
+        """Consult the unknown-key prefilter
+        
+        True if the filter knows the key, False if the key definitely does
+        not exist, and None if the filter missed while its last catch-up is
+        older than the refresh interval, so the key has to be confirmed with
+        a read (see _confirm_unfiltered).
+        """
+        if self.key_filter.might_contain(key_hash, license_type):
+            return True
+        return False if self.key_filter.is_current() else None
+    
+    def _confirm_unfiltered(self, key_hash, license_type, device_id, state):
+        """Check a key missed by a key filter that is behind against its row, read once
+        
+        A missing row is negative-cached, so repeated requests for it stop at
+        _cached_rejection; a found key is added to the filter. Returns a
+        rejection, or None if the key goes on to take a seat.
+        """
+        if state is not None:
+            self.key_filter.add(key_hash, state.license_type)
+        return self._check_license_state(
+            self._remember_license(key_hash, state, license_type), seats=not device_id
+        )
+    
+    def _cached_rejection(self, key_hash, license_type, device_id=None):
+        """Return (log reason, client message) if the cache alone rejects the key
+        
+        With a device_id, used-up seats are left to the database, which
+        knows whether the device already holds one.
+        """
+        if self.license_cache.is_missing(key_hash):
+            return "Key not found", "Invalid license key"
+        
+        snapshot = self.license_cache.get(key_hash)
+        if snapshot is None:
+            return None
+        if snapshot.license_type != license_type:
+            return "Key not found", "Invalid license key"
+        return self._check_license_state(snapshot, seats=not device_id)
+    
+    def _remember_license(self, key_hash, license_key, license_type):
+        """Cache a looked-up row and return it if it matches license_type"""
+        if license_key is None:
+            self.license_cache.put_missing(key_hash)
+            return None
+        
+        self.license_cache.put(key_hash, snapshot_license(license_key))
+        if license_key.license_type != license_type:
+            return None
+        return license_key
+    
+    def _check_license_state(self, license_key, seats=True):
+        """Return (log reason, client message) if the license cannot be activated
+        
+        Works on LicenseKey rows and on cached LicenseSnapshot tuples alike.
+        seats=False skips the seat check, for devices that already hold one.
+        """
+        if not license_key:
+            return "Key not found", "Invalid license key"
+        
+        if not license_key.is_active:
+            return "Key is inactive", "License key is inactive"
+        
+        if datetime.utcnow() > license_key.expiration_date:
+            return "Key expired", "License key has expired"
+        
+        if seats and license_key.activation_count >= license_key.max_activations:
+            return self._seats_exhausted(license_key.max_activations)
+        
+        return None
+    
+    def _seats_exhausted(self, max_activations):
+        """Rejection for a key whose seats are all taken"""
+        if max_activations <= 1 and not self.config['licensing']['allow_multiple_activations']:
+            return "Key already used", "License key has already been used"
+        return "Max activations reached", "Maximum activations reached"
+    
+    def _activation_update(self, key_hash, license_type, client_info):
+        """UPDATE activating key_hash, returning its new LICENSE_STATE_COLUMNS
+        
+        Every activation rule is part of the WHERE clause, so checking the
+        key and taking a seat is one statement: concurrent requests can
+        never take more than max_activations seats, and no row is locked
+        or loaded beforehand. No row comes back when the key cannot be
+        activated.
+        """
+        now = datetime.utcnow()
+        values = {
+            'activation_count': LicenseKey.activation_count + 1,
+            'is_used': True,
+            'used_date': now
+        }
+        if client_info:
+            values['client_info'] = client_info
+        table = LicenseKey.__table__
+        return update(table).where(
+            table.c.key_hash == key_hash,
+            table.c.license_type == license_type,
+            table.c.is_active.is_(True),
+            table.c.expiration_date >= now,
+            table.c.activation_count < table.c.max_activations
+        ).values(**values).returning(*LICENSE_STATE_COLUMNS)
+    
+    def _license_state_query(self, key_hash):
+        """SELECT of the LICENSE_STATE_COLUMNS of key_hash"""
+        return select(*LICENSE_STATE_COLUMNS).where(LicenseKey.__table__.c.key_hash == key_hash)
+    
+    def _known_device_query(self, key_hash, device_id):
+        """SELECT of the LICENSE_STATE_COLUMNS of key_hash if device_id holds one of its seats"""
+        devices = KeyActivation.__table__
+        return select(*LICENSE_STATE_COLUMNS).join_from(
+            devices, LicenseKey.__table__, LicenseKey.__table__.c.key_hash == devices.c.key_hash
+        ).where(devices.c.key_hash == key_hash, devices.c.device_id == device_id)
+    
+    def _device_release(self, key_hash, device_id):
+        """DELETE of a key_activations row whose seat could not be taken"""
+        devices = KeyActivation.__table__
+        return delete(devices).where(devices.c.key_hash == key_hash, devices.c.device_id == device_id)
+    
+    def _claim_rejection(self, key_hash, license_type, state, seats):
+        """Why a claim failed, from the key's state read after the UPDATE matched no row"""
+        license_key = self._remember_license(key_hash, state, license_type)
+        rejection = self._check_license_state(license_key, seats=seats)
+        if rejection is None and seats:
+            # The key changed between the UPDATE and the SELECT
+            rejection = self._seats_exhausted(license_key.max_activations)
+        return rejection
+    
+    def _device_row(self, key_hash, device_id, client_ip):
+        return {
+            'key_hash': key_hash,
+            'device_id': device_id,
+            'activated_date': datetime.utcnow(),
+            'client_ip': client_ip
+        }
+    
+    def _counter_increments(self, license_keys, total=0, active=0, used=0):
+        """license_counters rows adding the given deltas for every key in license_keys"""
+        buckets = Counter(
+            (license_key.license_type, license_key.expiration_date.date())
+            for license_key in license_keys
+        )
+        return [
+            {
+                'license_type': license_type,
+                'expiration_day': expiration_day,
+                'total_keys': total * count,
+                'active_keys': active * count,
+                'used_keys': used * count
+            }
+            for (license_type, expiration_day), count in buckets.items()
+        ]
+    
+    def _rebuild_license_counters(self, session, only_if_empty=False):
+        """Recompute license_counters with one GROUP BY pass over license_keys
+        
+        With only_if_empty the counters are only filled in when the table is
+        still empty, which happens once for databases created before it
+        existed. Returns whether the counters were rebuilt.
+        """
+        if only_if_empty and (
+            session.query(LicenseCounter.license_type).first() is not None
+            or session.query(LicenseKey.id).first() is None
+        ):
+            return False
+        
+        expiration_day = func.date(LicenseKey.expiration_date, type_=Date)
+        rows = session.query(
+            LicenseKey.license_type,
+            expiration_day,
+            func.count(LicenseKey.id),
+            func.sum(case((LicenseKey.is_active.is_(True), 1), else_=0)),
+            func.sum(case((LicenseKey.is_used.is_(True), 1), else_=0))
+        ).group_by(LicenseKey.license_type, expiration_day).all()
+        
+        session.query(LicenseCounter).delete()
+        session.add_all(
+            LicenseCounter(
+                license_type=license_type,
+                expiration_day=day,
+                total_keys=total_keys,
+                active_keys=active_keys,
+                used_keys=used_keys
+            )
+            for license_type, day, total_keys, active_keys, used_keys in rows
+        )
+        session.commit()
+        return True
+    
+    def _license_stats(self, by_type):
+        """Overall totals plus the per-type breakdown"""
+        stats = {name: sum(counts[name] for counts in by_type.values()) for name in LICENSE_STATS}
+        stats['by_type'] = by_type
+        return stats
+    
+class DatabaseManager(LicenseValidationMixin):
+    # Keys inserted per transaction by add_license_keys_bulk
+    BULK_INSERT_CHUNK = 10000
+    
     def __init__(self, config, security_manager):
         self.config = config
         self.security = security_manager
         
-        if config['database']['type'] == 'sqlite':
-            db_url = f"sqlite:///{config['database']['filename']}"
-        else:
-            raise ValueError("Only SQLite is supported in this implementation")
-            
-        self.engine = create_engine(db_url)
+        # Writes and activations go to the primary; stats and rejections
+        # are read from the replicas when any are configured
+        self.engine = create_database_engine(database_url(config['database']), config['database'])
         self.Session = sessionmaker(bind=self.engine)
+        self.stats_from_counters = config['database'].get('stats_counters', True)
+        self._counter_upsert = insert_or_increment(
+            self.engine, LicenseCounter.__table__,
+            ('license_type', 'expiration_day'), ('total_keys', 'active_keys', 'used_keys')
+        )
+        self._device_insert = insert_ignoring_duplicates(self.engine, KeyActivation.__table__)
         self.create_tables()
+        
+        self.replica_engines = [
+            create_database_engine(url, config['database'])
+            for url in replica_urls(config['database'])
+        ]
+        self.replica_sessions = [sessionmaker(bind=engine) for engine in self.replica_engines]
+        self._next_replica = itertools.cycle(self.replica_sessions)
+        self.confirm_replica_misses = config['database'].get('confirm_replica_misses', True)
+        
+        # Audit rows are written off the hot path by a background writer,
+        # which also keeps the time-bucketed rollups up to date
+        self.activation_rollups = ActivationRollups(
+            self.engine,
+            ActivationRollup,
+            config['logging'].get('activation_rollups')
+        )
+        self.activation_log = ActivationLogWriter(
+            self.Session,
+            ActivationLog,
+            config['logging'].get('activation_log'),
+            rollups=self.activation_rollups
+        )
+        self.activation_log.start()
+        self.api_key_usage = APIKeyUsageTracker(
+            self.engine, self.Session, APIKeyUsage, config['security'].get('api_key_index')
+        )
+        self.api_key_usage.start()
+        self.log_retention = LogRetention(self.Session, ActivationLog, config['logging'].get('retention'))
+        self.backup = DatabaseBackup(database_url(config['database']), config['database'])
+        
+        self.license_cache = LicenseCache(config['database'].get('cache'))
+        self.key_filter = LicenseKeyFilter(config['database'].get('key_filter'))
+        self.revocations = RevocationFeed(
+            LicenseRevocation, config['licensing'].get('revocations'), self.engine.dialect.name
+        )
     
     def create_tables(self):
-        """Create database tables"""
+        """Create database tables, upgrade older ones and fill in the counters"""
         Base.metadata.create_all(self.engine)
+        upgrade_schema(self.engine)
+        
+        session = self.Session()
+        try:
+            self._rebuild_license_counters(session, only_if_empty=True)
+        except Exception as e:
+            session.rollback()
+            logger.error("Error building license counters: %s", e)
+        finally:
+            session.close()
+    
+    def rebuild_license_counters(self):
+        """Recompute license_counters from license_keys"""
+        session = self.Session()
+        try:
+            return self._rebuild_license_counters(session)
+        except Exception as e:
+            session.rollback()
+            logger.error("Error rebuilding license counters: %s", e)
+            return False
+        finally:
+            session.close()
+    
+    def _update_counters(self, session, license_keys, **deltas):
+        """Add deltas to the license_counters rows of license_keys in session's transaction"""
+        rows = self._counter_increments(license_keys, **deltas)
+        if rows:
+            session.execute(self._counter_upsert, rows)
+    
+    def load_key_filter(self):
+        """Load the unknown-key prefilter from disk or build it, then keep it caught up"""
+        self.key_filter.load(self.Session, LicenseKey)
+        self.key_filter.start()
     
     def add_license_key(self, key, license_type, validity_days=None):
         """Add license key to database"""
         if validity_days is None:
-            validity_days = self.config['licensing']['default_validity_days']
+            validity_days = self.security.license_registry.validity_days(license_type)
         
         session = self.Session()
         try:
@@ -70,117 +635,452 @@ class DatabaseManager:
             license_key = LicenseKey(
                 key_hash=key_hash,
                 license_type=license_type,
-                expiration_date=expiration_date
+                expiration_date=expiration_date,
+                max_activations=self.security.license_registry.max_activations(license_type)
             )
             
             session.add(license_key)
+            self._update_counters(session, [license_key], total=1, active=1)
             session.commit()
+            self.license_cache.invalidate(key_hash)
+            self.key_filter.add(key_hash, license_type)
             return True
         except Exception as e:
             session.rollback()
-            print(f"Error adding license key: {e}")
+            logger.error("Error adding license key: %s", e)
             return False
         finally:
             session.close()
     
-    def validate_license(self, key, license_type, client_info=None, client_ip=None):
-        """Validate license"""
-        session = self.Session()
-        try:
-            # Check key format with prefix
-            if not self.security.validate_key_format(key, license_type):
-                log_entry = ActivationLog(
-                    key_hash="",
-                    client_ip=client_ip,
-                    client_info=client_info,
-                    success=False,
-                    reason="Invalid key format or prefix mismatch"
-                )
-                session.add(log_entry)
-                session.commit()
-                return False, "Invalid key format or prefix mismatch"
+    def add_license_keys_bulk(self, keys, license_type, validity_days=None):
+        """Insert many license keys and return the ones that were stored
+        
+        Keys are inserted ``BULK_INSERT_CHUNK`` at a time, one transaction
+        per chunk, with ``INSERT ... ON CONFLICT DO NOTHING RETURNING
+        key_hash``; keys whose hash already exists are skipped rather than
+        failing the chunk, so callers can retry them with fresh keys. Keys
+        that do not match the format of license_type are never stored.
+        """
+        if validity_days is None:
+            validity_days = self.security.license_registry.validity_days(license_type)
+        
+        well_formed = self.security.validate_key_formats(keys, license_type)
+        if not all(well_formed):
+            logger.warning("Skipping %d malformed %s keys", well_formed.count(False), license_type)
+            keys = [key for key, ok in zip(keys, well_formed) if ok]
+        
+        now = datetime.utcnow()
+        expiration_date = now + timedelta(days=validity_days)
+        stored = []
+        
+        for start in range(0, len(keys), self.BULK_INSERT_CHUNK):
+            chunk = keys[start:start + self.BULK_INSERT_CHUNK]
+            key_hashes = self.security.hash_keys(chunk)
+            # Shared column values are bound once for the whole chunk
+            statement = self._insert_ignoring_duplicates(LicenseKey).values(
+                license_type=license_type,
+                created_date=now,
+                expiration_date=expiration_date,
+                max_activations=self.security.license_registry.max_activations(license_type)
+            ).returning(LicenseKey.key_hash)
             
-            key_hash = self.security.hash_key(key)
+            session = self.Session()
+            try:
+                inserted = set(session.connection().execute(
+                    statement,
+                    [{'key_hash': key_hash} for key_hash in key_hashes]
+                ).scalars())
+                if inserted:
+                    session.execute(self._counter_upsert, {
+                        'license_type': license_type,
+                        'expiration_day': expiration_date.date(),
+                        'total_keys': len(inserted),
+                        'active_keys': len(inserted),
+                        'used_keys': 0
+                    })
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.error("Error adding license keys: %s", e)
+                return stored
+            finally:
+                session.close()
             
-            license_key = session.query(LicenseKey).filter_by(
-                key_hash=key_hash,
-                license_type=license_type
-            ).first()
+            self.license_cache.invalidate_many(inserted)
+            self.key_filter.add_many(inserted, license_type)
+            stored.extend(key for key, key_hash in zip(chunk, key_hashes) if key_hash in inserted)
+        
+        return stored
+    
+    def _insert_ignoring_duplicates(self, model):
+        """INSERT statement that skips rows violating a unique constraint"""
+        return insert_ignoring_duplicates(self.engine, model.__table__)
+    
+    def _read_session(self):
+        """Session on the next read replica, or on the primary without replicas"""
+        if not self.replica_sessions:
+            return self.Session()
+        return next(self._next_replica)()
+    
+    def _replica_prefilter(self, session, pending, results, log_entries, client_ip, unfiltered=()):
+        """Answer rejections from a read replica; return the keys left for the primary
+        
+        Keys the replica cannot activate (inactive, used, expired, wrong
+        type) are rejected without touching the primary. Keys the replica
+        does not know are rejected too unless ``confirm_replica_misses`` is
+        set, in which case they are looked up again on the primary in case
+        the replica lags behind. Keys a lagging key filter missed
+        (``unfiltered``) are always confirmed on the primary. Used-up keys sent with a
+        device_id go to the primary, which knows whether that device holds
+        a seat.
+        
+        Replica rows are not put into the license cache: a lagging replica
+        would otherwise have its stale state served from the cache for the
+        full TTL, after the replica itself caught up.
+        """
+        found = {}
+        for chunk in self._bulk_lookup_chunks(pending):
+            for license_key in session.query(LicenseKey).filter(LicenseKey.key_hash.in_(chunk)):
+                found[license_key.key_hash] = license_key
+        
+        remaining = []
+        for entry in pending:
+            index, key_hash, license_type, client_info, device_id = entry
+            license_key = found.get(key_hash)
+            if license_key is None and (self.confirm_replica_misses or key_hash in unfiltered):
+                remaining.append(entry)
+                continue
             
-            log_entry = ActivationLog(
-                key_hash=key_hash,
-                client_ip=client_ip,
-                client_info=client_info,
-                success=False
-            )
+            if license_key is not None and license_key.license_type != license_type:
+                license_key = None
+            rejection = self._check_license_state(license_key, seats=not device_id)
+            if rejection:
+                reason, message = rejection
+                log_entries.append(activation_log_row(
+                    key_hash, client_ip, client_info, False, reason, license_type
+                ))
+                results[index] = (False, message)
+            else:
+                remaining.append(entry)
+        
+        return remaining
+    
+    def _filter_on_replica(self, pending, results, log_entries, client_ip, unfiltered=()):
+        """Run _replica_prefilter, falling back to the primary if the replica fails"""
+        if not self.replica_sessions or not pending:
+            return pending
+        
+        logged = len(log_entries)
+        session = self._read_session()
+        try:
+            return self._replica_prefilter(session, pending, results, log_entries, client_ip, unfiltered)
+        except Exception as e:
+            logger.warning("Read replica lookup failed, using the primary: %s", e)
+            del log_entries[logged:]
+            for index, _, _, _, _ in pending:
+                results[index] = None
+            return pending
+        finally:
+            session.close()
+    
+    def validate_license(self, key, license_type, client_info=None, client_ip=None, device_id=None):
+        """Validate license
+        
+        The key is checked and activated by one conditional UPDATE (see
+        _activation_update). A device_id that already holds a seat of the
+        key is validated again with one indexed read and takes no seat.
+        """
+        log_entries = []
+        key_hash, result, filtered = self._precheck_license(
+            key, license_type, client_info, client_ip, device_id, log_entries
+        )
+        if result:
+            self.activation_log.log_many(log_entries)
+            return result
+        
+        results = [None]
+        unfiltered = () if filtered else (key_hash,)
+        if not self._filter_on_replica([(0, key_hash, license_type, client_info, device_id)],
+                                       results, log_entries, client_ip, unfiltered):
+            self.activation_log.log_many(log_entries)
+            return results[0]
+        
+        session = self.Session()
+        try:
+            if not filtered:
+                # One read before any write, for keys the filter does not know
+                rejection = self._confirm_unfiltered(
+                    key_hash, license_type, device_id,
+                    session.execute(self._license_state_query(key_hash)).first()
+                )
+                if rejection:
+                    reason, message = rejection
+                    self.activation_log.log(key_hash, client_ip, client_info, False, reason, license_type)
+                    return False, message
             
-            if not license_key:
-                log_entry.reason = "Key not found"
-                session.add(log_entry)
-                session.commit()
-                return False, "Invalid license key"
+            known = None
+            if device_id:
+                known = session.execute(self._known_device_query(key_hash, device_id)).first()
+            if known is not None:
+                state = None
+                rejection = self._check_license_state(
+                    self._remember_license(key_hash, known, license_type), seats=False
+                )
+            else:
+                state, rejection = self._claim_seat(
+                    session, key_hash, license_type, client_info, device_id, client_ip
+                )
+            if rejection:
+                reason, message = rejection
+                self.activation_log.log(key_hash, client_ip, client_info, False, reason, license_type)
+                return False, message
             
-            if not license_key.is_active:
-                log_entry.reason = "Key is inactive"
-                session.add(log_entry)
+            if state is not None:
+                # Only the seat and counter changes are committed on the hot path
+                if state.activation_count == 1:
+                    self._update_counters(session, [state], used=1)
                 session.commit()
-                return False, "License key is inactive"
+                self.license_cache.invalidate(key_hash)
             
-            if license_key.is_used and not self.config['licensing']['allow_multiple_activations']:
-                log_entry.reason = "Key already used"
-                session.add(log_entry)
-                session.commit()
-                return False, "License key has already been used"
+            self.activation_log.log(key_hash, client_ip, client_info, True, "Success", license_type)
+            return True, "License validated successfully"
             
-            if datetime.utcnow() > license_key.expiration_date:
-                log_entry.reason = "Key expired"
-                session.add(log_entry)
-                session.commit()
-                return False, "License key has expired"
+        except Exception as e:
+            session.rollback()
+            logger.error("Error validating license: %s", e)
+            return False, "Server error during validation"
+        finally:
+            session.close()
+    
+    def license_expiration(self, key_hash):
+        """expiration_date of key_hash (None if unknown), from the license cache when it has it"""
+        snapshot = self.license_cache.get(key_hash)
+        if snapshot is not None:
+            return snapshot.expiration_date
+        
+        session = self._read_session()
+        try:
+            state = session.execute(self._license_state_query(key_hash)).first()
+        finally:
+            session.close()
+        if state is None:
+            return None
+        if not self.replica_sessions:
+            # Replica rows may lag, so only primary reads are cached
+            self.license_cache.put(key_hash, snapshot_license(state))
+        return state.expiration_date
+    
+    def _claim_seat(self, session, key_hash, license_type, client_info, device_id, client_ip):
+        """Activate key_hash for device_id inside session's transaction
+        
+        Returns ``(state, None)`` with the new state of the key when a seat
+        was taken, ``(None, None)`` when a concurrent request registered
+        the same device first, or ``(None, rejection)``. The key is only
+        read again, to find the rejection reason, when the UPDATE matched
+        no row.
+        """
+        if device_id and not session.execute(
+            self._device_insert, self._device_row(key_hash, device_id, client_ip)
+        ).rowcount:
+            state = session.execute(self._license_state_query(key_hash)).first()
+            return None, self._claim_rejection(key_hash, license_type, state, seats=False)
+        
+        state = session.execute(self._activation_update(key_hash, license_type, client_info)).first()
+        if state is not None:
+            return state, None
+        
+        if device_id:
+            session.execute(self._device_release(key_hash, device_id))
+        state = session.execute(self._license_state_query(key_hash)).first()
+        return None, self._claim_rejection(key_hash, license_type, state, seats=True)
+    
+    def validate_licenses_bulk(self, licenses, client_ip=None):
+        """Validate many licenses in a single transaction
+        
+        ``licenses`` is a list of dicts with ``license_key``, ``license_type``
+        and optional ``client_info`` and ``device_id``. Returns a list of
+        ``(is_valid, message)`` tuples in the same order. Keys are resolved
+        with chunked ``IN (...)`` lookups over ``key_hash``; the keys that
+        can be activated then take their seats with one conditional UPDATE
+        each, committed together. The log rows are handed to the
+        activation log writer.
+        """
+        results, log_entries, pending, unfiltered = self._prepare_bulk(licenses, client_ip)
+        pending = self._filter_on_replica(pending, results, log_entries, client_ip, unfiltered)
+        
+        session = self.Session()
+        try:
+            found = {}
+            for chunk in self._bulk_lookup_chunks(pending):
+                for row in session.execute(self._license_states_query(chunk)):
+                    found[row.key_hash] = row
+            known_devices = set()
+            for statement in self._known_device_queries(pending):
+                known_devices.update(session.execute(statement).tuples())
             
-            if license_key.activation_count >= license_key.max_activations:
-                log_entry.reason = "Max activations reached"
-                session.add(log_entry)
-                session.commit()
-                return False, "Maximum activations reached"
-            
-            # Update usage information
-            license_key.is_used = True
-            license_key.used_date = datetime.utcnow()
-            license_key.activation_count += 1
-            if client_info:
-                license_key.client_info = client_info
-            
-            log_entry.success = True
-            log_entry.reason = "Success"
-            session.add(log_entry)
+            claimed = set()
+            newly_used = []
+            for entry in self._resolve_bulk(pending, found, known_devices, results, log_entries, client_ip,
+                                            unfiltered):
+                _, key_hash, license_type, client_info, device_id = entry
+                state, rejection = self._claim_seat(
+                    session, key_hash, license_type, client_info, device_id, client_ip
+                )
+                claimed.add(key_hash)
+                if state is not None and state.activation_count == 1:
+                    newly_used.append(state)
+                self._record_result(entry, rejection, results, log_entries, client_ip)
+            self._update_counters(session, newly_used, used=1)
             session.commit()
+            self._finish_bulk(found, claimed)
+            self.activation_log.log_many(log_entries)
+            return results
             
-            return True, "License validated successfully"
+        except Exception as e:
+            session.rollback()
+            logger.error("Error validating licenses in bulk: %s", e)
+            return [(False, "Server error during validation")] * len(licenses)
+        finally:
+            session.close()
+    
+    def set_license_active(self, key_hash, is_active):
+        """Activate or deactivate a license key by hash"""
+        session = self.Session()
+        try:
+            license_key = session.query(LicenseKey).filter_by(
+                key_hash=key_hash
+            ).with_for_update().first()
+            if license_key is None:
+                return False
             
+            if bool(license_key.is_active) != bool(is_active):
+                license_key.is_active = is_active
+                self._update_counters(session, [license_key], active=1 if is_active else -1)
+                self.revocations.append(session, key_hash, not is_active)
+            session.commit()
+            return True
         except Exception as e:
             session.rollback()
-            print(f"Error validating license: {e}")
-            return False, "Server error during validation"
+            logger.error("Error updating license key: %s", e)
+            return False
+        finally:
+            session.close()
+            self.license_cache.invalidate(key_hash)
+            self.revocations.invalidate()
+    
+    def revocation_version(self):
+        """Current version of the revocation feed"""
+        return self.revocations.current_version(self._read_session)
+    
+    def get_revocations(self, since, version):
+        """Revocation feed changes after since, up to version (see RevocationFeed.changes)"""
+        session = self._read_session()
+        try:
+            return self.revocations.changes(session, since, version)
         finally:
             session.close()
     
     def get_license_stats(self):
-        """Get license statistics"""
-        session = self.Session()
+        """Get license statistics, overall and per license type
+        
+        Read from license_counters, so the cost does not grow with the
+        number of keys; with ``database.stats_counters`` disabled they are
+        computed in one aggregate pass over license_keys instead.
+        """
+        session = self._read_session()
         try:
-            total_keys = session.query(LicenseKey).count()
-            active_keys = session.query(LicenseKey).filter_by(is_active=True).count()
-            used_keys = session.query(LicenseKey).filter_by(is_used=True).count()
-            expired_keys = session.query(LicenseKey).filter(
-                LicenseKey.expiration_date < datetime.utcnow()
-            ).count()
-            
-            return {
-                'total_keys': total_keys,
-                'active_keys': active_keys,
-                'used_keys': used_keys,
-                'expired_keys': expired_keys
-            }
+            if self.stats_from_counters:
+                by_type = self._stats_from_counters(session)
+            else:
+                by_type = self._stats_from_keys(session)
+            return self._license_stats(by_type)
         finally:
-            session.close()
\ No newline at end of file
+            session.close()
+    
+    def _stats_from_keys(self, session):
+        """Per-type statistics from a single SUM(CASE ...) scan of license_keys"""
+        rows = session.query(
+            LicenseKey.license_type,
+            func.count(LicenseKey.id),
+            func.sum(case((LicenseKey.is_active.is_(True), 1), else_=0)),
+            func.sum(case((LicenseKey.is_used.is_(True), 1), else_=0)),
+            func.sum(case((LicenseKey.expiration_date < datetime.utcnow(), 1), else_=0))
+        ).group_by(LicenseKey.license_type)
+        return {
+            row[0]: dict(zip(LICENSE_STATS, (int(value or 0) for value in row[1:])))
+            for row in rows
+        }
+    
+    def _stats_from_counters(self, session):
+        """Per-type statistics from license_counters
+        
+        Days before today are expired as a whole; keys expiring today are
+        counted with a range scan over the expiration_date index.
+        """
+        now = datetime.utcnow()
+        today = now.date()
+        rows = session.query(
+            LicenseCounter.license_type,
+            func.sum(LicenseCounter.total_keys),
+            func.sum(LicenseCounter.active_keys),
+            func.sum(LicenseCounter.used_keys),
+            func.sum(case((LicenseCounter.expiration_day < today, LicenseCounter.total_keys), else_=0))
+        ).group_by(LicenseCounter.license_type)
+        by_type = {
+            row[0]: dict(zip(LICENSE_STATS, (int(value or 0) for value in row[1:])))
+            for row in rows
+        }
+        
+        expired_today = session.query(LicenseKey.license_type, func.count(LicenseKey.id)).filter(
+            LicenseKey.expiration_date >= datetime.combine(today, time.min),
+            LicenseKey.expiration_date < now
+        ).group_by(LicenseKey.license_type)
+        for license_type, count in expired_today:
+            if license_type in by_type:
+                by_type[license_type]['expired_keys'] += count
+        return by_type
+    
+    def get_activation_summary(self, granularity='hour', since=None, until=None,
+                               group_by=('reason', 'license_type'), filters=None, limit=1000):
+        """Time-bucketed activation counts from the rollup table"""
+        session = self._read_session()
+        try:
+            return self.activation_rollups.summarize(
+                session, granularity, since, until, group_by, filters, limit
+            )
+        finally:
+            session.close()
+    
+    def rebuild_activation_rollups(self, since=None, until=None):
+        """Recompute the activation rollups from activation_logs"""
+        self.activation_log.flush()
+        return self.activation_rollups.rebuild(self.Session, ActivationLog, since, until)
+    
+    def compact_activation_rollups(self):
+        """Drop rollup buckets older than their retention"""
+        return self.activation_rollups.compact(self.Session)
+    
+    def prepare_fork(self):
+        """Flush and stop the background writers so no thread holds a lock across fork()"""
+        self.activation_log.close()
+        self.api_key_usage.close()
+        self.key_filter.stop()
+    
+    def post_fork(self):
+        """Drop connections inherited from the parent and restart the background writers"""
+        self.engine.dispose(close=False)
+        for engine in self.replica_engines:
+            engine.dispose(close=False)
+        self.activation_log.start()
+        self.api_key_usage.start()
+        self.key_filter.start()
+    
+    def close(self):
+        """Flush pending activation logs and usage counters and release database connections"""
+        self.activation_log.close()
+        self.api_key_usage.close()
+        self.key_filter.stop()
+        self.key_filter.save()
+        self.engine.dispose()
+        for engine in self.replica_engines:
+            engine.dispose()
\ No newline at end of file
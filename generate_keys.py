@@ -9,6 +9,7 @@ import base64
 import json
 import os
 from cryptography.fernet import Fernet
+from leases import generate_lease_keypair
 
 def generate_secure_key(length=32):
     """Generate secure key of given length in base64"""
@@ -36,14 +37,65 @@ def generate_config():
                 "debug": False,
                 "ssl_enabled": True,
                 "ssl_cert_path": "cert.pem",
-                "ssl_key_path": "key.pem"
+                "ssl_key_path": "key.pem",
+                "mode": "development",
+                "workers": 4,
+                "threads": 8,
+                "max_requests": 10000,
+                "max_requests_jitter": 1000,
+                "graceful_timeout": 30,
+                "keepalive_timeout": 5,
+                "backlog": 2048
             },
             "database": {
                 "type": "sqlite",
                 "filename": "licenses.db",
+                "url": None,
+                "replicas": [],
+                "confirm_replica_misses": True,
+                "stats_counters": True,
                 "encryption_key": "CHANGE_THIS_TO_RANDOM_32_BYTES_BASE64",
                 "backup_enabled": True,
-                "backup_interval_hours": 24
+                "backup_interval_hours": 24,
+                "backup": {
+                    "dir": "backups",
+                    "generations": 7,
+                    "compress": True,
+                    "pages_per_step": 1024,
+                    "step_sleep_ms": 10,
+                    "max_restarts": 3
+                },
+                "cache": {
+                    "enabled": True,
+                    "max_entries": 10000,
+                    "ttl_seconds": 300,
+                    "negative_max_entries": 10000,
+                    "negative_ttl_seconds": 30
+                },
+                "key_filter": {
+                    "enabled": True,
+                    "path": "licenses.keyfilter",
+                    "false_positive_rate": 0.001,
+                    "expected_keys_per_type": 100000,
+                    "refresh_interval_seconds": 5
+                },
+                "sqlite": {
+                    "enabled": True,
+                    "journal_mode": "WAL",
+                    "synchronous": "NORMAL",
+                    "cache_size": -16384,
+                    "mmap_size": 268435456,
+                    "busy_timeout_ms": 5000,
+                    "temp_store": "MEMORY"
+                },
+                "pool": {
+                    "strategy": "queue",
+                    "size": 8,
+                    "max_overflow": 8,
+                    "timeout_seconds": 30,
+                    "recycle_seconds": -1,
+                    "pre_ping": False
+                }
             },
             "security": {
                 "api_key_required": True,
@@ -54,8 +106,30 @@ def generate_config():
                 "jwt_expiration_hours": 24,
                 "hmac_secret": "CHANGE_THIS_TO_RANDOM_32_BYTES_BASE64",
                 "require_encrypted_communication": True,
+                "min_signature_version": 1,
                 "allowed_ips": [],
-                "blocked_ips": []
+                "blocked_ips": [],
+                "ip_filter": {
+                    "allowed_file": None,
+                    "blocked_file": None,
+                    "reload_interval_seconds": 10
+                },
+                "api_key_index": {
+                    "file": None,
+                    "reload_interval_seconds": 10,
+                    "flush_interval_seconds": 5,
+                    "flush_batch_size": 500
+                },
+                "replay_protection": {
+                    "enabled": True,
+                    "max_skew_seconds": 300,
+                    "backend": "memory",
+                    "bucket_seconds": 10,
+                    "max_entries": 1000000,
+                    "path": None,
+                    "slots": 262144,
+                    "lock_stripes": 256
+                }
             },
             "licensing": {
                 "key_length": 16,
@@ -63,13 +137,51 @@ def generate_config():
                 "auto_generate_keys": True,
                 "keys_per_type": 100,
                 "default_validity_days": 30,
-                "license_types": ["BUSINESS", "PRO", "STUDENT"],
+                "license_types": {
+                    "BUSINESS": {
+                        "prefix": "BUS",
+                        "validity_days": 30,
+                        "max_activations": 1,
+                        "features": ["high_precision", "physics_engine", "math_engine", "statistics_engine", "symbolic_math", "advanced_functions", "export_features", "custom_precision"]
+                    },
+                    "PRO": {
+                        "prefix": "PRO",
+                        "validity_days": 30,
+                        "max_activations": 1,
+                        "features": ["high_precision", "physics_engine", "math_engine", "statistics_engine", "symbolic_math", "advanced_functions", "custom_precision"]
+                    },
+                    "STUDENT": {
+                        "prefix": "STU",
+                        "validity_days": 30,
+                        "max_activations": 1,
+                        "features": ["high_precision", "physics_engine", "math_engine", "statistics_engine", "custom_precision"]
+                    }
+                },
                 "allow_multiple_activations": False,
-                "max_activations_per_key": 1
+                "max_activations_per_key": 1,
+                "max_batch_size": 1000,
+                "leases": {
+                    "enabled": True,
+                    "private_key": None,
+                    "public_key": None,
+                    "ttl_seconds": 604800,
+                    "renew_before_seconds": 86400
+                },
+                "revocations": {
+                    "max_changes": 10000,
+                    "version_cache_seconds": 2,
+                    "gzip_min_bytes": 1024
+                }
             },
             "rate_limiting": {
+                "backend": "shared_memory",
+                "strategy": "sliding-window",
+                "limits": {"ip": None, "api_key": None},
+                "burst": None,
+                "path": None,
+                "slots": 65536,
+                "lock_stripes": 256,
                 "storage_uri": "memory://",
-                "strategy": "fixed-window",
                 "storage_options": {}
             },
             "logging": {
@@ -78,7 +190,32 @@ def generate_config():
                 "max_file_size_mb": 100,
                 "backup_count": 5,
                 "log_requests": True,
-                "log_errors": True
+                "log_errors": True,
+                "activation_log": {
+                    "async_enabled": True,
+                    "queue_size": 10000,
+                    "batch_size": 500,
+                    "flush_interval_ms": 200,
+                    "backpressure": "block",
+                    "failure_sample_rate": 0.1
+                },
+                "activation_rollups": {
+                    "enabled": True,
+                    "by_client_ip": True,
+                    "retention_days": {"minute": 2, "hour": 90, "day": None},
+                    "compact_interval_seconds": 3600,
+                    "rebuild_batch_size": 5000
+                },
+                "retention": {
+                    "enabled": True,
+                    "retention_days": 90,
+                    "archive": True,
+                    "archive_dir": "archive",
+                    "archive_format": "ndjson",
+                    "delete_batch_size": 5000,
+                    "batch_pause_ms": 50,
+                    "interval_hours": 24
+                }
             }
         }
     
@@ -97,6 +234,11 @@ def generate_config():
     config['security']['hmac_secret'] = generate_secure_key(32)
     print(f"  ✓ HMAC secret: {config['security']['hmac_secret'][:20]}...")
     
+    # Ed25519 keypair signing offline leases; clients get the public key
+    leases = config['licensing'].setdefault('leases', {'enabled': True})
+    leases['private_key'], leases['public_key'] = generate_lease_keypair()
+    print(f"  ✓ Lease signing key, public key for clients: {leases['public_key']}")
+    
     # API keys (generate 3 keys)
     config['security']['api_keys'] = [
         generate_api_key(),
@@ -0,0 +1,209 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+from bisect import bisect_right
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPTIONS = {
+    'allowed_file': None,
+    'blocked_file': None,
+    'reload_interval_seconds': 10
+}
+
+_IPV4_MAPPED_PREFIX = 0xFFFF << 32
+
+def parse_address(ip):
+    """Return (family, integer) for an IPv4/IPv6 address string, or None"""
+    try:
+        if ':' not in ip:
+            return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip.split('%', 1)[0]), 'big')
+    except (OSError, TypeError):
+        return None
+    # IPv4-mapped IPv6 (::ffff:a.b.c.d) matches the IPv4 entries
+    if value >> 32 == 0xFFFF:
+        return 4, value - _IPV4_MAPPED_PREFIX
+    return 6, value
+
+class IPRangeSet:
+    """Immutable set of IP addresses and CIDR networks
+    
+    Entries are compiled per address family into sorted, merged
+    ``[start, end]`` integer intervals, so a lookup is one binary search
+    regardless of how many entries were configured.
+    """
+    
+    def __init__(self, entries=()):
+        intervals = {4: [], 6: []}
+        self.invalid = []
+        self.entries = 0
+        for entry in entries:
+            entry = str(entry).strip()
+            if not entry or entry.startswith('#'):
+                continue
+            try:
+                network = ipaddress.ip_network(entry, strict=False)
+            except ValueError:
+                self.invalid.append(entry)
+                continue
+            intervals[network.version].append(
+                (int(network.network_address), int(network.broadcast_address))
+            )
+            self.entries += 1
+        
+        self._starts = {}
+        self._ends = {}
+        for family, ranges in intervals.items():
+            starts, ends = [], []
+            for start, end in sorted(ranges):
+                if ends and start <= ends[-1] + 1:
+                    if end > ends[-1]:
+                        ends[-1] = end
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self._starts[family] = starts
+            self._ends[family] = ends
+    
+    def __len__(self):
+        return self.entries
+    
+    def __bool__(self):
+        # An allowlist made only of unparseable entries still restricts
+        # access, as the exact-string lists did before
+        return bool(self.entries or self.invalid)
+    
+    def contains_parsed(self, parsed):
+        """Membership test for a parse_address() result"""
+        if parsed is None:
+            return False
+        family, value = parsed
+        index = bisect_right(self._starts[family], value) - 1
+        return index >= 0 and value <= self._ends[family][index]
+    
+    def __contains__(self, ip):
+        return self.contains_parsed(parse_address(ip))
+    
+    def intervals(self):
+        """Number of merged intervals per family"""
+        return {f'ipv{family}': len(starts) for family, starts in self._starts.items()}
+
+class IPAccessFilter:
+    """Allow/deny decision for client IPs
+    
+    Combines ``security.allowed_ips`` / ``security.blocked_ips`` from the
+    configuration with optional list files (one address or CIDR per line,
+    ``#`` comments allowed) named in ``security.ip_filter``. The files are
+    re-read when their modification time changes, checked at most every
+    ``reload_interval_seconds`` from the request path, so lists can be
+    updated without a restart. A reload compiles new sets and swaps them
+    in with a single assignment; requests never see a half-built list.
+    """
+    
+    def __init__(self, security_config):
+        options = {**DEFAULT_OPTIONS, **(security_config.get('ip_filter') or {})}
+        self.allowed_ips = security_config.get('allowed_ips') or []
+        self.blocked_ips = security_config.get('blocked_ips') or []
+        self.allowed_file = options['allowed_file']
+        self.blocked_file = options['blocked_file']
+        self.reload_interval = options['reload_interval_seconds']
+        
+        self._lock = threading.Lock()
+        self._mtimes = None
+        self._last_check = 0.0
+        self.reloads = 0
+        self.lookups = 0
+        self.rejected = 0
+        self._lists = (IPRangeSet(), IPRangeSet())
+        self.reload()
+    
+    def _read_file(self, path):
+        if not path:
+            return []
+        try:
+            with open(path, 'r') as f:
+                return f.read().splitlines()
+        except OSError as e:
+            logger.error(f"Error reading IP list {path}: {e}")
+            return []
+    
+    def _file_mtimes(self):
+        mtimes = []
+        for path in (self.allowed_file, self.blocked_file):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns if path else None)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+    
+    def reload(self, allowed_ips=None, blocked_ips=None):
+        """Recompile the lists, optionally replacing the configured entries"""
+        with self._lock:
+            if allowed_ips is not None:
+                self.allowed_ips = allowed_ips
+            if blocked_ips is not None:
+                self.blocked_ips = blocked_ips
+            
+            mtimes = self._file_mtimes()
+            allowed = IPRangeSet(list(self.allowed_ips) + self._read_file(self.allowed_file))
+            blocked = IPRangeSet(list(self.blocked_ips) + self._read_file(self.blocked_file))
+            for name, compiled in (('allowed', allowed), ('blocked', blocked)):
+                if compiled.invalid:
+                    logger.warning(
+                        f"Ignoring {len(compiled.invalid)} invalid {name} IP entries, "
+                        f"e.g. {compiled.invalid[:3]}"
+                    )
+            
+            self._lists = (allowed, blocked)
+            self._mtimes = mtimes
+            self._last_check = time.monotonic()
+            self.reloads += 1
+    
+    def maybe_reload(self):
+        """Reload the list files if they changed; cheap when called often"""
+        if not (self.allowed_file or self.blocked_file):
+            return False
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return False
+        self._last_check = now
+        if self._file_mtimes() == self._mtimes:
+            return False
+        self.reload()
+        logger.info("Reloaded IP allow/deny lists")
+        return True
+    
+    def is_allowed(self, ip):
+        """Return False if ip is outside the allowlist or inside the blocklist"""
+        self.maybe_reload()
+        allowed, blocked = self._lists
+        parsed = parse_address(ip)
+        self.lookups += 1
+        if (allowed and not allowed.contains_parsed(parsed)) or blocked.contains_parsed(parsed):
+            self.rejected += 1
+            return False
+        return True
+    
+    def get_stats(self):
+        """Return list sizes and counters"""
+        allowed, blocked = self._lists
+        return {
+            'allowed_entries': len(allowed),
+            'blocked_entries': len(blocked),
+            'allowed_intervals': allowed.intervals(),
+            'blocked_intervals': blocked.intervals(),
+            'reloads': self.reloads,
+            'lookups': self.lookups,
+            'rejected': self.rejected
+        }
@@ -0,0 +1,415 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+import json
+import logging
+import math
+import os
+import struct
+import threading
+import time
+
+from sqlalchemy import func
+
+logger = logging.getLogger(__name__)
+
+FILE_MAGIC = b'LKF1'
+
+DEFAULT_OPTIONS = {
+    'enabled': True,
+    'path': 'licenses.keyfilter',
+    'false_positive_rate': 0.001,
+    'expected_keys_per_type': 100000,
+    'refresh_interval_seconds': 5
+}
+
+class BloomFilter:
+    """Bloom filter over hex SHA-256 key hashes"""
+    
+    def __init__(self, capacity, false_positive_rate, num_bits=None, num_hashes=None, bits=None, count=0):
+        self.capacity = max(1, capacity)
+        self.false_positive_rate = false_positive_rate
+        
+        if num_bits is None:
+            num_bits = math.ceil(-self.capacity * math.log(false_positive_rate) / (math.log(2) ** 2))
+        if num_hashes is None:
+            num_hashes = max(1, round(num_bits / self.capacity * math.log(2)))
+        
+        self.num_bits = max(8, num_bits)
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.count = count
+    
+    def _positions(self, key_hash):
+        # The key hash is already a uniform SHA-256 digest, so two 64-bit
+        # slices of it drive the usual double-hashing scheme
+        digest = bytes.fromhex(key_hash)
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+    
+    def add(self, key_hash):
+        """Add a key hash; return True if it was not present before"""
+        added = False
+        for position in self._positions(key_hash):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+    
+    def __contains__(self, key_hash):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key_hash))
+    
+    def estimated_false_positive_rate(self):
+        """False-positive rate for the current number of keys"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+    
+    def memory_bytes(self):
+        return len(self.bits)
+
+class LicenseKeyFilter:
+    """Per-license-type Bloom filters that tell known keys from unknown ones
+    
+    The filters are persisted to ``path`` together with the highest
+    ``license_keys.id`` they have seen, so a restart only scans rows added
+    since the last save. Keys inserted by other processes are picked up by
+    an incremental scan every ``refresh_interval_seconds``, run by start()'s
+    background thread (or the caller's own scheduler, see refresh()), never
+    by a lookup. A miss is definite while is_current() holds.
+    
+    Scans run outside ``_lock``, which is only held to apply scanned rows or
+    swap in rebuilt filters, so add() and lookups never wait for a scan.
+    """
+    
+    # Rows below the watermark that are re-scanned on catch-up, to cover
+    # ids whose transactions committed out of order
+    CATCH_UP_OVERLAP = 1000
+    # Scanned rows applied per acquisition of the lock
+    APPLY_BATCH = 10000
+    
+    def __init__(self, options=None):
+        options = {**DEFAULT_OPTIONS, **(options or {})}
+        self.enabled = options['enabled']
+        self.path = options['path']
+        self.false_positive_rate = options['false_positive_rate']
+        self.expected_keys_per_type = options['expected_keys_per_type']
+        self.refresh_interval = options['refresh_interval_seconds']
+        
+        self.filters = {}
+        self.watermark = 0
+        self.loaded = False
+        self._lock = threading.Lock()
+        # One catch-up or rebuild at a time
+        self._scan_lock = threading.Lock()
+        # Keys added while a rebuild scans, applied to the rebuilt filters
+        self._pending_adds = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_refresh = 0.0
+        self._session_factory = None
+        self._model = None
+        self.stats = {
+            'lookups': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'rebuilds': 0
+        }
+    
+    def load(self, session_factory, model):
+        """Load the persisted filters (or build them) and catch up with the table"""
+        if not self.enabled:
+            return
+        
+        self._session_factory = session_factory
+        self._model = model
+        
+        with self._scan_lock:
+            if not self._load_file():
+                self._rebuild()
+            else:
+                self._catch_up()
+            self.loaded = True
+        self.save()
+    
+    def start(self):
+        """Start the background thread that catches up every refresh_interval_seconds"""
+        if not self.loaded or not self.refresh_interval or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='key-filter-refresh', daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing key filter: {e}")
+    
+    def stop(self):
+        """Stop the background thread, waiting for a scan in progress"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def might_contain(self, key_hash, license_type):
+        """Return False only if the key hash was not stored for license_type at the last scan"""
+        if not self.loaded:
+            return True
+        
+        self.stats['lookups'] += 1
+        bloom = self.filters.get(license_type)
+        if bloom is not None and key_hash in bloom:
+            return True
+        self.stats['misses'] += 1
+        return False
+    
+    def is_current(self):
+        """Whether the last catch-up is recent enough to trust a miss
+        
+        Keys this process inserts are added right away; keys inserted by
+        other processes are found by the next catch-up, so a filter that
+        caught up within ``refresh_interval_seconds`` is as fresh as the
+        refresh schedule promises.
+        """
+        return self.loaded and time.monotonic() - self._last_refresh < self.refresh_interval
+    
+    def refresh(self):
+        """Scan rows added by other processes; returns False until the filters are loaded"""
+        if not self.loaded:
+            return False
+        with self._scan_lock:
+            self._catch_up()
+        return True
+    
+    def add(self, key_hash, license_type):
+        """Record a newly inserted key"""
+        if not self.loaded:
+            return
+        with self._lock:
+            self._filter_for(license_type).add(key_hash)
+            if self._pending_adds is not None:
+                self._pending_adds.append((key_hash, license_type))
+    
+    def add_many(self, key_hashes, license_type):
+        """Record many newly inserted keys of one license type"""
+        if not self.loaded:
+            return
+        with self._lock:
+            bloom = self._filter_for(license_type)
+            for key_hash in key_hashes:
+                bloom.add(key_hash)
+            if self._pending_adds is not None:
+                self._pending_adds.extend((key_hash, license_type) for key_hash in key_hashes)
+    
+    def _filter_for(self, license_type, filters=None):
+        filters = self.filters if filters is None else filters
+        bloom = filters.get(license_type)
+        if bloom is None:
+            bloom = BloomFilter(self.expected_keys_per_type, self.false_positive_rate)
+            filters[license_type] = bloom
+        return bloom
+    
+    def _scan(self, min_id):
+        """Yield (id, key_hash, license_type) for rows with id > min_id"""
+        model = self._model
+        session = self._session_factory()
+        try:
+            query = session.query(model.id, model.key_hash, model.license_type).filter(
+                model.id > min_id
+            ).order_by(model.id).yield_per(10000)
+            for row in query:
+                yield row
+        finally:
+            session.close()
+    
+    def _catch_up(self):
+        """Add rows inserted since the watermark; caller holds the scan lock"""
+        rows = []
+        for row in self._scan(max(0, self.watermark - self.CATCH_UP_OVERLAP)):
+            rows.append(row)
+            if len(rows) >= self.APPLY_BATCH:
+                self._apply(rows)
+                rows = []
+        self._apply(rows)
+        self._last_refresh = time.monotonic()
+        self.stats['refreshes'] += 1
+        
+        with self._lock:
+            over_capacity = any(bloom.count > bloom.capacity for bloom in self.filters.values())
+        if over_capacity:
+            self._rebuild()
+    
+    def _apply(self, rows):
+        """Add scanned (id, key_hash, license_type) rows under the lock"""
+        if not rows:
+            return
+        with self._lock:
+            for row_id, key_hash, license_type in rows:
+                self._filter_for(license_type).add(key_hash)
+            self.watermark = max(self.watermark, rows[-1][0])
+    
+    def _rebuild(self):
+        """Rebuild every filter from a full table scan; caller holds the scan lock
+        
+        The new filters are built without the lock and swapped in at the
+        end, together with the keys add() recorded meanwhile.
+        """
+        model = self._model
+        session = self._session_factory()
+        try:
+            counts = dict(
+                session.query(model.license_type, func.count(model.id)).group_by(model.license_type)
+            )
+        finally:
+            session.close()
+        
+        with self._lock:
+            self._pending_adds = []
+        
+        # Size each filter with headroom so it survives growth until the
+        # next rebuild
+        filters = {
+            license_type: BloomFilter(
+                max(self.expected_keys_per_type, count * 2),
+                self.false_positive_rate
+            )
+            for license_type, count in counts.items()
+        }
+        watermark = 0
+        for row_id, key_hash, license_type in self._scan(0):
+            if license_type not in filters:
+                filters[license_type] = BloomFilter(self.expected_keys_per_type, self.false_positive_rate)
+            filters[license_type].add(key_hash)
+            watermark = max(watermark, row_id)
+        
+        with self._lock:
+            for key_hash, license_type in self._pending_adds:
+                self._filter_for(license_type, filters).add(key_hash)
+            self._pending_adds = None
+            self.filters = filters
+            self.watermark = watermark
+        self._last_refresh = time.monotonic()
+        self.stats['rebuilds'] += 1
+    
+    def _load_file(self):
+        """Load filters from disk; return False if missing, stale or corrupt"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        
+        try:
+            with open(self.path, 'rb') as f:
+                if f.read(4) != FILE_MAGIC:
+                    return False
+                (header_length,) = struct.unpack('>I', f.read(4))
+                header = json.loads(f.read(header_length))
+                
+                if header['false_positive_rate'] != self.false_positive_rate:
+                    return False
+                
+                filters = {}
+                for license_type, meta in header['filters'].items():
+                    bits = bytearray(f.read(meta['length']))
+                    if len(bits) != meta['length']:
+                        return False
+                    filters[license_type] = BloomFilter(
+                        meta['capacity'],
+                        self.false_positive_rate,
+                        num_bits=meta['num_bits'],
+                        num_hashes=meta['num_hashes'],
+                        bits=bits,
+                        count=meta['count']
+                    )
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable key filter file {self.path}: {e}")
+            return False
+        
+        # A replaced or recreated database reuses ids, which would hide its
+        # keys below the watermark; only trust the file if the watermark row
+        # is still the one it was saved with
+        if self._key_hash_at(header['watermark']) != header.get('watermark_key_hash'):
+            logger.info(f"Key filter file {self.path} does not match the database, rebuilding")
+            return False
+        
+        self.filters = filters
+        self.watermark = header['watermark']
+        return True
+    
+    def _key_hash_at(self, row_id):
+        if not row_id:
+            return None
+        session = self._session_factory()
+        try:
+            return session.query(self._model.key_hash).filter(self._model.id == row_id).scalar()
+        finally:
+            session.close()
+    
+    def save(self):
+        """Persist the filters atomically"""
+        if not self.loaded or not self.path:
+            return
+        
+        # Copy the bits under the lock; the database read and the file
+        # write happen without it
+        with self._lock:
+            watermark = self.watermark
+            filters = [(license_type, bloom, bloom.count, bytes(bloom.bits)) for license_type, bloom in self.filters.items()]
+        header = {
+            'watermark': watermark,
+            'watermark_key_hash': self._key_hash_at(watermark),
+            'false_positive_rate': self.false_positive_rate,
+            'filters': {
+                license_type: {
+                    'capacity': bloom.capacity,
+                    'num_bits': bloom.num_bits,
+                    'num_hashes': bloom.num_hashes,
+                    'count': count,
+                    'length': len(bits)
+                }
+                for license_type, bloom, count, bits in filters
+            }
+        }
+        header_bytes = json.dumps(header).encode()
+        
+        temp_path = f"{self.path}.tmp.{os.getpid()}"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(FILE_MAGIC)
+                f.write(struct.pack('>I', len(header_bytes)))
+                f.write(header_bytes)
+                for _, _, _, bits in filters:
+                    f.write(bits)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.error(f"Error saving key filter to {self.path}: {e}")
+    
+    def get_stats(self):
+        """Return per-type sizing and memory usage"""
+        return {
+            'enabled': self.enabled,
+            'loaded': self.loaded,
+            'watermark': self.watermark,
+            'memory_bytes': sum(bloom.memory_bytes() for bloom in self.filters.values()),
+            'types': {
+                license_type: {
+                    'keys': bloom.count,
+                    'capacity': bloom.capacity,
+                    'num_bits': bloom.num_bits,
+                    'num_hashes': bloom.num_hashes,
+                    'target_false_positive_rate': bloom.false_positive_rate,
+                    'estimated_false_positive_rate': bloom.estimated_false_positive_rate(),
+                    'memory_bytes': bloom.memory_bytes()
+                }
+                for license_type, bloom in self.filters.items()
+            },
+            **self.stats
+        }
@@ -8,24 +8,30 @@
 from database import DatabaseManager
 from security import SecurityManager
 import json
+import logging
+import time
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 class KeyGenerator:
+    # Rounds of fresh keys generated to replace keys that already existed
+    MAX_DUPLICATE_RETRIES = 5
+    # Keys generated and stored per round trip by iter_generated_keys
+    GENERATION_CHUNK = 10000
+    
     def __init__(self, config, security_manager, db_manager):
         self.config = config
         self.security = security_manager
         self.db = db_manager
-        self.prefixes = {
-            "BUSINESS": "BUS",
-            "PRO": "PRO", 
-            "STUDENT": "STU"
-        }
+        self.license_registry = security_manager.license_registry
+        self.prefixes = self.license_registry.prefixes
     
     def generate_keys_for_all_types(self):
         """Generate keys for all license types"""
         results = {}
         
-        for license_type in self.config['licensing']['license_types']:
+        for license_type in self.license_registry.names:
             results[license_type] = self.generate_keys_for_type(
                 license_type, 
                 self.config['licensing']['keys_per_type']
@@ -35,25 +41,64 @@ class KeyGenerator:
     
     def generate_keys_for_type(self, license_type, count):
         """Generate keys for specific license type"""
-        generated_keys = []
-        success_count = 0
+        summary = {}
+        generated_keys = list(self.iter_generated_keys(license_type, count, summary))
+        return {**summary, 'keys': generated_keys}
+    
+    def iter_generated_keys(self, license_type, count, summary=None):
+        """Generate and store keys, yielding each stored key
         
-        for i in range(count):
-            # Generate key with prefix
-            key = self.generate_prefixed_key(license_type)
-            
-            # Use default_validity_days from configuration
-            validity_days = self.config['licensing']['default_validity_days']
+        Keys are produced ``GENERATION_CHUNK`` at a time, so memory stays
+        flat however large ``count`` is. Keys that collide with existing
+        ones are replaced with fresh keys for up to MAX_DUPLICATE_RETRIES
+        rounds per chunk. When the generator is exhausted, ``summary`` (if
+        given) holds the counts, elapsed time and keys/second.
+        """
+        produced = 0
+        duplicates = 0
+        prefix = self.prefixes.get(license_type, "")
+        main_key_length = self.license_registry.key_length(license_type) - len(prefix)
+        validity_days = self.license_registry.validity_days(license_type)
+        
+        start = time.perf_counter()
+        while produced < count:
+            chunk_target = min(self.GENERATION_CHUNK, count - produced)
+            chunk_stored = 0
+            for _ in range(self.MAX_DUPLICATE_RETRIES + 1):
+                missing = chunk_target - chunk_stored
+                if missing <= 0:
+                    break
+                
+                # dict.fromkeys drops in-batch repeats while keeping order
+                keys = list(dict.fromkeys(
+                    prefix + main_part
+                    for main_part in self.security.generate_secure_keys(missing, main_key_length)
+                ))
+                stored = self.db.add_license_keys_bulk(keys, license_type, validity_days)
+                duplicates += missing - len(stored)
+                chunk_stored += len(stored)
+                yield from stored
             
-            if self.db.add_license_key(key, license_type, validity_days):
-                generated_keys.append(key)
-                success_count += 1
+            produced += chunk_stored
+            if chunk_stored < chunk_target:
+                # Retries exhausted; give up instead of looping forever
+                break
+        elapsed = time.perf_counter() - start
+        
+        keys_per_second = produced / elapsed if elapsed else 0.0
+        logger.info(
+            f"Generated {produced}/{count} {license_type} keys in {elapsed:.2f}s "
+            f"({keys_per_second:,.0f} keys/s, {duplicates} duplicates retried)"
+        )
         
-        return {
-            'success_count': success_count,
-            'total_attempted': count,
-            'keys': generated_keys
-        }
+        if summary is not None:
+            summary.update({
+                'success_count': produced,
+                'total_attempted': count,
+                'duplicates_retried': duplicates,
+                'elapsed_seconds': round(elapsed, 3),
+                'keys_per_second': round(keys_per_second, 1)
+            })
     
     def generate_prefixed_key(self, license_type):
         """Generate key with prefix of appropriate type"""
@@ -61,7 +106,7 @@ class KeyGenerator:
         prefix_length = len(prefix)
         
         # Generate main part of key (total length minus prefix length)
-        main_key_length = self.config['licensing']['key_length'] - prefix_length
+        main_key_length = self.license_registry.key_length(license_type) - prefix_length
         main_part = self.security.generate_secure_key(main_key_length)
         
         # Combine prefix and main part
@@ -0,0 +1,144 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+import base64
+import hashlib
+import json
+import time
+from datetime import timezone
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+
+DEFAULT_OPTIONS = {
+    'enabled': True,
+    # Raw 32-byte Ed25519 private key, base64; generate_keys.py creates it
+    'private_key': None,
+    # Only kept for reference: the key to give to clients
+    'public_key': None,
+    'ttl_seconds': 604800,
+    # Clients renew a lease once it has less than this left
+    'renew_before_seconds': 86400
+}
+
+LEASE_VERSION = 1
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _raw_public_key(public_key):
+    return public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+
+def generate_lease_keypair():
+    """New (private key, public key), both raw Ed25519 keys in base64"""
+    private_key = Ed25519PrivateKey.generate()
+    private_bytes = private_key.private_bytes(
+        serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption()
+    )
+    return (base64.b64encode(private_bytes).decode('ascii'),
+            base64.b64encode(_raw_public_key(private_key.public_key())).decode('ascii'))
+
+def verify_lease(token, public_key, device_id=None, now=None):
+    """Claims of a lease signed for public_key (base64), or None
+    
+    None is returned for a malformed or forged token, an expired lease,
+    or, when device_id is given, a lease bound to another device.
+    """
+    try:
+        payload, signature = token.split('.')
+        Ed25519PublicKey.from_public_bytes(base64.b64decode(public_key)).verify(
+            _b64decode(signature), payload.encode('ascii')
+        )
+        claims = json.loads(_b64decode(payload))
+    except (AttributeError, ValueError, TypeError, InvalidSignature):
+        return None
+    
+    if not isinstance(claims, dict) or claims.get('v') != LEASE_VERSION:
+        return None
+    if claims.get('exp', 0) <= (time.time() if now is None else now):
+        return None
+    if device_id is not None and claims.get('d') != device_id:
+        return None
+    return claims
+
+class LeaseSigner:
+    """Issues signed offline leases for validated licenses
+    
+    A lease is ``<payload>.<signature>``: base64url of compact JSON claims
+    (key hash, license type, device_id, features, issue and expiry time)
+    and of their Ed25519 signature. Clients holding the public key check a
+    lease locally, without a request, and only come back to renew it
+    ``renew_before_seconds`` before it expires. A lease never outlives the
+    license it was issued for.
+    """
+    
+    def __init__(self, licensing_config, license_registry):
+        options = {**DEFAULT_OPTIONS, **(licensing_config.get('leases') or {})}
+        self.license_registry = license_registry
+        self.ttl = options['ttl_seconds']
+        self.renew_before = options['renew_before_seconds']
+        self.enabled = bool(options['enabled'] and options['private_key'])
+        self.public_key = None
+        self.key_id = None
+        self._private_key = None
+        if self.enabled:
+            self._private_key = Ed25519PrivateKey.from_private_bytes(base64.b64decode(options['private_key']))
+            public_bytes = _raw_public_key(self._private_key.public_key())
+            self.public_key = base64.b64encode(public_bytes).decode('ascii')
+            self.key_id = hashlib.sha256(public_bytes).hexdigest()[:16]
+        self.issued = 0
+    
+    def issue(self, key_hash, license_type, device_id, expiration_date=None, now=None):
+        """Signed lease and its expiry (seconds since the epoch), or None when disabled
+        
+        expiration_date is the license's naive UTC expiration_date, which
+        caps the lease.
+        """
+        if not self.enabled:
+            return None
+        
+        now = int(time.time() if now is None else now)
+        expires = now + self.ttl
+        if expiration_date is not None:
+            expires = min(expires, int(expiration_date.replace(tzinfo=timezone.utc).timestamp()))
+        definition = self.license_registry.get(license_type)
+        claims = {
+            'v': LEASE_VERSION,
+            'kid': self.key_id,
+            'kh': key_hash,
+            't': license_type,
+            'd': device_id,
+            'f': list(definition.features) if definition else [],
+            'iat': now,
+            'exp': expires
+        }
+        payload = _b64encode(json.dumps(claims, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+        self.issued += 1
+        return payload + '.' + _b64encode(self._private_key.sign(payload.encode('ascii'))), expires
+    
+    def response_fields(self, key_hash, license_type, device_id, expiration_date=None):
+        """Fields added to a successful validation response (none without a lease)"""
+        lease = self.issue(key_hash, license_type, device_id, expiration_date) if device_id else None
+        if lease is None:
+            return {}
+        token, expires = lease
+        return {
+            'lease': token,
+            'lease_expires_at': expires,
+            'lease_renew_before': self.renew_before
+        }
+    
+    def get_stats(self):
+        return {
+            'enabled': self.enabled,
+            'key_id': self.key_id,
+            'ttl_seconds': self.ttl,
+            'issued': self.issued
+        }
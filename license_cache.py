@@ -0,0 +1,170 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+from collections import OrderedDict, namedtuple
+import threading
+import time
+
+# Immutable copy of the LicenseKey columns the validation rules look at
+LicenseSnapshot = namedtuple('LicenseSnapshot', [
+    'license_type',
+    'expiration_date',
+    'is_active',
+    'is_used',
+    'activation_count',
+    'max_activations'
+])
+
+DEFAULT_OPTIONS = {
+    'enabled': True,
+    'max_entries': 10000,
+    'ttl_seconds': 300,
+    'negative_max_entries': 10000,
+    'negative_ttl_seconds': 30
+}
+
+def snapshot_license(license_key):
+    """Build a LicenseSnapshot from a LicenseKey row"""
+    return LicenseSnapshot(
+        license_key.license_type,
+        license_key.expiration_date,
+        license_key.is_active,
+        license_key.is_used,
+        license_key.activation_count,
+        license_key.max_activations
+    )
+
+class _LRUTTL:
+    """Size-capped LRU map whose entries also expire after a TTL"""
+    
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl_seconds
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def put(self, key, value):
+        if not self.max_entries:
+            return
+        self.entries[key] = (value, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    
+    def pop(self, key):
+        return self.entries.pop(key, None) is not None
+    
+    def stats(self):
+        return {
+            'size': len(self.entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+class LicenseCache:
+    """In-process cache of LicenseKey snapshots keyed by key_hash
+    
+    Keys that are known to exist are held as LicenseSnapshot tuples; key
+    hashes that are not in the database are held in a separate, smaller
+    negative cache. Entries written by this process are invalidated on
+    change, entries changed by other processes age out after their TTL.
+    """
+    
+    def __init__(self, options=None):
+        options = {**DEFAULT_OPTIONS, **(options or {})}
+        self.enabled = options['enabled']
+        self._positive = _LRUTTL(options['max_entries'], options['ttl_seconds'])
+        self._negative = _LRUTTL(options['negative_max_entries'], options['negative_ttl_seconds'])
+        self._lock = threading.Lock()
+        self.invalidations = 0
+    
+    def get(self, key_hash):
+        """Return the cached snapshot for key_hash or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            return self._positive.get(key_hash)
+    
+    def is_missing(self, key_hash):
+        """Return True if key_hash is cached as not present in the database"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            return self._negative.get(key_hash) is not None
+    
+    def put(self, key_hash, snapshot):
+        """Cache a snapshot of an existing key"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._negative.pop(key_hash)
+            self._positive.put(key_hash, snapshot)
+    
+    def put_missing(self, key_hash):
+        """Cache that key_hash does not exist"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._positive.pop(key_hash)
+            self._negative.put(key_hash, True)
+    
+    def invalidate(self, key_hash):
+        """Drop every cached entry for key_hash"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._positive.pop(key_hash) | self._negative.pop(key_hash):
+                self.invalidations += 1
+    
+    def invalidate_many(self, key_hashes):
+        """Drop cached entries for every hash in key_hashes"""
+        if not self.enabled:
+            return
+        with self._lock:
+            for key_hash in key_hashes:
+                if self._positive.pop(key_hash) | self._negative.pop(key_hash):
+                    self.invalidations += 1
+    
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._positive.entries.clear()
+            self._negative.entries.clear()
+    
+    def get_stats(self):
+        """Return hit/miss/eviction counters"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'positive': self._positive.stats(),
+                'negative': self._negative.stats(),
+                'invalidations': self.invalidations
+            }
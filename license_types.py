@@ -0,0 +1,144 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+import hashlib
+import json
+from collections import namedtuple
+
+LicenseType = namedtuple('LicenseType', [
+    'name', 'prefix', 'key_length', 'validity_days', 'max_activations', 'features'
+])
+
+# Used for the names of the plain list form of licensing.license_types
+DEFAULT_LICENSE_TYPES = {
+    'BUSINESS': {
+        'prefix': 'BUS',
+        'features': [
+            'high_precision', 'physics_engine', 'math_engine', 'statistics_engine',
+            'symbolic_math', 'advanced_functions', 'export_features', 'custom_precision'
+        ]
+    },
+    'PRO': {
+        'prefix': 'PRO',
+        'features': [
+            'high_precision', 'physics_engine', 'math_engine', 'statistics_engine',
+            'symbolic_math', 'advanced_functions', 'custom_precision'
+        ]
+    },
+    'STUDENT': {
+        'prefix': 'STU',
+        'features': [
+            'high_precision', 'physics_engine', 'math_engine', 'statistics_engine',
+            'custom_precision'
+        ]
+    }
+}
+
+class LicenseTypeRegistry:
+    """License types defined by ``licensing.license_types``
+    
+    license_types is either the original list of names, whose prefixes and
+    features come from DEFAULT_LICENSE_TYPES (other names get no prefix),
+    or a mapping of name to ``prefix``, ``key_length``, ``validity_days``,
+    ``max_activations`` and ``features``. Missing key_length, validity_days
+    and max_activations fall back to licensing.key_length,
+    default_validity_days and max_activations_per_key.
+    
+    Keys are matched to a type by prefix through a dict per prefix length,
+    longest prefix first, so lookups cost a few slices and dict probes
+    however many types are configured.
+    """
+    
+    def __init__(self, licensing_config):
+        definitions = licensing_config['license_types']
+        if not isinstance(definitions, dict):
+            definitions = {name: DEFAULT_LICENSE_TYPES.get(name, {}) for name in definitions}
+        
+        self.default_key_length = licensing_config['key_length']
+        self.default_validity_days = licensing_config['default_validity_days']
+        self.default_max_activations = licensing_config.get('max_activations_per_key', 1)
+        self.types = {}
+        for name, definition in definitions.items():
+            definition = definition or {}
+            license_type = LicenseType(
+                name=name,
+                prefix=definition.get('prefix', ''),
+                key_length=definition.get('key_length', self.default_key_length),
+                validity_days=definition.get('validity_days', self.default_validity_days),
+                max_activations=definition.get('max_activations', self.default_max_activations),
+                features=tuple(definition.get('features', ()))
+            )
+            if len(license_type.prefix) >= license_type.key_length:
+                raise ValueError(f"License type {name}: prefix must be shorter than key_length")
+            self.types[name] = license_type
+        
+        self.names = tuple(self.types)
+        self.prefixes = {name: license_type.prefix for name, license_type in self.types.items()}
+        
+        self._by_prefix = {}
+        for license_type in self.types.values():
+            if not license_type.prefix:
+                continue
+            by_length = self._by_prefix.setdefault(len(license_type.prefix), {})
+            if license_type.prefix in by_length:
+                raise ValueError(f"License types {by_length[license_type.prefix].name} and "
+                                 f"{license_type.name} share the prefix {license_type.prefix}")
+            by_length[license_type.prefix] = license_type
+        self._prefix_lengths = sorted(self._by_prefix, reverse=True)
+        
+        self.document = {
+            name: {
+                'prefix': license_type.prefix,
+                'key_length': license_type.key_length,
+                'validity_days': license_type.validity_days,
+                'max_activations': license_type.max_activations,
+                'features': list(license_type.features)
+            }
+            for name, license_type in self.types.items()
+        }
+        canonical = json.dumps(self.document, sort_keys=True, separators=(',', ':'))
+        self.etag = '"' + hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32] + '"'
+    
+    def __contains__(self, name):
+        return name in self.types
+    
+    def __iter__(self):
+        return iter(self.types.values())
+    
+    def get(self, name):
+        """LicenseType called name, or None"""
+        return self.types.get(name)
+    
+    def detect(self, key):
+        """LicenseType whose prefix starts key (longest prefix wins), or None"""
+        for length in self._prefix_lengths:
+            license_type = self._by_prefix[length].get(key[:length])
+            if license_type is not None:
+                return license_type
+        return None
+    
+    def key_length(self, name):
+        """Key length of name; licensing.key_length for unknown names"""
+        license_type = self.types.get(name)
+        return license_type.key_length if license_type else self.default_key_length
+    
+    def validity_days(self, name):
+        """Validity of new keys of name; licensing.default_validity_days for unknown names"""
+        license_type = self.types.get(name)
+        return license_type.validity_days if license_type else self.default_validity_days
+    
+    def max_activations(self, name):
+        """Seats of new keys of name; licensing.max_activations_per_key for unknown names"""
+        license_type = self.types.get(name)
+        return license_type.max_activations if license_type else self.default_max_activations
+    
+    def etag_matches(self, if_none_match):
+        """Whether an If-None-Match header value names the current registry"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or self.etag in tags or 'W/' + self.etag in tags
@@ -5,13 +5,92 @@
 # Copyright (c) 2025 developercreation
 
 
+import argparse
+import csv
 import json
+import os
 from database import DatabaseManager
 from security import SecurityManager
 from key_generator import KeyGenerator
 
-def generate_keys_locally():
-    """Local key generation without HTTP requests"""
+class KeyFileWriter:
+    """Writes generated keys to a file as they arrive"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', newline='')
+    
+    def write(self, license_type, key):
+        raise NotImplementedError
+    
+    def close(self):
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class JSONKeyWriter(KeyFileWriter):
+    """``{"TYPE": ["KEY", ...], ...}``, written incrementally"""
+    
+    def __init__(self, path):
+        super().__init__(path)
+        self.current_type = None
+        self.first_key = True
+        self.file.write('{')
+    
+    def write(self, license_type, key):
+        if license_type != self.current_type:
+            if self.current_type is not None:
+                self.file.write('\n  ],')
+            self.file.write(f'\n  {json.dumps(license_type)}: [')
+            self.current_type = license_type
+            self.first_key = True
+        self.file.write(f'\n    {json.dumps(key)}' if self.first_key else f',\n    {json.dumps(key)}')
+        self.first_key = False
+    
+    def close(self):
+        self.file.write('\n  ]\n}\n' if self.current_type is not None else '}\n')
+        super().close()
+
+class NDJSONKeyWriter(KeyFileWriter):
+    """One ``{"license_type": ..., "key": ...}`` object per line"""
+    
+    def write(self, license_type, key):
+        self.file.write(json.dumps({'license_type': license_type, 'key': key}) + '\n')
+
+class CSVKeyWriter(KeyFileWriter):
+    """``license_type,key`` rows with a header line"""
+    
+    def __init__(self, path):
+        super().__init__(path)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['license_type', 'key'])
+    
+    def write(self, license_type, key):
+        self.writer.writerow((license_type, key))
+
+KEY_WRITERS = {
+    'json': JSONKeyWriter,
+    'ndjson': NDJSONKeyWriter,
+    'csv': CSVKeyWriter
+}
+
+def open_key_writer(path, output_format=None):
+    """Open a writer for path; the format defaults to the file extension"""
+    if output_format is None:
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        output_format = extension if extension in KEY_WRITERS else 'json'
+    return KEY_WRITERS[output_format](path)
+
+def generate_keys_locally(license_type=None, count=None, output_file='generated_keys.json', output_format=None):
+    """Local key generation without HTTP requests
+    
+    Keys are written to output_file as they are generated, so memory use
+    does not grow with the number of keys.
+    """
     print("=== Local Key Generator ===\n")
     
     try:
@@ -24,46 +103,60 @@ def generate_keys_locally():
         db = DatabaseManager(config, security)
         generator = KeyGenerator(config, security, db)
         
+        if count is None:
+            count = config['licensing']['keys_per_type']
+        license_types = [license_type] if license_type else security.license_registry.names
+        
         # Generate keys
         print("Generating license keys locally...")
-        results = generator.generate_keys_for_all_types()
-        
-        # Output results
-        print("\n✅ Keys generated successfully!")
         print("\n📊 Generation Results:")
         
         total_generated = 0
-        all_keys = {}
+        example_keys = {}
         
-        for license_type, result in results.items():
-            print(f"\n{license_type}:")
-            print(f"  Success: {result['success_count']}/{result['total_attempted']}")
-            print(f"  Keys: {', '.join(result['keys'][:5])}")  # Show first 5 keys
-            if len(result['keys']) > 5:
-                print(f"  ... and {len(result['keys']) - 5} more")
-            
-            total_generated += result['success_count']
-            all_keys[license_type] = result['keys']
+        with open_key_writer(output_file, output_format) as writer:
+            for license_type in license_types:
+                summary = {}
+                first_keys = []
+                for key in generator.iter_generated_keys(license_type, count, summary):
+                    writer.write(license_type, key)
+                    if len(first_keys) < 5:
+                        first_keys.append(key)
+                
+                print(f"\n{license_type}:")
+                print(f"  Success: {summary['success_count']}/{summary['total_attempted']}")
+                print(f"  Throughput: {summary['keys_per_second']:,.0f} keys/s "
+                      f"({summary['elapsed_seconds']}s, {summary['duplicates_retried']} duplicates retried)")
+                print(f"  Keys: {', '.join(first_keys)}")  # Show first 5 keys
+                if summary['success_count'] > 5:
+                    print(f"  ... and {summary['success_count'] - 5} more")
+                
+                total_generated += summary['success_count']
+                if first_keys:
+                    example_keys[license_type] = first_keys[0]
         
+        print("\n✅ Keys generated successfully!")
         print(f"\n🎉 Total keys generated: {total_generated}")
-        
-        # Save keys to file
-        output_file = 'generated_keys.json'
-        with open(output_file, 'w') as f:
-            json.dump(all_keys, f, indent=2)
         print(f"\n💾 All keys saved to: {output_file}")
         
-
         print(f"\n🔑 Example keys with prefixes:")
-        for license_type in all_keys.keys():
-            if all_keys[license_type]:
-                prefix = generator.prefixes.get(license_type, "")
-                print(f"  {license_type}: {all_keys[license_type][0]} (starts with '{prefix}')")
+        for license_type, key in example_keys.items():
+            prefix = generator.prefixes.get(license_type, "")
+            print(f"  {license_type}: {key} (starts with '{prefix}')")
         
+        db.close()
+    
     except Exception as e:
         print(f"❌ Error: {e}")
         import traceback
         traceback.print_exc()
 
 if __name__ == '__main__':
-    generate_keys_locally()
+    parser = argparse.ArgumentParser(description="Generate license keys directly into the database")
+    parser.add_argument('--type', dest='license_type', help='only generate keys of this license type')
+    parser.add_argument('--count', type=int, help='number of keys per type (default: licensing.keys_per_type)')
+    parser.add_argument('--output', default='generated_keys.json', help='output file (default: generated_keys.json)')
+    parser.add_argument('--format', dest='output_format', choices=sorted(KEY_WRITERS),
+                        help='output format (default: from the --output extension, else json)')
+    args = parser.parse_args()
+    generate_keys_locally(args.license_type, args.count, args.output, args.output_format)
@@ -0,0 +1,227 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+from datetime import date, datetime, timedelta
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import func, select
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMATS = {
+    'ndjson': '.ndjson.gz',
+    'columnar': '.columns.json.gz'
+}
+
+DEFAULT_OPTIONS = {
+    'enabled': False,
+    'retention_days': 90,
+    'archive': True,
+    'archive_dir': 'archive',
+    'archive_format': 'ndjson',
+    'delete_batch_size': 5000,
+    'batch_pause_ms': 50,
+    'interval_hours': 24
+}
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+class LogRetention:
+    """Archives and deletes activation log rows older than ``retention_days``
+    
+    The log is handled in daily partitions (``activation_date`` ranges
+    served by its index). Each partition past the cutoff is first written to
+    ``archive_dir`` as gzip-compressed NDJSON, or as one gzip JSON document
+    of column arrays with ``archive_format: columnar``, and then deleted
+    ``delete_batch_size`` rows per transaction with ``batch_pause_ms``
+    between batches, so the activation log writer never waits long for the
+    database. Rows are deleted only once their archive file is complete.
+    """
+    
+    def __init__(self, session_factory, model, options=None):
+        self.Session = session_factory
+        self.model = model
+        self.table = model.__table__
+        
+        options = {**DEFAULT_OPTIONS, **(options or {})}
+        if options['archive_format'] not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown activation log archive format: {options['archive_format']}")
+        
+        self.enabled = options['enabled']
+        self.retention_days = options['retention_days']
+        self.archive = options['archive']
+        self.archive_dir = options['archive_dir']
+        self.archive_format = options['archive_format']
+        self.delete_batch_size = max(1, options['delete_batch_size'])
+        self.batch_pause = options['batch_pause_ms'] / 1000.0
+        self.interval_seconds = options['interval_hours'] * 3600
+        
+        self._lock = threading.Lock()
+        self.stats = {
+            'runs': 0,
+            'partitions': 0,
+            'archived_rows': 0,
+            'deleted_rows': 0,
+            'last_run': None,
+            'last_cutoff': None
+        }
+    
+    def cutoff(self, now=None):
+        """Start of the oldest day that is kept"""
+        now = now or datetime.utcnow()
+        day = now - timedelta(days=self.retention_days)
+        return day.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    def partitions(self, cutoff):
+        """Days before cutoff that still have rows"""
+        session = self.Session()
+        try:
+            oldest = session.query(func.min(self.model.activation_date)).filter(
+                self.model.activation_date < cutoff
+            ).scalar()
+        finally:
+            session.close()
+        
+        days = []
+        day = oldest.replace(hour=0, minute=0, second=0, microsecond=0) if oldest else cutoff
+        while day < cutoff:
+            days.append(day)
+            day += timedelta(days=1)
+        return days
+    
+    def run(self, now=None, dry_run=False):
+        """Archive and delete every partition before the cutoff
+        
+        Returns a summary with the partitions handled, the archive files
+        written and the rows deleted. dry_run only counts the rows.
+        """
+        cutoff = self.cutoff(now)
+        summary = {'cutoff': cutoff.isoformat(), 'partitions': [], 'archived_rows': 0, 'deleted_rows': 0}
+        
+        for day in self.partitions(cutoff):
+            rows = self._count(day)
+            if not rows:
+                continue
+            partition = {'day': day.date().isoformat(), 'rows': rows}
+            summary['partitions'].append(partition)
+            if dry_run:
+                continue
+            
+            if self.archive:
+                partition['archive'], archived = self.archive_partition(day)
+                summary['archived_rows'] += archived
+            partition['deleted'] = self.delete_partition(day)
+            summary['deleted_rows'] += partition['deleted']
+        
+        if not dry_run:
+            with self._lock:
+                self.stats['runs'] += 1
+                self.stats['partitions'] += len(summary['partitions'])
+                self.stats['archived_rows'] += summary['archived_rows']
+                self.stats['deleted_rows'] += summary['deleted_rows']
+                self.stats['last_run'] = datetime.utcnow().isoformat()
+                self.stats['last_cutoff'] = summary['cutoff']
+            if summary['partitions']:
+                logger.info(
+                    f"Activation log retention: {summary['deleted_rows']} rows in "
+                    f"{len(summary['partitions'])} partitions before {summary['cutoff']} removed"
+                )
+        return summary
+    
+    def _range(self, day):
+        return (self.model.activation_date >= day,
+                self.model.activation_date < day + timedelta(days=1))
+    
+    def _count(self, day):
+        session = self.Session()
+        try:
+            return session.query(func.count(self.model.id)).filter(*self._range(day)).scalar()
+        finally:
+            session.close()
+    
+    def archive_path(self, day):
+        """Archive file for day; a new part number if the day was archived before"""
+        name = f"{self.table.name}-{day.date().isoformat()}"
+        extension = ARCHIVE_FORMATS[self.archive_format]
+        path = os.path.join(self.archive_dir, name + extension)
+        part = 1
+        while os.path.exists(path):
+            path = os.path.join(self.archive_dir, f"{name}.{part}{extension}")
+            part += 1
+        return path
+    
+    def archive_partition(self, day):
+        """Write the rows of day to a compressed archive file; return (path, rows)"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = self.archive_path(day)
+        columns = [column.name for column in self.table.columns]
+        statement = select(self.table).where(*self._range(day)).order_by(self.model.id)
+        
+        session = self.Session()
+        try:
+            rows = session.execute(statement).yield_per(self.delete_batch_size)
+            with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+                if self.archive_format == 'ndjson':
+                    count = 0
+                    for row in rows:
+                        f.write(json.dumps({name: _json_value(value) for name, value in zip(columns, row)}))
+                        f.write('\n')
+                        count += 1
+                else:
+                    data = {name: [] for name in columns}
+                    for row in rows:
+                        for name, value in zip(columns, row):
+                            data[name].append(_json_value(value))
+                    count = len(data[columns[0]])
+                    json.dump({'table': self.table.name, 'day': day.date().isoformat(),
+                               'rows': count, 'columns': data}, f)
+        except Exception:
+            if os.path.exists(path + '.tmp'):
+                os.remove(path + '.tmp')
+            raise
+        finally:
+            session.close()
+        
+        os.replace(path + '.tmp', path)
+        return path, count
+    
+    def delete_partition(self, day):
+        """Delete the rows of day in bounded batches; return the number deleted"""
+        deleted = 0
+        while True:
+            session = self.Session()
+            try:
+                ids = [row_id for (row_id,) in session.query(self.model.id).filter(
+                    *self._range(day)
+                ).order_by(self.model.id).limit(self.delete_batch_size)]
+                if not ids:
+                    return deleted
+                deleted += session.query(self.model).filter(
+                    self.model.id >= ids[0],
+                    self.model.id <= ids[-1],
+                    *self._range(day)
+                ).delete(synchronize_session=False)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+            time.sleep(self.batch_pause)
+    
+    def get_stats(self):
+        """Return retention counters"""
+        with self._lock:
+            return {**self.stats, 'enabled': self.enabled, 'retention_days': self.retention_days}
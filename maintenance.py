@@ -0,0 +1,235 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+import argparse
+import os
+from datetime import datetime
+import json
+import logging
+import threading
+import time
+
+from backup import CHECK_INTERVAL_SECONDS
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fork(), so there is no second worker 0 to exclude
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Delay before the first run of every job after the scheduler starts
+STARTUP_DELAY_SECONDS = 60
+# Delay before retrying a job skipped because another process held the lock
+LOCKED_RETRY_SECONDS = 60
+
+class MaintenanceScheduler:
+    """Runs periodic maintenance jobs on one background thread
+    
+    Jobs run one at a time, first ``STARTUP_DELAY_SECONDS`` after start()
+    and then every ``interval_seconds``; a failing job is logged and
+    retried at its next interval. With ``lock_path`` set, each run holds
+    an flock on that file, so schedulers in different processes (the old
+    and the new worker 0 while a pre-fork worker is recycled) never run
+    jobs at the same time; a job that finds the lock taken is skipped and
+    retried ``LOCKED_RETRY_SECONDS`` later.
+    """
+    
+    def __init__(self, startup_delay=STARTUP_DELAY_SECONDS, lock_path=None):
+        self.startup_delay = startup_delay
+        self.lock_path = lock_path
+        self.jobs = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def add_job(self, name, interval_seconds, function):
+        """Register function to run every interval_seconds"""
+        self.jobs[name] = {
+            'function': function,
+            'interval': interval_seconds,
+            'next_run': None,
+            'runs': 0,
+            'errors': 0,
+            'skipped': 0,
+            'last_run': None,
+            'last_duration_seconds': None,
+            'last_error': None
+        }
+    
+    def start(self):
+        """Start the scheduler thread if any job is registered"""
+        if not self.jobs or (self._thread is not None and self._thread.is_alive()):
+            return
+        
+        first_run = time.monotonic() + self.startup_delay
+        for job in self.jobs.values():
+            job['next_run'] = first_run
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='maintenance-scheduler', daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=30):
+        """Stop the scheduler thread, waiting for a running job to finish"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def run_job(self, name):
+        """Run one job now and record the outcome"""
+        job = self.jobs[name]
+        locking = bool(self.lock_path) and fcntl is not None
+        lock_fd = self._lock_processes() if locking else None
+        if locking and lock_fd is None:
+            logger.info(f"Maintenance job {name} skipped: another process is running maintenance")
+            with self._lock:
+                job['skipped'] += 1
+                job['next_run'] = time.monotonic() + min(job['interval'], LOCKED_RETRY_SECONDS)
+            return
+        
+        start = time.monotonic()
+        try:
+            job['function']()
+            error = None
+        except Exception as e:
+            logger.error(f"Maintenance job {name} failed: {e}")
+            error = str(e)
+        finally:
+            if lock_fd is not None:
+                os.close(lock_fd)
+        
+        with self._lock:
+            job['runs'] += 1
+            job['errors'] += error is not None
+            job['last_error'] = error
+            job['last_run'] = datetime.utcnow().isoformat()
+            job['last_duration_seconds'] = round(time.monotonic() - start, 3)
+            job['next_run'] = time.monotonic() + job['interval']
+    
+    def _lock_processes(self):
+        """Take the flock on lock_path without waiting; return its fd, or None if another process holds it
+        
+        The file is opened per run: a descriptor inherited across fork()
+        would share its flock with the parent.
+        """
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+    
+    def _run(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for name, job in self.jobs.items():
+                if job['next_run'] <= now and not self._stop.is_set():
+                    self.run_job(name)
+            next_run = min(job['next_run'] for job in self.jobs.values())
+            self._stop.wait(max(0.0, next_run - time.monotonic()))
+    
+    def get_stats(self):
+        """Return per-job counters"""
+        with self._lock:
+            return {
+                name: {key: value for key, value in job.items() if key not in ('function', 'next_run')}
+                for name, job in self.jobs.items()
+            }
+
+def schedule_database_jobs(scheduler, db):
+    """Register the enabled maintenance jobs of a DatabaseManager/AsyncDatabaseManager"""
+    if scheduler.lock_path is None:
+        scheduler.lock_path = f"{db.backup.database_path or 'license_server'}.maintenance.lock"
+    if db.log_retention.enabled:
+        scheduler.add_job('log_retention', db.log_retention.interval_seconds, db.log_retention.run)
+    if db.backup.enabled:
+        # Checked hourly so restarts do not push the next backup back
+        scheduler.add_job('backup', min(db.backup.interval_seconds, CHECK_INTERVAL_SECONDS),
+                          db.backup.run_if_due)
+
+def _load_config(config_path):
+    with open(config_path, 'r') as f:
+        return json.load(f)
+
+def _open_database(config):
+    from database import DatabaseManager
+    from security import SecurityManager
+    
+    return DatabaseManager(config, SecurityManager(config))
+
+def _restore(config, args):
+    """Restore without opening the database, which must not be in use"""
+    from backup import DatabaseBackup
+    from storage_profile import database_url
+    
+    backup = DatabaseBackup(database_url(config['database']), config['database'])
+    if not backup.is_sqlite:
+        raise SystemExit("restore only handles SQLite databases")
+    restored = backup.restore(args.backup, args.target, force=args.force)
+    target = args.target or backup.database_path
+    print(f"Restored {target} from {restored}")
+    if os.path.exists(target + '.before-restore'):
+        print(f"The previous database was kept as {target}.before-restore")
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(target + '.before-restore' + suffix):
+            print(f"Its {suffix} file was kept as {target}.before-restore{suffix}")
+
+def _parse_day(value):
+    return datetime.fromisoformat(value) if value else None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="License server maintenance tasks")
+    parser.add_argument('--config', default='config.json', help='configuration file (default: config.json)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    retention = commands.add_parser('retention', help='archive and delete activation logs past logging.retention')
+    retention.add_argument('--dry-run', action='store_true', help='only list the partitions that would be removed')
+    
+    rollups = commands.add_parser('rollups', help='maintain the activation summary rollups')
+    rollups.add_argument('action', choices=['rebuild', 'compact'])
+    rollups.add_argument('--since', help='rebuild from this day (YYYY-MM-DD, default: oldest log row)')
+    rollups.add_argument('--until', help='rebuild up to this day (default: now)')
+    
+    commands.add_parser('backup', help='take an online backup now')
+    commands.add_parser('backups', help='list backups, newest first')
+    
+    restore = commands.add_parser('restore', help='replace the database with a backup (stop the server first)')
+    restore.add_argument('--backup', help='backup file (default: the newest one)')
+    restore.add_argument('--target', help='database file to write (default: database.filename)')
+    restore.add_argument('--force', action='store_true', help='replace an existing database file')
+    
+    args = parser.parse_args(argv)
+    config = _load_config(args.config)
+    if args.command == 'restore':
+        try:
+            _restore(config, args)
+        except ValueError as e:
+            raise SystemExit(f"Restore failed: {e}")
+        return
+    
+    db = _open_database(config)
+    try:
+        if args.command == 'backup':
+            print(f"Backed up to {db.backup.run()}")
+        elif args.command == 'backups':
+            for path in db.backup.list_backups():
+                print(f"{path}  {os.path.getsize(path):>14,} bytes")
+        elif args.command == 'retention':
+            print(json.dumps(db.log_retention.run(dry_run=args.dry_run), indent=2))
+        elif args.action == 'rebuild':
+            days = db.rebuild_activation_rollups(_parse_day(args.since), _parse_day(args.until))
+            print(f"Rebuilt activation rollups for {days} days")
+        else:
+            print(f"Deleted {db.compact_activation_rollups()} expired rollup buckets")
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    main()
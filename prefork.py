@@ -0,0 +1,302 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPTIONS = {
+    'workers': 4,
+    'threads': 8,
+    'max_requests': 10000,
+    'max_requests_jitter': 1000,
+    'graceful_timeout': 30,
+    'keepalive_timeout': 5,
+    'backlog': 2048
+}
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug WSGI server that handles requests on a fixed thread pool
+
+    The accept loop blocks while every thread is busy, so pending
+    connections stay in the shared listen backlog where another worker
+    process can pick them up.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, max_requests=0, handler=None,
+                 ssl_context=None, fd=None):
+        super().__init__(host, port, app, handler=handler, ssl_context=ssl_context, fd=fd)
+        self.threads = threads
+        self.max_requests = max_requests
+        self.handled_requests = 0
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+        self._slots = threading.BoundedSemaphore(threads)
+        self._count_lock = threading.Lock()
+        self._stopping = False
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        self._pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+            self._request_done()
+
+    def _request_done(self):
+        with self._count_lock:
+            self.handled_requests += 1
+            recycle = self.max_requests and self.handled_requests >= self.max_requests
+        if recycle:
+            self.stop()
+
+    def stop(self):
+        """Stop accepting connections; safe to call from any thread or signal handler"""
+        if self._stopping:
+            return
+        self._stopping = True
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def drain(self, timeout):
+        """Wait up to timeout seconds for in-flight requests to finish"""
+        deadline = time.monotonic() + timeout
+        for _ in range(self.threads):
+            if not self._slots.acquire(timeout=max(0, deadline - time.monotonic())):
+                break
+        self._pool.shutdown(wait=False)
+
+class PreforkServer:
+    """Pure-Python pre-fork runner for LicenseServer
+
+    The parent process loads the configuration, opens the database engine
+    and binds the listening socket once, then forks ``workers`` children
+    that each serve requests on a ``threads``-sized pool. Workers exit after
+    ``max_requests`` (plus random jitter) and are replaced, and SIGTERM/SIGINT
+    stop the server. SIGHUP recycles the workers one at a time: each
+    replacement is accepting on the shared socket before the worker it
+    replaces is told to finish its requests and exit, so capacity never
+    drops below ``workers``.
+    """
+
+    def __init__(self, license_server, options=None):
+        self.license_server = license_server
+        self.options = {**DEFAULT_OPTIONS, **(options or {})}
+        self.workers = {}
+        self._listener = None
+        self._running = False
+        self._recycle_requested = False
+        # Workers still to be recycled, and the (replacement, old pid) in progress
+        self._retiring = deque()
+        self._replacement = None
+        self._ready_pipes = {}
+
+    def run(self):
+        """Bind, fork workers and supervise them until stopped"""
+        server_config = self.license_server.config['server']
+        host, port = server_config['host'], server_config['port']
+
+        family = socket.AF_INET6 if ':' in host else socket.AF_INET
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((host, port))
+        self._listener.listen(self.options['backlog'])
+        self._listener.set_inheritable(True)
+
+        # Background threads must not be running while we fork
+        self.license_server.prepare_fork()
+
+        self._running = True
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_recycle)
+
+        logger.info(
+            f"Pre-fork server on {host}:{port} with {self.options['workers']} workers "
+            f"x {self.options['threads']} threads"
+        )
+
+        try:
+            while self._running:
+                self._reap()
+                if self._recycle_requested:
+                    self._recycle_requested = False
+                    self._retiring.extend(pid for pid in self.workers if pid not in self._retiring)
+                self._advance_recycle()
+                for index in range(self.options['workers']):
+                    if index not in self.workers.values():
+                        self._spawn(index)
+                time.sleep(0.2)
+        finally:
+            self._stop_workers()
+            self._listener.close()
+
+    def _spawn(self, index, report_ready=False):
+        """Fork worker index; with report_ready it signals through a pipe once it is serving"""
+        ready_read = ready_write = None
+        if report_ready:
+            ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                if ready_read is not None:
+                    os.close(ready_read)
+                self._worker_main(index, ready_write)
+            except BaseException:
+                logger.exception(f"Worker {index} crashed")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+
+        self.workers[pid] = index
+        if report_ready:
+            os.close(ready_write)
+            os.set_blocking(ready_read, False)
+            self._ready_pipes[pid] = ready_read
+        return pid
+
+    def _advance_recycle(self):
+        """Take the next step of a SIGHUP recycle
+
+        One old worker is replaced at a time: its replacement is forked,
+        the old worker gets SIGTERM once the replacement reports that it
+        is serving, and the next one starts after the old worker exited.
+        """
+        if self._replacement is not None:
+            new_pid, old_pid = self._replacement
+            if old_pid not in self.workers:
+                self._replacement = None
+            elif new_pid is None:
+                # The old worker is finishing its requests
+                return
+            elif new_pid not in self.workers:
+                # The replacement died before serving; try again
+                self._replacement = None
+                self._retiring.appendleft(old_pid)
+            else:
+                if self._worker_ready(new_pid):
+                    self._signal_worker(old_pid, signal.SIGTERM)
+                    self._replacement = (None, old_pid)
+                return
+
+        while self._retiring:
+            old_pid = self._retiring.popleft()
+            if old_pid in self.workers:
+                new_pid = self._spawn(self.workers[old_pid], report_ready=True)
+                self._replacement = (new_pid, old_pid)
+                return
+
+    def _worker_ready(self, pid):
+        """Whether a worker forked with report_ready is serving"""
+        try:
+            ready = os.read(self._ready_pipes[pid], 1) != b''
+        except BlockingIOError:
+            return False
+        if ready:
+            os.close(self._ready_pipes.pop(pid))
+        return ready
+
+    def _worker_main(self, index, ready_fd=None):
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        self.license_server.post_fork(index)
+        server_config = self.license_server.config['server']
+
+        if server_config['ssl_enabled']:
+            ssl_context = (server_config['ssl_cert_path'], server_config['ssl_key_path'])
+        else:
+            ssl_context = None
+
+        handler = type('KeepAliveRequestHandler', (WSGIRequestHandler,), {
+            'timeout': self.options['keepalive_timeout']
+        })
+
+        max_requests = self.options['max_requests']
+        if max_requests:
+            max_requests += random.randint(0, self.options['max_requests_jitter'])
+
+        server = PooledWSGIServer(
+            server_config['host'],
+            server_config['port'],
+            self.license_server.app,
+            threads=self.options['threads'],
+            max_requests=max_requests,
+            handler=handler,
+            ssl_context=ssl_context,
+            fd=self._listener.fileno()
+        )
+        signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+        if ready_fd is not None:
+            # The socket is already listening, so the worker accepts from here on
+            os.write(ready_fd, b'.')
+            os.close(ready_fd)
+
+        try:
+            server.serve_forever()
+        finally:
+            server.drain(self.options['graceful_timeout'])
+            self.license_server.shutdown()
+
+    def _reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            index = self.workers.pop(pid, None)
+            if pid in self._ready_pipes:
+                os.close(self._ready_pipes.pop(pid))
+            if os.waitstatus_to_exitcode(status) != 0 and self._running:
+                logger.warning(f"Worker {index} (pid {pid}) exited with status {status}")
+                # Avoid a tight respawn loop when workers crash on startup
+                time.sleep(1)
+
+    def _signal_workers(self, signum):
+        for pid in list(self.workers):
+            self._signal_worker(pid, signum)
+
+    def _signal_worker(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            self.workers.pop(pid, None)
+
+    def _stop_workers(self):
+        self._signal_workers(signal.SIGTERM)
+        deadline = time.monotonic() + self.options['graceful_timeout']
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        self._signal_workers(signal.SIGKILL)
+        self._reap()
+
+    def _handle_stop(self, signum, frame):
+        self._running = False
+
+    def _handle_recycle(self, signum, frame):
+        self._recycle_requested = True
@@ -0,0 +1,335 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from limits import parse
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fork(), so one process only needs its thread locks
+    fcntl = None
+
+DEFAULT_OPTIONS = {
+    'backend': 'shared_memory',
+    'strategy': 'sliding-window',
+    # Limit per client IP and per X-API-Key; None uses
+    # security.max_requests_per_minute, false disables the scope
+    'limits': {'ip': None, 'api_key': None},
+    # Token bucket capacity; None uses the limit's amount
+    'burst': None,
+    'path': None,
+    'slots': 65536,
+    'lock_stripes': 256,
+    # Used by the "limits" backend only
+    'storage_uri': 'memory://',
+    'storage_options': {}
+}
+
+# Table layouts recorded in the file header; a file with another layout is reset
+SHARED_MEMORY_STRATEGIES = {'fixed-window': 1, 'sliding-window': 2, 'token-bucket': 3}
+SHARED_MEMORY_LAYOUTS = {**SHARED_MEMORY_STRATEGIES, 'seen-set': 4}
+
+class SharedMemoryTable:
+    """Fixed-size hash table in an mmap'd file shared by every worker process
+    
+    A key hashes to a group of GROUP_SIZE slots; each slot holds the key's
+    64-bit fingerprint, a timestamp and two floats whose meaning is up to
+    the subclass. Each group is guarded by one of lock_stripes byte-range
+    fcntl locks, which serialize processes, plus a thread lock per stripe,
+    since fcntl locks do not exclude threads of the same process.
+    
+    Without a path the file is an unlinked temporary file, shared with the
+    worker processes forked from this one. With a path, separately started
+    servers on the same host share the table too.
+    """
+    
+    MAGIC = b'LSRLIM01'
+    HEADER = struct.Struct('<8sII')
+    HEADER_SIZE = 64
+    SLOT = struct.Struct('<Qddd')
+    GROUP_SIZE = 8
+    
+    def __init__(self, layout, path=None, slots=65536, lock_stripes=256):
+        self.layout = layout
+        self.path = path
+        self.groups = max(1, int(slots) // self.GROUP_SIZE)
+        self.slots = self.groups * self.GROUP_SIZE
+        self.lock_stripes = max(1, min(int(lock_stripes), self.groups))
+        self._thread_locks = [threading.Lock() for _ in range(self.lock_stripes)]
+        self.size = self.HEADER_SIZE + self.slots * self.SLOT.size
+        
+        if path:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        else:
+            self._file = tempfile.TemporaryFile(prefix='license_server_shm_')
+            self._fd = self._file.fileno()
+        self._initialize()
+        self._map = mmap.mmap(self._fd, self.size)
+    
+    def _initialize(self):
+        """Create or reset the table unless it already has this layout"""
+        header = self.HEADER.pack(self.MAGIC, SHARED_MEMORY_LAYOUTS[self.layout], self.slots)
+        if fcntl:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            current = os.read(self._fd, self.HEADER.size)
+            if current != header or os.fstat(self._fd).st_size != self.size:
+                # Truncating first zero-fills every slot
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size)
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, header)
+        finally:
+            if fcntl:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+    
+    def _locate(self, key):
+        """Fingerprint of key (str or bytes; never 0, which marks empty slots) and its group"""
+        if isinstance(key, str):
+            key = key.encode()
+        fingerprint = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') or 1
+        return fingerprint, fingerprint % self.groups
+    
+    def _locked(self, group, function, *args):
+        """Call function(*args) while holding the lock of group"""
+        stripe = group % self.lock_stripes
+        with self._thread_locks[stripe]:
+            if fcntl:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                return function(*args)
+            finally:
+                if fcntl:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+    
+    def _group_slots(self, group):
+        """Offset and (fingerprint, touched, x, y) of every slot of group"""
+        start = self.HEADER_SIZE + group * self.GROUP_SIZE * self.SLOT.size
+        unpack_from = self.SLOT.unpack_from
+        for offset in range(start, start + self.GROUP_SIZE * self.SLOT.size, self.SLOT.size):
+            yield offset, unpack_from(self._map, offset)
+    
+    def close(self):
+        if self._map.closed:
+            return
+        self._map.close()
+        if self.path:
+            os.close(self._fd)
+        else:
+            self._file.close()
+
+class SharedMemoryStore(SharedMemoryTable):
+    """Rate limit counters in a SharedMemoryTable
+    
+    A slot holds the time of the key's last hit and two counters (current
+    and previous window count, or the token count of a bucket). A full
+    group reuses its least recently hit slot. A hit is one lock round trip
+    around a few struct reads and writes.
+    """
+    
+    def __init__(self, strategy, burst=None, path=None, slots=65536, lock_stripes=256):
+        if strategy not in SHARED_MEMORY_STRATEGIES:
+            raise ValueError(f"Unknown shared memory rate limit strategy: {strategy} "
+                             f"(use one of {', '.join(SHARED_MEMORY_STRATEGIES)})")
+        super().__init__(strategy, path, slots, lock_stripes)
+        self.strategy = strategy
+        self.burst = burst
+        self._hit = {
+            'fixed-window': self._hit_window,
+            'sliding-window': self._hit_window,
+            'token-bucket': self._hit_bucket
+        }[strategy]
+        
+        self.hits = 0
+        self.limited = 0
+        self.evictions = 0
+    
+    def hit(self, key, limit):
+        """Count one request for key against limit; return whether it is allowed"""
+        fingerprint, group = self._locate(key)
+        allowed = self._locked(group, self._hit_group, group, fingerprint, limit)
+        self.hits += 1
+        if not allowed:
+            self.limited += 1
+        return allowed
+    
+    def _hit_group(self, group, fingerprint, limit):
+        return self._hit(self._slot_offset(group, fingerprint), fingerprint, limit, time.time())
+    
+    def _slot_offset(self, group, fingerprint):
+        """Offset of fingerprint's slot in group, claiming one if it has none"""
+        empty = oldest = None
+        oldest_touched = float('inf')
+        for offset, (slot_fingerprint, touched, _, _) in self._group_slots(group):
+            if slot_fingerprint == fingerprint:
+                return offset
+            if not slot_fingerprint:
+                if empty is None:
+                    empty = offset
+            elif touched < oldest_touched:
+                oldest, oldest_touched = offset, touched
+        
+        if empty is None:
+            empty = oldest
+            self.evictions += 1
+        self.SLOT.pack_into(self._map, empty, fingerprint, 0.0, 0.0, 0.0)
+        return empty
+    
+    def _hit_window(self, offset, fingerprint, limit, now):
+        """Fixed or sliding window counter
+        
+        The sliding window estimates the requests of the last period as
+        the previous window's count, weighted by how much of it still
+        overlaps, plus the current window's count.
+        """
+        period = limit.get_expiry()
+        _, touched, current, previous = self.SLOT.unpack_from(self._map, offset)
+        window = now // period
+        last_window = touched // period
+        if last_window != window:
+            previous = current if last_window == window - 1 else 0.0
+            current = 0.0
+        
+        count = current
+        if self.strategy == 'sliding-window':
+            count += previous * (1.0 - (now - window * period) / period)
+        allowed = count + 1 <= limit.amount
+        if allowed:
+            current += 1
+        self.SLOT.pack_into(self._map, offset, fingerprint, now, current, previous)
+        return allowed
+    
+    def _hit_bucket(self, offset, fingerprint, limit, now):
+        """Token bucket refilled with limit.amount tokens per period"""
+        capacity = self.burst or limit.amount
+        _, touched, tokens, _ = self.SLOT.unpack_from(self._map, offset)
+        if touched:
+            tokens = min(capacity, tokens + (now - touched) * limit.amount / limit.get_expiry())
+        else:
+            tokens = capacity
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.SLOT.pack_into(self._map, offset, fingerprint, now, tokens, 0.0)
+        return allowed
+    
+    def get_stats(self):
+        return {
+            'backend': 'shared_memory',
+            'strategy': self.strategy,
+            'slots': self.slots,
+            'path': self.path,
+            'hits': self.hits,
+            'limited': self.limited,
+            'evictions': self.evictions
+        }
+
+class LimitsStore:
+    """Rate limit counters in a ``limits`` storage such as ``redis://``
+    
+    Keys are hashed before they reach the storage, so API keys are never
+    written to it.
+    """
+    
+    def __init__(self, strategy, storage_uri, storage_options=None):
+        from limits.storage import storage_from_string
+        from limits.strategies import STRATEGIES
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown limits strategy: {strategy} (use one of {', '.join(STRATEGIES)})")
+        self.strategy = strategy
+        self.storage_uri = storage_uri
+        self.limiter = STRATEGIES[strategy](storage_from_string(storage_uri, **(storage_options or {})))
+        self.hits = 0
+        self.limited = 0
+    
+    def hit(self, key, limit):
+        allowed = self.limiter.hit(limit, hashlib.sha256(key.encode()).hexdigest()[:32])
+        self.hits += 1
+        if not allowed:
+            self.limited += 1
+        return allowed
+    
+    def get_stats(self):
+        return {
+            'backend': 'limits',
+            'strategy': self.strategy,
+            'storage_uri': self.storage_uri.split('://', 1)[0] + '://',
+            'hits': self.hits,
+            'limited': self.limited
+        }
+    
+    def close(self):
+        pass
+
+class RateLimiter:
+    """Per-client request limits of both servers
+    
+    Every request but ``/health`` counts once against the limit of its
+    client IP and, when it carries a known one, once against the limit of
+    its X-API-Key: the key's own ``rate_limit`` or else the ``api_key``
+    limit. Limits are ``limits`` strings such as ``"600 per minute"``.
+    The ``shared_memory`` backend (SharedMemoryStore) holds one set of
+    counters for all worker processes of a host; the ``limits`` backend
+    uses ``storage_uri`` for counters shared between hosts.
+    """
+    
+    def __init__(self, rate_limiting_config, security_config):
+        options = {**DEFAULT_OPTIONS, **(rate_limiting_config or {})}
+        self.enabled = security_config.get('rate_limiting_enabled', True)
+        
+        default_limit = f"{security_config['max_requests_per_minute']} per minute"
+        self.limits = {}
+        for scope, value in {**DEFAULT_OPTIONS['limits'], **(options['limits'] or {})}.items():
+            if value is not False:
+                self.limits[scope] = parse(value or default_limit)
+        
+        if options['backend'] == 'shared_memory':
+            self.store = SharedMemoryStore(
+                options['strategy'], options['burst'], options['path'],
+                options['slots'], options['lock_stripes']
+            )
+        elif options['backend'] == 'limits':
+            self.store = LimitsStore(options['strategy'], options['storage_uri'], options['storage_options'])
+        else:
+            raise ValueError(f"Unknown rate limiting backend: {options['backend']}")
+    
+    def check_request(self, client_ip, api_key=None):
+        """Count a request and return whether it is within its limits
+        
+        api_key is the request's APIKey (see api_keys.APIKeyIndex), or None
+        when it carries no known key.
+        """
+        if not self.enabled:
+            return True
+        
+        ip_limit = self.limits.get('ip')
+        if ip_limit and not self.store.hit('ip:' + (client_ip or ''), ip_limit):
+            return False
+        
+        if api_key is not None:
+            key_limit = api_key.rate_limit or self.limits.get('api_key')
+            if key_limit and not self.store.hit('key:' + api_key.key_hash, key_limit):
+                return False
+        return True
+    
+    def get_stats(self):
+        return {
+            'enabled': self.enabled,
+            'limits': {scope: str(limit) for scope, limit in self.limits.items()},
+            **self.store.get_stats()
+        }
+    
+    def close(self):
+        self.store.close()
@@ -0,0 +1,248 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+from datetime import datetime, timezone
+import hashlib
+import math
+import threading
+import time
+
+from rate_limiter import SharedMemoryTable
+
+DEFAULT_OPTIONS = {
+    'enabled': True,
+    'max_skew_seconds': 300,
+    'backend': 'memory',
+    # memory backend
+    'bucket_seconds': 10,
+    'max_entries': 1000000,
+    # shared_memory backend
+    'path': None,
+    'slots': 262144,
+    'lock_stripes': 256
+}
+
+def parse_timestamp(value):
+    """Seconds since the epoch of a request timestamp, or None if it is malformed
+    
+    Strings are ISO 8601, in UTC when they carry no offset (as
+    ``datetime.utcnow().isoformat()`` produces them); numbers are seconds
+    since the epoch.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    if not isinstance(value, str):
+        return None
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+class BucketedSeenSet:
+    """Request digests seen within the skew window, in one set per time bucket
+    
+    A digest goes into the bucket of its request's timestamp, so a replay
+    (which carries the same signed timestamp) is found with one set
+    lookup. Buckets whose requests are now outside the window are dropped
+    whole. When max_entries digests are stored, the oldest bucket is
+    dropped early and requests timestamped inside it are refused as if
+    they were outside the window, so a full set never lets a replay
+    through.
+    """
+    
+    def __init__(self, max_skew, bucket_seconds, max_entries):
+        self.max_skew = max_skew
+        self.bucket_seconds = max(1, bucket_seconds)
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._oldest = None
+        self.entries = 0
+        self.buckets_expired = 0
+        self.buckets_evicted = 0
+    
+    def add(self, digest, moment, now):
+        """True if digest is new, False if it was seen, None if moment's bucket was evicted"""
+        bucket = int(moment // self.bucket_seconds)
+        with self._lock:
+            self._expire(int((now - self.max_skew) // self.bucket_seconds))
+            if bucket < self._oldest:
+                return None
+            
+            seen = self._buckets.get(bucket)
+            if seen is None:
+                seen = self._buckets[bucket] = set()
+            elif digest in seen:
+                return False
+            seen.add(digest)
+            self.entries += 1
+            
+            while self.entries > self.max_entries:
+                # Ends at the latest when the new digest's own bucket goes
+                self._drop(self._oldest)
+                self._oldest += 1
+                self.buckets_evicted += 1
+                if bucket < self._oldest:
+                    return None
+            return True
+    
+    def _expire(self, floor):
+        """Drop the buckets older than floor"""
+        if self._oldest is None:
+            self._oldest = floor
+        elif floor - self._oldest > len(self._buckets):
+            # After a quiet spell, looking at the stored buckets is cheaper
+            # than stepping through every index since the last request
+            for bucket in [bucket for bucket in self._buckets if bucket < floor]:
+                self._drop(bucket)
+                self.buckets_expired += 1
+            self._oldest = floor
+        while self._oldest < floor:
+            if self._drop(self._oldest):
+                self.buckets_expired += 1
+            self._oldest += 1
+    
+    def _drop(self, bucket):
+        seen = self._buckets.pop(bucket, None)
+        if seen is None:
+            return False
+        self.entries -= len(seen)
+        return True
+    
+    def get_stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'entries': self.entries,
+                'buckets': len(self._buckets),
+                'buckets_expired': self.buckets_expired,
+                'buckets_evicted': self.buckets_evicted
+            }
+    
+    def close(self):
+        pass
+
+class SharedSeenSet(SharedMemoryTable):
+    """Request digests in a SharedMemoryTable, seen by every worker process
+    
+    A slot holds a digest's fingerprint and the time it stops mattering
+    (its request's timestamp plus the skew window). Expired slots are
+    reused in place, so nothing is ever swept. A group with no free or
+    expired slot refuses the request instead of forgetting a digest.
+    """
+    
+    def __init__(self, max_skew, path=None, slots=262144, lock_stripes=256):
+        super().__init__('seen-set', path, slots, lock_stripes)
+        self.max_skew = max_skew
+        self.full = 0
+    
+    def add(self, digest, moment, now):
+        """True if digest is new, False if it was seen, None if its group is full"""
+        fingerprint, group = self._locate(digest)
+        added = self._locked(group, self._add, group, fingerprint, moment + self.max_skew, now)
+        if added is None:
+            self.full += 1
+        return added
+    
+    def _add(self, group, fingerprint, expires, now):
+        free = None
+        for offset, (slot_fingerprint, slot_expires, _, _) in self._group_slots(group):
+            if slot_expires <= now:
+                if free is None:
+                    free = offset
+            elif slot_fingerprint == fingerprint:
+                return False
+        if free is None:
+            return None
+        self.SLOT.pack_into(self._map, free, fingerprint, expires, 0.0, 0.0)
+        return True
+    
+    def get_stats(self):
+        return {
+            'backend': 'shared_memory',
+            'slots': self.slots,
+            'path': self.path,
+            'full': self.full
+        }
+
+class ReplayGuard:
+    """Refuses stale and repeated validation requests before any database work
+    
+    Requests must carry a ``timestamp`` within ``max_skew_seconds`` of the
+    server clock, and the same request (identified by its X-Signature, or
+    its body when unsigned) is accepted only once within that window.
+    The ``memory`` backend keeps the seen requests per process, which
+    misses replays sent to another pre-fork worker; the ``shared_memory``
+    backend keeps them in a table shared by all workers (and, with a
+    ``path``, by other servers on the host).
+    """
+    
+    def __init__(self, security_config):
+        options = {**DEFAULT_OPTIONS, **(security_config.get('replay_protection') or {})}
+        self.enabled = options['enabled']
+        self.max_skew = options['max_skew_seconds']
+        if options['backend'] == 'memory':
+            self._seen = BucketedSeenSet(self.max_skew, options['bucket_seconds'], options['max_entries'])
+        elif options['backend'] == 'shared_memory':
+            self._seen = SharedSeenSet(self.max_skew, options['path'], options['slots'], options['lock_stripes'])
+        else:
+            raise ValueError(f"Unknown replay protection backend: {options['backend']}")
+        
+        self.stats = {
+            'accepted': 0,
+            'invalid_timestamp': 0,
+            'outside_window': 0,
+            'replayed': 0,
+            'at_capacity': 0
+        }
+    
+    def check(self, timestamp, token, now=None):
+        """Return None for a fresh request, otherwise (HTTP status, message)
+        
+        token identifies the request: its signature (str) or its body (bytes).
+        """
+        if not self.enabled:
+            return None
+        
+        now = time.time() if now is None else now
+        moment = parse_timestamp(timestamp)
+        if moment is None:
+            self.stats['invalid_timestamp'] += 1
+            return 400, 'Invalid timestamp'
+        if abs(now - moment) > self.max_skew:
+            self.stats['outside_window'] += 1
+            return 401, 'Request timestamp outside the allowed window'
+        
+        if isinstance(token, str):
+            token = token.encode('utf-8')
+        added = self._seen.add(hashlib.blake2b(token, digest_size=16).digest(), moment, now)
+        if added is None:
+            self.stats['at_capacity'] += 1
+            return 503, 'Replay protection at capacity, retry later'
+        if not added:
+            self.stats['replayed'] += 1
+            return 401, 'Request already processed'
+        self.stats['accepted'] += 1
+        return None
+    
+    def get_stats(self):
+        return {
+            'enabled': self.enabled,
+            'max_skew_seconds': self.max_skew,
+            **self.stats,
+            **self._seen.get_stats()
+        }
+    
+    def close(self):
+        self._seen.close()
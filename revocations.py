@@ -0,0 +1,159 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+import gzip
+import json
+import logging
+import time
+
+from sqlalchemy import func, select, text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPTIONS = {
+    # Changes per response; clients fetch the rest while "more" is true
+    'max_changes': 10000,
+    'version_cache_seconds': 2,
+    'gzip_min_bytes': 1024
+}
+
+# Backends on which append() makes change log ids become visible in order
+ORDERED_BACKENDS = ('sqlite', 'postgresql')
+# pg_advisory_xact_lock key that serializes appends on PostgreSQL
+APPEND_LOCK_KEY = 0x7265766f
+
+class RevocationFeed:
+    """Versioned delta feed of revoked and restored license keys
+    
+    Every change of a key's ``is_active`` appends a row to the change log
+    table, whose id is the feed version. ``changes(since)`` returns the key
+    hashes whose state changed after ``since``, the last change of a key
+    winning, at most ``max_changes`` log rows at a time. The current version
+    is cached for ``version_cache_seconds``, so a client polling with the
+    ETag of its last response gets a 304 without a database query.
+    
+    The feed is only enabled on backends listed in ORDERED_BACKENDS.
+    """
+    
+    def __init__(self, model, options=None, backend='sqlite'):
+        self.model = model
+        self.backend = backend
+        self.enabled = backend in ORDERED_BACKENDS
+        if not self.enabled:
+            logger.warning(f"Revocation feed disabled: change log versions can become visible out of order on {backend}")
+        options = {**DEFAULT_OPTIONS, **(options or {})}
+        self.max_changes = max(1, options['max_changes'])
+        self.version_cache_seconds = options['version_cache_seconds']
+        self.gzip_min_bytes = options['gzip_min_bytes']
+        self._version = None
+        self._version_read_at = 0.0
+        
+        self.polls = 0
+        self.not_modified = 0
+        self.changes_sent = 0
+    
+    def cached_version(self):
+        """Current version if it was read within version_cache_seconds, else None"""
+        if self._version is None or time.monotonic() - self._version_read_at > self.version_cache_seconds:
+            return None
+        return self._version
+    
+    def current_version(self, session_factory):
+        """Id of the latest change log row (0 before the first change)"""
+        version = self.cached_version()
+        if version is None:
+            session = session_factory()
+            try:
+                version = session.execute(select(func.max(self.model.id))).scalar() or 0
+            finally:
+                session.close()
+            self._version, self._version_read_at = version, time.monotonic()
+        return version
+    
+    def append(self, session, key_hash, revoked):
+        """Add a change log row to session's transaction
+        
+        A client synced to version N never asks for ids up to N again, so a
+        lower id must not commit after a higher one. SQLite runs one write
+        transaction at a time. PostgreSQL draws ids at insert time and can
+        commit them in any order, so the transaction first takes an advisory
+        lock held until it ends; ids are then drawn and committed in turn.
+        """
+        if not self.enabled:
+            return
+        if self.backend == 'postgresql':
+            session.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': APPEND_LOCK_KEY})
+        session.add(self.model(key_hash=key_hash, revoked=revoked))
+    
+    def invalidate(self):
+        """Forget the cached version after a change made by this process"""
+        self._version = None
+    
+    @staticmethod
+    def etag(version):
+        return f'"rev-{version}"'
+    
+    def not_modified_since(self, if_none_match, version):
+        """Whether an If-None-Match header names version, i.e. the client is up to date"""
+        self.polls += 1
+        if not if_none_match or self.etag(version) not in [tag.strip() for tag in if_none_match.split(',')]:
+            return False
+        self.not_modified += 1
+        return True
+    
+    def changes(self, session, since, version):
+        """Document with the keys revoked and restored after since, up to version
+        
+        A since ahead of version (a client of another database) returns
+        every change with ``reset`` set, so the client starts over.
+        """
+        reset = since > version
+        if reset:
+            since = 0
+        rows = session.execute(
+            select(self.model.id, self.model.key_hash, self.model.revoked)
+            .where(self.model.id > since, self.model.id <= version)
+            .order_by(self.model.id)
+            .limit(self.max_changes)
+        ).all()
+        
+        states = {}
+        for _, key_hash, revoked in rows:
+            states[key_hash] = revoked
+        more = len(rows) == self.max_changes and rows[-1].id < version
+        self.changes_sent += len(rows)
+        return {
+            'status': 'success',
+            'since': since,
+            'version': rows[-1].id if more else version,
+            'reset': reset,
+            'more': more,
+            'revoked': sorted(key_hash for key_hash, revoked in states.items() if revoked),
+            'restored': sorted(key_hash for key_hash, revoked in states.items() if not revoked)
+        }
+    
+    def encode(self, document, accept_encoding=None):
+        """Response body and headers of document, gzipped when the client accepts it"""
+        body = json.dumps(document, separators=(',', ':')).encode('utf-8')
+        headers = {
+            'ETag': self.etag(document['version']),
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding'
+        }
+        if len(body) >= self.gzip_min_bytes and 'gzip' in (accept_encoding or ''):
+            body = gzip.compress(body, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+        return body, headers
+    
+    def get_stats(self):
+        return {
+            'enabled': self.enabled,
+            'version': self._version,
+            'polls': self.polls,
+            'not_modified': self.not_modified,
+            'changes_sent': self.changes_sent
+        }
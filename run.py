@@ -46,8 +46,21 @@ def main():
             sys.exit(1)
     
     # Start server
-    server = LicenseServer()
-    print(f"Starting license server on {config['server']['host']}:{config['server']['port']}")
+    server_config = config['server']
+    mode = server_config.get('mode', 'development')
+    if mode == 'async':
+        # Optional dependencies (aiosqlite, uvicorn) are only needed here
+        from async_app import AsyncLicenseServer
+        server = AsyncLicenseServer()
+    else:
+        server = LicenseServer()
+    if mode == 'prefork':
+        print(f"Starting license server on {server_config['host']}:{server_config['port']} "
+              f"({server_config['workers']} workers x {server_config['threads']} threads)")
+    elif mode == 'async':
+        print(f"Starting async license server on {server_config['host']}:{server_config['port']}")
+    else:
+        print(f"Starting license server on {server_config['host']}:{server_config['port']}")
     server.run()
 
 if __name__ == '__main__':
@@ -8,6 +8,9 @@
 import hashlib
 import hmac
 import base64
+import binascii
+import json
+import re
 import secrets
 from datetime import datetime, timedelta
 import jwt
@@ -15,16 +18,31 @@ from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import os
+from license_types import LicenseTypeRegistry
+
+KEY_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+# Largest multiple of len(KEY_ALPHABET) that fits in a byte
+KEY_ALPHABET_LIMIT = 256 - 256 % len(KEY_ALPHABET)
+_KEY_ALPHABET_TABLE = bytes(
+    ord(KEY_ALPHABET[value % len(KEY_ALPHABET)]) for value in range(256)
+)
+_KEY_ALPHABET_REJECT = bytes(range(KEY_ALPHABET_LIMIT, 256))
+_KEY_ALPHABET_CLASS = '[' + re.escape(KEY_ALPHABET) + ']'
+_KEY_ALPHABET_BYTES = KEY_ALPHABET.encode('ascii')
 
 class SecurityManager:
+    # Request signature formats understood by verify_request_signature
+    SIGNATURE_VERSIONS = ('1', '2')
+    
     def __init__(self, config):
         self.config = config
         self.fernet = self._setup_encryption()
-        self.prefixes = {
-            "BUSINESS": "BUS",
-            "PRO": "PRO", 
-            "STUDENT": "STU"
-        }
+        self._request_hmac = self._setup_request_hmac()
+        self.min_signature_version = config['security'].get('min_signature_version', 1)
+        self.license_registry = LicenseTypeRegistry(config['licensing'])
+        self.prefixes = self.license_registry.prefixes
+        self.license_types = frozenset(self.license_registry.names)
+        self._compile_key_formats()
         
     def _setup_encryption(self):
         """Setup encryption for database"""
@@ -50,26 +68,99 @@ class SecurityManager:
     
     def generate_secure_key(self, length=16):
         """Generate secure key"""
-        alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
-        return ''.join(secrets.choice(alphabet) for _ in range(length))
+        return self.generate_secure_keys(1, length)[0]
+    
+    def generate_secure_keys(self, count, length=16):
+        """Generate count secure keys from bulk random bytes
+        
+        Random bytes are drawn in large chunks and mapped to the alphabet
+        with one bytes.translate call. Byte values 252-255 are dropped
+        first, so each remaining value maps to a character with exactly
+        the same probability (252 is a multiple of 36), without modulo bias.
+        """
+        needed = count * length
+        chars = bytearray()
+        while len(chars) < needed:
+            # About 1.6% of bytes are rejected; over-draw so one pass usually suffices
+            draw = (needed - len(chars)) * 256 // KEY_ALPHABET_LIMIT + 64
+            chars += secrets.token_bytes(draw).translate(_KEY_ALPHABET_TABLE, _KEY_ALPHABET_REJECT)
+        text = chars[:needed].decode('ascii')
+        return [text[i:i + length] for i in range(0, needed, length)]
+    
+    def hash_keys(self, keys):
+        """Hash many license keys"""
+        sha256 = hashlib.sha256
+        return [sha256(key.encode()).hexdigest() for key in keys]
+    
+    def _compile_key_formats(self):
+        """Precompile one key pattern per license type
+        
+        A pattern is the prefix followed by exactly key_length - len(prefix)
+        alphabet characters, with the type's own key_length. Unknown types
+        use the unprefixed pattern of licensing.key_length, so only the
+        length and alphabet are checked for them.
+        """
+        def compile_format(prefix, key_length):
+            pattern = re.compile(f"{re.escape(prefix)}{_KEY_ALPHABET_CLASS}{{{key_length - len(prefix)}}}")
+            return pattern, prefix, sum(char not in KEY_ALPHABET for char in prefix), key_length
+        
+        self._default_key_format = compile_format("", self.license_registry.default_key_length)
+        self._key_formats = {
+            license_type.name: compile_format(license_type.prefix, license_type.key_length)
+            for license_type in self.license_registry
+        }
     
     def validate_key_format(self, key, license_type):
         """Validate key format considering prefix"""
-        expected_length = self.config['licensing']['key_length']
+        pattern = self._key_formats.get(license_type, self._default_key_format)[0]
+        return pattern.fullmatch(key) is not None
+    
+    def validate_key_formats(self, keys, license_type=None):
+        """Validate many key formats at once; return one bool per key
         
-        # Check total length
-        if len(key) != expected_length:
-            return False
+        With license_type, keys are key strings of that type, and the
+        common all-valid batch is confirmed with a few whole-batch string
+        operations (see _all_keys_well_formed) before falling back to one
+        pattern match per key. Without it, keys are ``(key, license_type)``
+        pairs as in batch validation requests.
+        """
+        if license_type is None:
+            formats = self._key_formats
+            default = self._default_key_format
+            return [
+                formats.get(pair_type, default)[0].fullmatch(key) is not None
+                for key, pair_type in keys
+            ]
         
-        # Check prefix
-        prefix = self.prefixes.get(license_type, "")
-        if prefix and not key.startswith(prefix):
-            return False
+        keys = list(keys)
+        key_format = self._key_formats.get(license_type, self._default_key_format)
+        if keys and self._all_keys_well_formed(keys, key_format):
+            return [True] * len(keys)
+        fullmatch = key_format[0].fullmatch
+        return [fullmatch(key) is not None for key in keys]
+    
+    def _all_keys_well_formed(self, keys, key_format):
+        """Whether every key matches key_format, checked on the joined keys
         
-        # Check that remaining part consists of allowed characters
-        main_part = key[len(prefix):]
-        alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
-        return all(char in alphabet for char in main_part)
+        The keys are joined with newlines. If the result has the length of
+        len(keys) well-formed keys, a newline at every separator position,
+        the prefix at every key start and no other characters outside the
+        alphabet, then no key contains a newline, so every key has the
+        right length and prefix and the rest of it is alphabet characters.
+        """
+        _, prefix, prefix_outside, key_length = key_format
+        count = len(keys)
+        stride = key_length + 1
+        joined = '\n'.join(keys)
+        if len(joined) != count * stride - 1 or joined[key_length::stride] != '\n' * (count - 1):
+            return False
+        for offset, char in enumerate(prefix):
+            if joined[offset::stride] != char * count:
+                return False
+        if not joined.isascii():
+            return False
+        outside = len(joined.encode('ascii').translate(None, _KEY_ALPHABET_BYTES))
+        return outside == count * prefix_outside + count - 1
     
     def create_hmac_signature(self, data):
         """Create HMAC signature"""
@@ -83,6 +174,79 @@ class SecurityManager:
         expected_signature = self.create_hmac_signature(data)
         return hmac.compare_digest(expected_signature, signature)
     
+    def _setup_request_hmac(self):
+        """Decode the request signing secret once and prepare an HMAC to copy"""
+        try:
+            secret_bytes = base64.b64decode(self.config['security']['hmac_secret'], validate=True)
+        except (binascii.Error, ValueError):
+            return None
+        return hmac.new(secret_bytes, digestmod=hashlib.sha256)
+    
+    def canonical_request_data(self, data):
+        """Serialize request JSON the same way version 1 clients do before signing"""
+        return json.dumps(data, sort_keys=True, separators=(',', ':'))
+    
+    def create_request_signature(self, data):
+        """Create base64 HMAC-SHA256 signature of request data (str or bytes)"""
+        if self._request_hmac is None:
+            raise ValueError("hmac_secret is not valid base64")
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        mac = self._request_hmac.copy()
+        mac.update(data)
+        return base64.b64encode(mac.digest()).decode('utf-8')
+    
+    @staticmethod
+    def request_target(path, query_string=''):
+        """Path and raw query string of a request as version 2 signatures cover them"""
+        if isinstance(query_string, bytes):
+            query_string = query_string.decode('latin-1')
+        return f'{path}?{query_string}' if query_string else path
+    
+    @staticmethod
+    def request_signing_string(method, target, timestamp, body):
+        """Bytes covered by a version 2 signature: request line, X-Timestamp and body"""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        return f'{method.upper()}\n{target}\n{timestamp}\n'.encode('utf-8') + body
+    
+    def verify_request_signature(self, signature, body, version=None, data=None,
+                                 method=None, target=None, timestamp=None):
+        """Verify the X-Signature header of a request
+        
+        Version 2 signatures cover the method, the target (path and query
+        string), the X-Timestamp header and the raw body bytes, so a
+        signature is only good for one request at one time. Version 1,
+        used by clients that send no X-Signature-Version header, covers the
+        canonical re-serialization of the parsed JSON (``data``, or the
+        body parsed here when not given).
+        """
+        version = version or '1'
+        if version not in self.SIGNATURE_VERSIONS or int(version) < self.min_signature_version:
+            return False
+        if self._request_hmac is None:
+            return False
+        
+        if version == '2':
+            if not (method and target and timestamp):
+                return False
+            body = self.request_signing_string(method, target, timestamp, body)
+        else:
+            if data is None:
+                try:
+                    data = json.loads(body)
+                except ValueError:
+                    return False
+            body = self.canonical_request_data(data).encode('utf-8')
+        
+        try:
+            received = base64.b64decode(signature, validate=True)
+        except (binascii.Error, ValueError):
+            return False
+        mac = self._request_hmac.copy()
+        mac.update(body)
+        return hmac.compare_digest(received, mac.digest())
+    
     def create_jwt_token(self, payload):
         """Create JWT token"""
         payload['exp'] = datetime.utcnow() + timedelta(
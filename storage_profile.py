@@ -0,0 +1,192 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+# 
+# Copyright (c) 2025 developercreation
+
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool, SingletonThreadPool
+
+DEFAULT_SQLITE_OPTIONS = {
+    'enabled': True,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16384,
+    'mmap_size': 268435456,
+    'busy_timeout_ms': 5000,
+    'temp_store': 'MEMORY'
+}
+
+DEFAULT_POOL_OPTIONS = {
+    'strategy': 'queue',
+    'size': 8,
+    'max_overflow': 8,
+    'timeout_seconds': 30,
+    'recycle_seconds': -1,
+    'pre_ping': False
+}
+
+# Async drivers used by AsyncDatabaseManager for each backend
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg'
+}
+
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_LEVELS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+TEMP_STORES = {'DEFAULT', 'FILE', 'MEMORY'}
+
+def database_url(database_config):
+    """SQLAlchemy URL of the primary database
+    
+    ``database.url`` accepts any SQLAlchemy URL; without it the original
+    ``type``/``filename`` settings describe a SQLite file.
+    """
+    if database_config.get('url'):
+        return database_config['url']
+    if database_config.get('type', 'sqlite') == 'sqlite':
+        return f"sqlite:///{database_config['filename']}"
+    raise ValueError(f"Set database.url to use a {database_config['type']} database")
+
+def replica_urls(database_config):
+    """SQLAlchemy URLs of the read replicas (``database.replicas``)"""
+    return list(database_config.get('replicas') or [])
+
+def async_database_url(url):
+    """Rewrite a URL to the asyncio driver of its backend"""
+    url = make_url(url)
+    if '+' in url.drivername and url.drivername != 'sqlite+pysqlite':
+        return url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver configured for {backend} databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+def is_sqlite(engine_or_url):
+    """True for SQLite engines and URLs"""
+    url = getattr(engine_or_url, 'url', engine_or_url)
+    return make_url(url).get_backend_name() == 'sqlite'
+
+def sqlite_options(database_config):
+    """Merged ``database.sqlite`` options"""
+    return {**DEFAULT_SQLITE_OPTIONS, **(database_config.get('sqlite') or {})}
+
+def pool_options(database_config, async_engine=False):
+    """create_engine keyword arguments for ``database.pool``
+    
+    ``queue`` keeps up to ``size`` connections open and lets ``max_overflow``
+    more be opened under load, which suits a fixed pool of worker threads;
+    ``singleton`` holds one connection per thread; ``null`` opens a new
+    connection for every checkout; ``default`` leaves SQLAlchemy's choice.
+    """
+    options = {**DEFAULT_POOL_OPTIONS, **(database_config.get('pool') or {})}
+    strategy = options['strategy']
+    
+    if strategy == 'default':
+        return {}
+    if strategy == 'null':
+        return {'poolclass': NullPool}
+    if strategy == 'singleton' and not async_engine:
+        return {'poolclass': SingletonThreadPool, 'pool_size': options['size']}
+    if strategy not in ('queue', 'singleton'):
+        raise ValueError(f"Unknown database pool strategy: {strategy}")
+    
+    return {
+        'poolclass': AsyncAdaptedQueuePool if async_engine else QueuePool,
+        'pool_size': options['size'],
+        'max_overflow': options['max_overflow'],
+        'pool_timeout': options['timeout_seconds'],
+        'pool_recycle': options['recycle_seconds'],
+        'pool_pre_ping': options['pre_ping']
+    }
+
+def sqlite_pragmas(database_config):
+    """PRAGMA statements for ``database.sqlite``, validated against known values"""
+    options = sqlite_options(database_config)
+    if not options['enabled']:
+        return []
+    
+    pragmas = []
+    if options['journal_mode']:
+        journal_mode = str(options['journal_mode']).upper()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"Unknown SQLite journal_mode: {options['journal_mode']}")
+        pragmas.append(f"PRAGMA journal_mode={journal_mode}")
+    if options['synchronous']:
+        synchronous = str(options['synchronous']).upper()
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unknown SQLite synchronous level: {options['synchronous']}")
+        pragmas.append(f"PRAGMA synchronous={synchronous}")
+    if options['temp_store']:
+        temp_store = str(options['temp_store']).upper()
+        if temp_store not in TEMP_STORES:
+            raise ValueError(f"Unknown SQLite temp_store: {options['temp_store']}")
+        pragmas.append(f"PRAGMA temp_store={temp_store}")
+    if options['cache_size'] is not None:
+        pragmas.append(f"PRAGMA cache_size={int(options['cache_size'])}")
+    if options['mmap_size'] is not None:
+        pragmas.append(f"PRAGMA mmap_size={int(options['mmap_size'])}")
+    if options['busy_timeout_ms'] is not None:
+        pragmas.append(f"PRAGMA busy_timeout={int(options['busy_timeout_ms'])}")
+    return pragmas
+
+def install_sqlite_pragmas(engine, database_config):
+    """Run the configured PRAGMAs on every new connection of engine"""
+    pragmas = sqlite_pragmas(database_config)
+    if not pragmas:
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+def create_database_engine(url, database_config):
+    """create_engine() with the configured pool, plus PRAGMAs on SQLite"""
+    engine = create_engine(url, **pool_options(database_config))
+    if is_sqlite(engine):
+        install_sqlite_pragmas(engine, database_config)
+    return engine
+
+def insert_ignoring_duplicates(engine, table):
+    """INSERT that skips rows violating a unique constraint, where supported
+    
+    SQLite and PostgreSQL use ``ON CONFLICT DO NOTHING``; on other backends
+    a duplicate fails the statement.
+    """
+    backend = engine.dialect.name
+    if backend == 'sqlite':
+        return sqlite_insert(table).on_conflict_do_nothing()
+    if backend == 'postgresql':
+        return postgresql_insert(table).on_conflict_do_nothing()
+    return insert(table)
+
+def insert_or_increment(engine, table, key_columns, counter_columns):
+    """INSERT that adds counter_columns onto an existing row with the same key
+    
+    Rows are ``{column: value}`` dicts for executemany; a row whose
+    key_columns already exist has its counter_columns incremented by the
+    given values in the same statement.
+    """
+    backend = engine.dialect.name
+    if backend in ('sqlite', 'postgresql'):
+        statement = (sqlite_insert if backend == 'sqlite' else postgresql_insert)(table)
+        return statement.on_conflict_do_update(
+            index_elements=[table.c[column] for column in key_columns],
+            set_={column: table.c[column] + statement.excluded[column] for column in counter_columns}
+        )
+    if backend in ('mysql', 'mariadb'):
+        statement = mysql_insert(table)
+        return statement.on_duplicate_key_update(
+            {column: table.c[column] + statement.inserted[column] for column in counter_columns}
+        )
+    raise ValueError(f"Counter upserts are not supported on {backend} databases")